@@ -0,0 +1,35 @@
+import hmac
+from functools import wraps
+from typing import Callable
+
+from flask import current_app, jsonify, request
+
+LOOPBACK_ADDRESSES = {'127.0.0.1', '::1'}
+
+
+def admin_request_allowed() -> bool:
+    """
+    True when the request may read an operational endpoint.
+
+    With ADMIN_TOKEN configured the request must carry it as a bearer token.
+    Without one only direct loopback requests are served. A forwarding header
+    means a local reverse proxy relayed the request from elsewhere, so those
+    count as remote.
+    """
+    token = current_app.config.get('ADMIN_TOKEN')
+    if token:
+        scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(supplied.encode(), token.encode())
+    if request.headers.get('X-Forwarded-For') or request.headers.get('Forwarded'):
+        return False
+    return request.remote_addr in LOOPBACK_ADDRESSES
+
+
+def admin_only(view: Callable) -> Callable:
+    """Serve the view only to requests admin_request_allowed() accepts, 403 otherwise."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not admin_request_allowed():
+            return jsonify({'error': 'Forbidden'}), 403
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,93 @@
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from request_timing import timed_phase
+
+
+class PayslipColumns:
+    """
+    Decrypted payslip rows loaded into per-field NumPy arrays.
+
+    Every selected field is decrypted as DECIMAL(10,2), so values are held as
+    integer cents. Sums are therefore exact, and rounding them to 2 decimals
+    gives the same result as the old per-cell float() loops. NULLs count as 0
+    and are recorded in null_mask.
+    """
+
+    @timed_phase('aggregate')
+    def __init__(self, rows: Sequence[Tuple[Any, ...]], colnames: Sequence[str], fields: Sequence[str]):
+        self.fields = list(dict.fromkeys(fields))
+        self.row_count = len(rows)
+        index = {name: i for i, name in enumerate(colnames)}
+        # Transpose once at C speed instead of indexing every cell from Python
+        columns = list(zip(*rows)) if rows else [()] * len(colnames)
+        self.columns = {name: columns[i] for name, i in index.items()}
+        self.cents: Dict[str, np.ndarray] = {}
+        self.null_mask: Dict[str, np.ndarray] = {}
+        for field in self.fields:
+            raw = np.array(self.columns[field], dtype=object)
+            mask = raw == None  # noqa: E711 - elementwise comparison on an object array
+            raw[mask] = 0
+            self.cents[field] = np.rint(raw.astype(np.float64) * 100).astype(np.int64)
+            self.null_mask[field] = mask
+
+    @timed_phase('aggregate')
+    def totals(self) -> Dict[str, float]:
+        """Returns field -> sum over all rows, rounded to 2 decimals."""
+        return {field: _to_amount(self.cents[field].sum()) for field in self.fields}
+
+    @timed_phase('aggregate')
+    def totals_by(self, *key_columns: str) -> List[Tuple[Tuple[Any, ...], Dict[str, float]]]:
+        """
+        Group rows by key_columns and sum every field per group.
+
+        Returns:
+            List of (key tuple, field -> rounded sum) sorted by key
+        """
+        return [
+            (key, {field: _to_amount(cents) for field, cents in sums.items()})
+            for key, sums in self.cents_by(*key_columns)
+        ]
+
+    @timed_phase('aggregate')
+    def cents_by(self, *key_columns: str) -> List[Tuple[Tuple[Any, ...], Dict[str, int]]]:
+        """
+        Group rows by key_columns and sum every field per group in exact integer cents.
+
+        Returns:
+            List of (key tuple, field -> sum in cents) sorted by key
+        """
+        keys = list(zip(*(self.columns[name] for name in key_columns))) if self.row_count else []
+        group_index: Dict[Tuple[Any, ...], int] = {}
+        codes = np.fromiter(
+            (group_index.setdefault(key, len(group_index)) for key in keys),
+            dtype=np.intp, count=len(keys)
+        )
+        group_count = len(group_index)
+        # Cents stay exact in float64 weights well beyond any DECIMAL(10,2) total
+        group_cents = {
+            field: np.bincount(codes, weights=self.cents[field], minlength=group_count)
+            for field in self.fields
+        }
+        groups = []
+        for key, code in sorted(group_index.items(), key=lambda item: _sort_key(item[0])):
+            groups.append((key, {field: int(group_cents[field][code]) for field in self.fields}))
+        return groups
+
+    def totals_by_period(self) -> List[Tuple[Tuple[Any, ...], Dict[str, float]]]:
+        """Per-period sums keyed by (period_from, period_to)."""
+        return self.totals_by('period_from', 'period_to')
+
+    def totals_by_employee(self) -> List[Tuple[Tuple[Any, ...], Dict[str, float]]]:
+        """Per-employee sums keyed by (emp_id,)."""
+        return self.totals_by('emp_id')
+
+
+def _to_amount(cents) -> float:
+    return round(float(cents) / 100, 2)
+
+
+def _sort_key(key: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    # NULL keys sort first instead of failing to compare with dates or ints
+    return tuple((value is not None, value) for value in key)
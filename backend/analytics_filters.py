@@ -0,0 +1,80 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+# (query parameter, employee_payroll_information column) for the settings filters
+FILTER_COLUMNS = [
+    ('department_id', 'department_id'),
+    ('rank_id', 'rank_id'),
+    ('employment_type_id', 'employment_type'),
+    ('position_id', 'position'),
+    ('cost_center_id', 'cost_center'),
+    ('project_id', 'project_id'),
+    ('location_id', 'location_and_offices_id'),
+]
+
+
+def filters_from_args(args: Mapping[str, Any]) -> Dict[str, Optional[str]]:
+    """Settings filter values from a request's query parameters, None for the ones not given."""
+    return {param_name: args.get(param_name, None) for param_name, _ in FILTER_COLUMNS}
+
+
+@dataclass(frozen=True)
+class CompiledFilters:
+    """
+    SQL for the active settings filters.
+
+    The active filters are checked together in one EXISTS subquery on
+    employee_payroll_information matched on (emp_id, company_id), instead
+    of an IN subquery per filter. Being a semi-join, it never multiplies
+    payslip rows, however many employee_payroll_information rows an
+    employee has.
+
+    columns names the active filters in FILTER_COLUMNS order and params
+    holds their values in the same order.
+    """
+    columns: Tuple[str, ...] = ()
+    params: Tuple[Any, ...] = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.columns)
+
+    def exists(self, alias: str = 'p') -> str:
+        """
+        EXISTS predicate to AND onto the WHERE clause of the payslip table aliased as alias,
+        empty when no filter is set. Takes one %s per value in params.
+        """
+        if not self.columns:
+            return ''
+        return (" AND EXISTS (SELECT 1 FROM employee_payroll_information epi"
+                f" WHERE epi.emp_id = {alias}.emp_id AND epi.company_id = {alias}.company_id{self.where()})")
+
+    def where(self) -> str:
+        """Predicates on employee_payroll_information aliased as epi, one %s per value in params."""
+        return ''.join(f" AND epi.{column} = %s" for column in self.columns)
+
+    def param_names(self) -> Tuple[str, ...]:
+        """Names of the where() parameters, for a CompiledQuery layout."""
+        return tuple(f'epi.{column}' for column in self.columns)
+
+    def values(self) -> Dict[str, Any]:
+        """Filter values keyed by param_names()."""
+        return dict(zip(self.param_names(), self.params))
+
+    def emp_ids_query(self, company_id) -> Tuple[str, Tuple[Any, ...]]:
+        """(query, params) selecting the company's employees that pass every filter."""
+        query = f"SELECT epi.emp_id FROM employee_payroll_information epi WHERE epi.company_id = %s{self.where()}"
+        return query, (company_id,) + self.params
+
+
+def compile_filters(filters: Optional[Mapping[str, Any]]) -> CompiledFilters:
+    """
+    Compile a dict of filter values keyed by query parameter name.
+
+    Filters that are missing or empty are left out.
+    """
+    filters = filters or {}
+    active = [(column, filters[param_name]) for param_name, column in FILTER_COLUMNS if filters.get(param_name)]
+    return CompiledFilters(
+        columns=tuple(column for column, _ in active),
+        params=tuple(value for _, value in active),
+    )
@@ -1,12 +1,32 @@
 from flask import Flask, jsonify, request, make_response
 from flask_cors import CORS
-from flask_mysqldb import MySQL
 from dotenv import load_dotenv
 import os
 from datetime import datetime
 import logging
 import sys
-from payslip_fields import get_field_display_names_by_category, FieldCategory
+from payslip_fields import get_field_display_names_by_category, get_all_field_display_names, FieldCategory
+from dataset_cache import DatasetCache, make_key
+from aggregation import PayslipColumns
+from settings_cache import SettingsCache, SETTINGS_TABLES
+from name_index import NameIndex
+from db_pool import PooledMySQL, PoolTimeout, fetch_query
+from drilldown_stream import requested_stream_format, ServerSideRows, CachedRows, drilldown_response, streamed_response
+from csv_export import csv_body, zip_body
+from snapshot_store import SnapshotStore
+from response_formats import negotiate_format, unavailable_format_response, summary_table, columnar_response
+from cronjob_details import ParsedDetailsCache, record_days
+from period_dates import PeriodDatesCache
+from data_version import DataVersionCache, conditional_on_data_version, request_data_version
+from json_provider import make_json_provider
+from compression import ResponseCompression
+from analytics_filters import compile_filters, filters_from_args
+from query_cache import CompiledQuery, QueryCache
+from request_timing import RequestTiming, timed_connection
+from query_accounting import QueryAccounting, counted_connection
+from slow_queries import SlowQueryLog
+from local_db import sqlite_connector
+from admin_access import admin_only
 
 # Load environment variables
 load_dotenv()
@@ -31,107 +51,394 @@ app.config['MYSQL_PASSWORD'] = os.getenv('DB_PASSWORD')
 app.config['MYSQL_DB'] = os.getenv('DB_NAME')
 ENCRYPT_KEY = os.getenv('MYSQL_ENCRYPT_KEY')
 
-mysql = MySQL(app)
+# Connection pool sizing, connections are pre-warmed up to the minimum at startup
+app.config['DB_POOL_MIN_SIZE'] = int(os.getenv('DB_POOL_MIN_SIZE', 2))
+app.config['DB_POOL_MAX_SIZE'] = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+app.config['DB_POOL_CHECKOUT_TIMEOUT'] = float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', 10))
+app.config['DB_POOL_PING_INTERVAL'] = float(os.getenv('DB_POOL_PING_INTERVAL', 0))
+# Worker threads for endpoints that fan independent queries out across pooled connections
+app.config['DB_QUERY_WORKERS'] = int(os.getenv('DB_QUERY_WORKERS', app.config['DB_POOL_MAX_SIZE']))
 
-# Utility function to get display name for a given id and table
-def get_display_name(cursor, table, id_field, name_field, id_value, company_id):
-    if not id_value:
-        return None
-    query = f"SELECT {name_field} FROM {table} WHERE {id_field} = %s AND company_id = %s AND status = 'Active' LIMIT 1"
-    cursor.execute(query, (id_value, company_id))
-    row = cursor.fetchone()
-    return row[0] if row else None
+# DB_BACKEND=sqlite serves a local database built by synthetic_data.py instead of MySQL
+if os.getenv('DB_BACKEND', 'mysql') == 'sqlite':
+    app.config['DB_POOL_CONNECT'] = sqlite_connector(os.getenv('SQLITE_PATH', 'payroll_local.db'))
+
+# Statements slower than SLOW_QUERY_MS are logged with their EXPLAIN plan, 0 turns the capture off
+slow_query_log = SlowQueryLog(
+    os.getenv('SLOW_QUERY_LOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'slow_queries.log')),
+    threshold_ms=float(os.getenv('SLOW_QUERY_MS', 1000)),
+    secrets=[ENCRYPT_KEY],
+    explain=os.getenv('SLOW_QUERY_EXPLAIN', 'true').lower() == 'true',
+    explain_seconds=float(os.getenv('SLOW_QUERY_EXPLAIN_SECONDS', 300)),
+    max_bytes=int(os.getenv('SLOW_QUERY_LOG_MAX_MB', 10)) * 1024 * 1024,
+    backup_count=int(os.getenv('SLOW_QUERY_LOG_BACKUPS', 5))
+)
+
+# Queries of /api requests are timed per phase and counted (statements, rows, bytes), slow ones are logged
+app.config['DB_CONNECTION_WRAPPER'] = lambda conn: counted_connection(timed_connection(slow_query_log.wrap(conn)))
+
+mysql = PooledMySQL(app)
+slow_query_log.pool = mysql.pool
+
+# JSON encoding: 'orjson' (when installed) or Flask's 'default' provider, both give the same values
+app.json = make_json_provider(app, os.getenv('JSON_PROVIDER', 'orjson'))
+
+# Server-Timing header per /api response and per-route latency histograms for /metrics
+app.config['REQUEST_TIMING_ENABLED'] = os.getenv('REQUEST_TIMING_ENABLED', 'true').lower() == 'true'
+request_timing = RequestTiming(app)
+
+# /metrics and /api/admin/slow-queries are served to loopback requests only, or to any request carrying ADMIN_TOKEN as a bearer token
+app.config['ADMIN_TOKEN'] = os.getenv('ADMIN_TOKEN')
+
+# Per-request SQL accounting, statement shapes repeated past the threshold are logged as suspected N+1
+app.config['N_PLUS_ONE_THRESHOLD'] = int(os.getenv('N_PLUS_ONE_THRESHOLD', 5))
+app.config['SQL_DEBUG_HEADER'] = os.getenv('SQL_DEBUG_HEADER', 'false').lower() == 'true'
+QueryAccounting(app)
+
+# gzip/brotli for JSON, NDJSON, MessagePack and CSV responses of at least COMPRESS_MIN_SIZE bytes
+app.config['COMPRESS_ENABLED'] = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+ResponseCompression(app)
+
+# Decrypted payslip rows shared by summary and drilldown requests for the same slice
+dataset_cache = DatasetCache(
+    max_bytes=int(os.getenv('DATASET_CACHE_MAX_MB', 256)) * 1024 * 1024,
+    ttl_seconds=float(os.getenv('DATASET_CACHE_TTL_SECONDS', 300))
+)
+
+# Rows fetched per round trip when streaming drilldown responses
+DRILLDOWN_STREAM_CHUNK_ROWS = int(os.getenv('DRILLDOWN_STREAM_CHUNK_ROWS', 1000))
+
+# Decrypted per-period sums of closed payroll periods, kept on disk per company and
+# built on a background pooled connection for the periods requests ask for
+snapshot_store = None
+if os.getenv('SNAPSHOT_ENABLED', 'true').lower() == 'true':
+    snapshot_store = SnapshotStore(
+        os.getenv('SNAPSHOT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots')),
+        ENCRYPT_KEY,
+        close_after_days=int(os.getenv('SNAPSHOT_CLOSE_AFTER_DAYS', 7)),
+        check_seconds=float(os.getenv('SNAPSHOT_CHECK_SECONDS', 60)),
+        pool=mysql.pool
+    )
 
-# Reusable function for employee search with AES decryption and joins
+# Parsed payroll_cronjob *_details columns, reused across deep dive days of the same payroll run
+cronjob_details_cache = ParsedDetailsCache(max_entries=int(os.getenv('CRONJOB_DETAILS_CACHE_SIZE', 4096)))
+
+# Longest date range the deep dive payroll breakdown accepts
+DEEPDIVE_MAX_RANGE_DAYS = int(os.getenv('DEEPDIVE_MAX_RANGE_DAYS', 62))
+
+# Distinct payslip periods for the date pickers, dropped when a company's payslips change
+period_dates_cache = PeriodDatesCache(check_seconds=float(os.getenv('PERIOD_DATES_CHECK_SECONDS', 30)))
+
+# Conditional GET: ETags follow the payslip/payroll data version, and roll over at least this often
+ETAG_MAX_AGE_SECONDS = float(os.getenv('ETAG_MAX_AGE_SECONDS', 3600))
+# Data versions are reused across requests for this long before the fingerprint is read again
+data_version_cache = DataVersionCache(ttl_seconds=float(os.getenv('DATA_VERSION_CACHE_SECONDS', 5)))
+conditional_by_period = conditional_on_data_version(
+    lambda: mysql.connection,
+    lambda kwargs: (kwargs['company_id'], kwargs['period_from'], kwargs['period_to']),
+    max_age_seconds=ETAG_MAX_AGE_SECONDS,
+    cache=data_version_cache
+)
+conditional_by_company = conditional_on_data_version(
+    lambda: mysql.connection,
+    lambda kwargs: (kwargs['company_id'], None, None),
+    max_age_seconds=ETAG_MAX_AGE_SECONDS,
+    cache=data_version_cache
+)
+
+# Finished analytics SQL per query shape: endpoint, sorted fields, active filters and optional clauses
+query_cache = QueryCache(max_entries=int(os.getenv('QUERY_CACHE_SIZE', 512)))
+
+# Settings lookup tables per company, loaded in one batched query
+settings_cache = SettingsCache(ttl_seconds=float(os.getenv('SETTINGS_CACHE_TTL_SECONDS', 600)))
+
+# Decrypted employee names per company for typeahead search without per-keystroke decryption
+name_index = NameIndex(
+    ENCRYPT_KEY,
+    refresh_seconds=float(os.getenv('NAME_INDEX_REFRESH_SECONDS', 60)),
+    rebuild_seconds=float(os.getenv('NAME_INDEX_REBUILD_SECONDS', 3600)),
+    max_companies=int(os.getenv('NAME_INDEX_MAX_COMPANIES', 64))
+)
+
+# Reusable function for employee search, served from the in-memory name index
 def search_employees_by_name(cursor, company_id, name_search, context='all', limit=10):
     """
-    Search employees by first name or last name with AES decryption.
+    Search employees by first name or last name.
+    
+    Names are decrypted once per company into name_index, so a search does not
+    touch the database while the index is fresh.
     
     Args:
-        cursor: Database cursor
+        cursor: Database cursor, only used to build or refresh the index
         company_id: Company ID to filter by
         name_search: Search term for first/last name
-        context: 'shifts', 'payslip', or 'all' - determines which tables to join
+        context: 'shifts', 'payslip', or 'all' - restricts to employees with rows in that module
         limit: Maximum number of results to return
     
     Returns:
-        List of employee dictionaries with emp_id, first_name, last_name, and context-specific fields
+        List of employee dictionaries with emp_id, first_name, last_name, location_office,
+        department_name and rank_name
     """
     if not name_search or len(name_search) < 2:
         return []
     
-    # Base query with employee name decryption
-    base_query = """
-        SELECT DISTINCT
-            e.emp_id,
-            CAST(AES_DECRYPT(e.last_name, %s) AS CHAR(150) CHARACTER SET utf8) AS last_name,
-            CAST(AES_DECRYPT(e.first_name, %s) AS CHAR(150) CHARACTER SET utf8) AS first_name,
-            COALESCE(lao.name, 'N/A') AS location_office,
-            COALESCE(d.department_name, 'N/A') AS department_name,
-            COALESCE(rk.rank_name, 'N/A') AS rank_name
-        FROM employee e
-        LEFT JOIN employee_payroll_information epi ON e.emp_id = epi.emp_id AND epi.company_id = %s
-        LEFT JOIN location_and_offices lao ON epi.location_and_offices_id = lao.location_and_offices_id
-        LEFT JOIN department d ON epi.department_id = d.dept_id AND d.company_id = %s
-        LEFT JOIN `rank` rk ON epi.rank_id = rk.rank_id AND rk.company_id = %s
+    matches = name_index.search(cursor, company_id, name_search, context, limit)
+    return [employee.to_dict() for employee in matches]
+
+# Reusable query builder for /api/analytics
+def build_analytics_query(company_id, emp_id, period_from, period_to, selected_fields,
+                          payroll_group_id=None, filters=None, exact_period=False, periods=None):
     """
+    Build the decrypted payslip query behind /api/analytics.
     
-    # Add context-specific filters
-    if context == 'shifts':
-        base_query += """
-            INNER JOIN employee_shifts_schedule ess ON e.emp_id = ess.emp_id AND ess.company_id = %s
-        """
-    elif context == 'payslip':
-        base_query += """
-            INNER JOIN payroll_payslip pp ON e.emp_id = pp.emp_id AND pp.company_id = %s
-        """
+    Args:
+        company_id: Company ID to filter by
+        emp_id: Employee ID, or 'all' for every employee
+        period_from: Start of the period range
+        period_to: End of the period range
+        selected_fields: Payslip fields to decrypt
+        payroll_group_id: Optional payroll group filter
+        filters: Dict of optional settings filter values keyed by query parameter name
+        exact_period: Match one period exactly instead of every period inside the range
+        periods: Optional list of (period_from, period_to) pairs to restrict the range to
     
-    # Add name search conditions
-    base_query += """
-        WHERE e.company_id = %s
-        AND (CAST(AES_DECRYPT(e.last_name, %s) AS CHAR(150) CHARACTER SET utf8) LIKE %s
-             OR CAST(AES_DECRYPT(e.first_name, %s) AS CHAR(150) CHARACTER SET utf8) LIKE %s)
-        ORDER BY last_name ASC, first_name ASC
-        LIMIT %s
+    Returns:
+        Tuple of (query, params). Each row holds the selected fields in sorted
+        order followed by period_from and period_to.
     """
+    compiled_filters = compile_filters(filters)
+    fields = tuple(sorted(selected_fields))
+    periods = periods or []
+    key = ('analytics', fields, compiled_filters.columns, exact_period, len(periods),
+           emp_id != 'all', bool(payroll_group_id))
+    compiled = query_cache.get_or_compile(key, lambda: compile_analytics_query(
+        fields, compiled_filters, exact_period, len(periods), emp_id != 'all', bool(payroll_group_id)
+    ))
     
-    # Build parameters array
-    search_param = f"%{name_search}%"
-    params = [
-        ENCRYPT_KEY, ENCRYPT_KEY,  # For name decryption
-        company_id, company_id, company_id,  # For joins
-    ]
+    values = {
+        'encrypt_key': ENCRYPT_KEY,
+        'company_id': company_id,
+        'period_from': period_from,
+        'period_to': period_to,
+        'emp_id': emp_id,
+        'payroll_group_id': payroll_group_id,
+    }
+    for i, (start, end) in enumerate(periods):
+        values[f'period_from_{i}'] = start
+        values[f'period_to_{i}'] = end
+    values.update(compiled_filters.values())
+    return compiled.sql, compiled.params(values)
+
+def compile_analytics_query(fields, compiled_filters, exact_period, period_count, by_employee, by_payroll_group):
+    """SQL and parameter layout of one build_analytics_query shape."""
+    # Build SQL for selected fields with AES decryption, the key is bound once per field
+    field_sql = ', '.join([
+        f"CAST(AES_DECRYPT(p.{field}, %s) AS DECIMAL(10,2)) AS {field}" for field in fields
+    ])
+    layout = ['encrypt_key'] * len(fields)
     
-    # Add context-specific company_id parameter
-    if context in ['shifts', 'payslip']:
-        params.append(company_id)
+    query = f"""
+        SELECT {field_sql}, p.period_from, p.period_to
+        FROM payroll_payslip p
+        WHERE p.company_id = %s
+    """
     
-    params.extend([
-        company_id,  # For main WHERE clause
-        ENCRYPT_KEY, search_param,  # For last_name search
-        ENCRYPT_KEY, search_param,  # For first_name search
-        limit
-    ])
+    if exact_period:
+        query += " AND p.period_from = %s AND p.period_to = %s"
+    else:
+        query += " AND p.period_from >= %s AND p.period_to <= %s"
+    layout.extend(['company_id', 'period_from', 'period_to'])
     
-    cursor.execute(base_query, tuple(params))
-    results = cursor.fetchall()
+    # Restrict to specific periods, e.g. the open ones the snapshot does not hold
+    if period_count:
+        query += " AND (" + " OR ".join(["(p.period_from = %s AND p.period_to = %s)"] * period_count) + ")"
+        for i in range(period_count):
+            layout.extend([f'period_from_{i}', f'period_to_{i}'])
     
-    # Format results into employee objects
-    employees = []
-    for row in results:
-        employee = {
-            'emp_id': row[0],
-            'last_name': row[1] if row[1] else 'N/A',
-            'first_name': row[2] if row[2] else 'N/A',
-            'location_office': row[3] if row[3] else 'N/A',
-            'department_name': row[4] if row[4] else 'N/A',
-            'rank_name': row[5] if row[5] else 'N/A'
-        }
-        employees.append(employee)
+    # Add employee filter if not 'all'
+    if by_employee:
+        query += " AND p.emp_id = %s"
+        layout.append('emp_id')
+    
+    # Add payroll group filter if provided
+    if by_payroll_group:
+        query += " AND p.payroll_group_id = %s"
+        layout.append('payroll_group_id')
+    
+    # Add additional filters from settings tables
+    query += compiled_filters.exists('p')
+    layout.extend(compiled_filters.param_names())
     
-    return employees
+    return CompiledQuery(query, tuple(layout))
+
+def analytics_filter_emp_ids(cursor, company_id, filters):
+    """
+    Employee IDs of the company allowed by the settings filters, or None when no filter is set.
+
+    Matches the employee_payroll_information EXISTS check of build_analytics_query.
+    """
+    compiled_filters = compile_filters(filters)
+    if not compiled_filters:
+        return None
+    query, params = compiled_filters.emp_ids_query(company_id)
+    cursor.execute(query, params)
+    return {row[0] for row in cursor.fetchall()}
+
+def fetch_analytics_rows(cursor, company_id, emp_id, period_from, period_to, selected_fields,
+                         payroll_group_id, filters, exact_period):
+    """
+    Rows for /api/analytics, shaped like build_analytics_query rows.
+
+    Closed periods come from the snapshot store as per-employee sums and only
+    open periods are decrypted live. Falls back to a fully live query when the
+    snapshot is disabled, does not cover a field, or fails.
+
+    Returns:
+        Tuple of (rows, colnames), the fields in sorted order like build_analytics_query
+    """
+    selected_fields = sorted(selected_fields)
+    colnames = selected_fields + ['period_from', 'period_to']
+    if snapshot_store is not None and snapshot_store.covers(selected_fields):
+        try:
+            rows, open_periods = snapshot_store.read(
+                cursor, company_id, period_from, period_to, selected_fields, exact_period=exact_period,
+                emp_id=emp_id, payroll_group_id=payroll_group_id,
+                emp_ids=analytics_filter_emp_ids(cursor, company_id, filters)
+            )
+            if open_periods:
+                query, params = build_analytics_query(
+                    company_id, emp_id, period_from, period_to, selected_fields,
+                    payroll_group_id, filters, exact_period=exact_period, periods=open_periods
+                )
+                cursor.execute(query, tuple(params))
+                rows.extend(cursor.fetchall())
+            return rows, colnames
+        except Exception as e:
+            app.logger.error(f"Snapshot read failed, querying live: {str(e)}")
+    query, params = build_analytics_query(
+        company_id, emp_id, period_from, period_to, selected_fields,
+        payroll_group_id, filters, exact_period=exact_period
+    )
+    cursor.execute(query, tuple(params))
+    return cursor.fetchall(), colnames
+
+def add_total_salary(sums):
+    """Add total_salary (gross_pay) to a field -> sum dict if gross_pay is selected."""
+    if 'gross_pay' in sums:
+        sums['total_salary'] = sums['gross_pay']
+    return sums
+
+# Reusable query builder for the decrypted payslip + employee name prefetch
+def build_prefetch_query(company_id, period_from, period_to, selected_fields, filters, order_by='period',
+                         emp_id=None, payroll_group_id=None):
+    """
+    Build the single-fetch query behind /api/analytics-prefetch, /api/analytics-export
+    and /api/analytics-single-employee.
+
+    Args:
+        company_id: Company ID to filter by
+        period_from: Start of the period range (inclusive)
+        period_to: End of the period range (inclusive)
+        selected_fields: Payslip fields to decrypt
+        filters: Dict of optional filter values keyed by query parameter name
+        order_by: 'period' to order by period then name, 'employee' to keep each
+            employee's payslips adjacent in name order
+        emp_id: Optional single employee
+        payroll_group_id: Optional payroll group filter
+
+    Returns:
+        Tuple of (query, params). Fields are selected in sorted order.
+    """
+    compiled_filters = compile_filters(filters)
+    fields = tuple(sorted(selected_fields))
+    key = ('prefetch', fields, compiled_filters.columns, order_by, emp_id is not None, bool(payroll_group_id))
+    compiled = query_cache.get_or_compile(key, lambda: compile_prefetch_query(
+        fields, compiled_filters, order_by, emp_id is not None, bool(payroll_group_id)
+    ))
+    values = {
+        'encrypt_key': ENCRYPT_KEY,
+        'company_id': company_id,
+        'period_from': period_from,
+        'period_to': period_to,
+        'emp_id': emp_id,
+        'payroll_group_id': payroll_group_id,
+    }
+    values.update(compiled_filters.values())
+    return compiled.sql, compiled.params(values)
+
+def compile_prefetch_query(fields, compiled_filters, order_by, by_employee, by_payroll_group):
+    """SQL and parameter layout of one build_prefetch_query shape."""
+    # Employee name fields (decrypted)
+    name_fields = [
+        "CAST(AES_DECRYPT(e.last_name, %s) AS CHAR(150) CHARACTER SET utf8) AS last_name",
+        "CAST(AES_DECRYPT(e.first_name, %s) AS CHAR(150) CHARACTER SET utf8) AS first_name"
+    ]
+    # Build SQL for selected fields
+    field_sql = ', '.join([
+        f"CAST(AES_DECRYPT(p.{field}, %s) AS DECIMAL(10,2)) AS {field}" for field in fields
+    ])
+    layout = ['encrypt_key'] * (len(name_fields) + len(fields))
+    # Build the query
+    query = f'''
+        SELECT p.emp_id, {', '.join(name_fields)}, p.period_from, p.period_to, {field_sql}
+        FROM payroll_payslip p
+        JOIN employee e ON p.emp_id = e.emp_id
+        WHERE p.company_id = %s
+          AND p.period_from >= %s AND p.period_to <= %s
+    '''
+    layout.extend(['company_id', 'period_from', 'period_to'])
+    if by_employee:
+        query += ' AND p.emp_id = %s'
+        layout.append('emp_id')
+    if by_payroll_group:
+        query += ' AND p.payroll_group_id = %s'
+        layout.append('payroll_group_id')
+    query += compiled_filters.exists('p')
+    layout.extend(compiled_filters.param_names())
+    if order_by == 'employee':
+        query += ' ORDER BY last_name, first_name, p.emp_id'
+    else:
+        query += ' ORDER BY p.period_from, p.period_to, last_name, first_name'
+    return CompiledQuery(query, tuple(layout))
+
+def binary_analytics_response(binary_format, colnames, rows, selected_fields, drilldown, separate, filter_display):
+    """
+    Columnar MessagePack/Arrow response for analytics-prefetch and analytics-single-employee.
+
+    Drilldowns return the fetched rows as-is. Summaries return one row per
+    period (separate) or a single row of totals, with the filter display names
+    and the separate view's overall total in the metadata.
+    """
+    metadata = {'filters': filter_display}
+    if drilldown:
+        return columnar_response(binary_format, colnames, rows, metadata)
+    columns = PayslipColumns(rows, colnames, selected_fields)
+    if separate:
+        metadata['total'] = columns.totals()
+        table_colnames, table_rows = summary_table(columns.totals_by_period(), ('period_from', 'period_to'), columns.fields)
+    else:
+        table_colnames, table_rows = summary_table([((), columns.totals())], (), columns.fields)
+    return columnar_response(binary_format, table_colnames, table_rows, metadata)
+
+def stream_drilldown(open_rows, stream_format, separate, cursor, company_id, filters):
+    """
+    Streamed drilldown response for the rows open_rows() returns (ServerSideRows or CachedRows).
+
+    Filter display names are resolved before streaming starts, so the request's
+    own pooled connection is returned as soon as the view function exits. They
+    are resolved before open_rows() is called, so a failing settings lookup
+    never leaves a streaming connection checked out.
+    """
+    filter_display = None
+    if separate and stream_format == 'json':
+        filter_display = settings_cache.filter_display(cursor, company_id, filters)
+    def dumps(value):
+        return app.json.dumps(value, separators=(',', ':'))
+    return drilldown_response(open_rows(), stream_format, dumps, separate, filter_display)
 
 @app.route('/api/analytics/<int:company_id>/<emp_id>/<string:period_from>/<string:period_to>/<string:aggregation_type>', methods=['GET'])
+@conditional_by_period
 def get_analytics(company_id, emp_id, period_from, period_to, aggregation_type='single'):
     try:
         # Validate parameters
@@ -145,6 +452,12 @@ def get_analytics(company_id, emp_id, period_from, period_to, aggregation_type='
         except ValueError as e:
             return jsonify({'error': f'Invalid date format: {str(e)}'}), 400
         
+        # MessagePack/Arrow when the Accept header asks for it, JSON otherwise
+        binary_format = negotiate_format(request)
+        unavailable = unavailable_format_response(binary_format)
+        if unavailable:
+            return unavailable
+        
         # Get selected fields from query parameters, default to a set of basic fields if not provided
         selected_fields = request.args.get('fields', None)
         if selected_fields:
@@ -159,15 +472,6 @@ def get_analytics(company_id, emp_id, period_from, period_to, aggregation_type='
         # Get payroll group ID from query parameters (optional)
         payroll_group_id = request.args.get('payroll_group_id', None)
         
-        # Ensure all filter variables are defined
-        department_id = request.args.get('department_id', None)
-        rank_id = request.args.get('rank_id', None)
-        employment_type_id = request.args.get('employment_type_id', None)
-        position_id = request.args.get('position_id', None)
-        cost_center_id = request.args.get('cost_center_id', None)
-        project_id = request.args.get('project_id', None)
-        location_id = request.args.get('location_id', None)
-        
         # Default fields if none provided
         if not selected_fields:
             selected_fields = [
@@ -177,289 +481,61 @@ def get_analytics(company_id, emp_id, period_from, period_to, aggregation_type='
                 'bonuses', 'other_compensation', 'hazard_pay'
             ]
             
+        # Settings filters (department, rank, ...) from the query parameters
+        filters = filters_from_args(request.args)
+        
         cursor = mysql.connection.cursor()
         
-        # For separate view, first get all distinct periods in the range
+        # Single fetch for every view: the separate view groups the whole range by period in memory.
+        # Closed periods are served from the snapshot store, only open periods are decrypted live
+        rows, colnames = fetch_analytics_rows(
+            cursor, company_id, emp_id, period_from, period_to, selected_fields,
+            payroll_group_id, filters, exact_period=(aggregation_type == 'single')
+        )
+        columns = PayslipColumns(rows, colnames, selected_fields)
+        
+        if binary_format and rows:
+            # Columnar summary: one row per period, or a single row of totals
+            if aggregation_type == 'separate':
+                groups = [(period, add_total_salary(sums)) for period, sums in columns.totals_by_period()]
+                key_names = ('period_from', 'period_to')
+            else:
+                groups = [((), add_total_salary(columns.totals()))]
+                key_names = ()
+            table_colnames, table_rows = summary_table(groups, key_names, list(groups[0][1]))
+            filter_display = settings_cache.filter_display(cursor, company_id, filters)
+            cursor.close()
+            return columnar_response(binary_format, table_colnames, table_rows, {'filters': filter_display})
+        
         if aggregation_type == 'separate':
-            # Initialize result structure for separate view
-            result = {'periods': [], 'filters': {}}
-
-            periods_query = """
-                SELECT DISTINCT period_from, period_to
-                FROM payroll_payslip
-                WHERE company_id = %s
-                AND period_from >= %s AND period_to <= %s
-            """
-            
-            params = [company_id, period_from, period_to]
-            
-            if emp_id != 'all':
-                periods_query += " AND emp_id = %s"
-                params.append(emp_id)
-            
-            if payroll_group_id:
-                periods_query += " AND payroll_group_id = %s"
-                params.append(payroll_group_id)
-            
-            # Add additional filters from settings tables
-            if department_id:
-                periods_query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE department_id = %s)"
-                params.append(department_id)
-            
-            if rank_id:
-                periods_query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE rank_id = %s)"
-                params.append(rank_id)
-            
-            if employment_type_id:
-                periods_query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE employment_type = %s)"
-                params.append(employment_type_id)
-            
-            if position_id:
-                periods_query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE position = %s)"
-                params.append(position_id)
-            
-            if cost_center_id:
-                periods_query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE cost_center = %s)"
-                params.append(cost_center_id)
-            
-            if project_id:
-                periods_query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE project_id = %s)"
-                params.append(project_id)
-            
-            if location_id:
-                periods_query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE location_and_offices_id = %s)"
-                params.append(location_id)
-            
-            cursor.execute(periods_query, tuple(params))
-            periods = cursor.fetchall()
-            if not periods:
+            if not rows:
                 return jsonify({'error': 'No periods found'}), 404
-                
-            # Convert periods to list and sort by start date
-            periods = list(periods)
-            periods.sort(key=lambda x: x[0])
             
-            # Process each period
-            for period_start, period_end in periods:
-                # Build SQL for selected fields with AES decryption
-                field_sql = ', '.join([
-                    f"CAST(AES_DECRYPT({field}, %s) AS DECIMAL(10,2)) AS {field}" for field in selected_fields
-                ])
-                
-                query = f"""
-                    SELECT {field_sql}
-                    FROM payroll_payslip 
-                    WHERE company_id = %s
-                    AND period_from = %s AND period_to = %s
-                """
-                
-                # Build parameters array - include ENCRYPT_KEY for each field
-                params = [ENCRYPT_KEY] * len(selected_fields)  # One ENCRYPT_KEY per field
-                params.extend([company_id, period_start, period_end])
-                
-                if emp_id != 'all':
-                    query += " AND emp_id = %s"
-                    params.append(emp_id)
-                
-                if payroll_group_id:
-                    query += " AND payroll_group_id = %s"
-                    params.append(payroll_group_id)
-                    
-                # Add additional filters from settings tables
-                if department_id:
-                    query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE department_id = %s)"
-                    params.append(department_id)
-                
-                if rank_id:
-                    query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE rank_id = %s)"
-                    params.append(rank_id)
-                
-                if employment_type_id:
-                    query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE employment_type = %s)"
-                    params.append(employment_type_id)
-                
-                if position_id:
-                    query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE position = %s)"
-                    params.append(position_id)
-                
-                if cost_center_id:
-                    query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE cost_center = %s)"
-                    params.append(cost_center_id)
-                
-                if project_id:
-                    query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE project_id = %s)"
-                    params.append(project_id)
-                
-                if location_id:
-                    query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE location_and_offices_id = %s)"
-                    params.append(location_id)
-                
-                cursor.execute(query, params)
-                rows = cursor.fetchall()
-                
-                if not rows:
-                    continue
-                    
-                # Initialize sums for this period with selected fields
-                period_sums = {field: 0.0 for field in selected_fields}
-                
-                # Process each row for this period - data is already decrypted
-                for row in rows:
-                    for i, field in enumerate(selected_fields):
-                        if row[i] is not None:
-                            period_sums[field] += float(row[i])
-                
-                # Add period data to result
-                period_analytics = {}
-                for field, value in period_sums.items():
-                    # Map DB field names to API field names if needed
-                    api_field = field
-                    period_analytics[api_field] = round(value, 2)
-                
-                # Add total_salary (gross_pay) if it exists
-                if 'gross_pay' in period_sums:
-                    period_analytics['total_salary'] = round(period_sums['gross_pay'], 2)
-                
+            # Initialize result structure for separate view
+            result = {'periods': []}
+            for (period_start, period_end), period_sums in columns.totals_by_period():
                 result['periods'].append({
                     'period': {
                         'from': period_start.strftime('%Y-%m-%d'),
                         'to': period_end.strftime('%Y-%m-%d')
                     },
-                    'analytics': period_analytics
+                    'analytics': add_total_salary(period_sums)
                 })
-            
-            # Get display names for all filters
-            filter_display = {}
-            filter_map = [
-                (location_id, 'location_and_offices', 'location_and_offices_id', 'name', 'location_name'),
-                (department_id, 'department', 'dept_id', 'department_name', 'department_name'),
-                (rank_id, 'rank', 'rank_id', 'rank_name', 'rank_name'),
-                (employment_type_id, 'employment_type', 'emp_type_id', 'name', 'employment_type_name'),
-                (position_id, 'position', 'position_id', 'position_name', 'position_name'),
-                (cost_center_id, 'cost_center', 'cost_center_id', 'cost_center_code', 'cost_center_code'),
-                (project_id, 'project', 'project_id', 'project_name', 'project_name'),
-            ]
-            for id_value, table, id_field, name_field, resp_field in filter_map:
-                if id_value:
-                    display = get_display_name(cursor, table, id_field, name_field, id_value, company_id)
-                    filter_display[resp_field] = display
-            
-            result['filters'] = filter_display
-            
-            cursor.close()
-            return jsonify(result)
-            
-        # For single/aggregate view
-        # Build SQL for selected fields with AES decryption
-        field_sql = ', '.join([
-            f"CAST(AES_DECRYPT({field}, %s) AS DECIMAL(10,2)) AS {field}" for field in selected_fields
-        ])
-        
-        query = f"""
-            SELECT {field_sql}, period_from, period_to
-            FROM payroll_payslip 
-            WHERE company_id = %s
-        """
-        
-        # Handle date filtering based on aggregation type
-        if aggregation_type == 'single':
-            date_filter = " AND period_from = %s AND period_to = %s"
-        else:  # 'aggregate'
-            date_filter = " AND period_from >= %s AND period_to <= %s"
-        query += date_filter
-        
-        # Build parameters array - include ENCRYPT_KEY for each field
-        params = [ENCRYPT_KEY] * len(selected_fields)  # One ENCRYPT_KEY per field
-        params.extend([company_id, period_from, period_to])
-        
-        # Add employee filter if not 'all'
-        if emp_id != 'all':
-            emp_filter = " AND emp_id = %s"
-            query += emp_filter
-            params.append(emp_id)
-        
-        # Add payroll group filter if provided
-        if payroll_group_id:
-            query += " AND payroll_group_id = %s"
-            params.append(payroll_group_id)
-        
-        # Add additional filters from settings tables
-        if department_id:
-            query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE department_id = %s)"
-            params.append(department_id)
-        
-        if rank_id:
-            query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE rank_id = %s)"
-            params.append(rank_id)
-        
-        if employment_type_id:
-            query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE employment_type = %s)"
-            params.append(employment_type_id)
-        
-        if position_id:
-            query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE position = %s)"
-            params.append(position_id)
-        
-        if cost_center_id:
-            query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE cost_center = %s)"
-            params.append(cost_center_id)
-        
-        if project_id:
-            query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE project_id = %s)"
-            params.append(project_id)
-        
-        if location_id:
-            query += " AND emp_id IN (SELECT emp_id FROM employee_payroll_information WHERE location_and_offices_id = %s)"
-            params.append(location_id)
-        
-        cursor.execute(query, tuple(params))
-        rows = cursor.fetchall()
-        
-        if not rows:
-            return jsonify({'error': 'No data found for the specified period'}), 404
-            
-        # Initialize sums with selected fields
-        sums = {field: 0.0 for field in selected_fields}
-            
-        # Process each row - data is already decrypted
-        for row in rows:
-            # Skip the last 2 columns (period_from, period_to) when processing fields
-            for i, field in enumerate(selected_fields):
-                if row[i] is not None:
-                    sums[field] += float(row[i])
-        
-        # Create result object with field sums
-        result = {}
-        for field, value in sums.items():
-            # Map DB field names to API field names if needed
-            api_field = field
-            result[api_field] = round(value, 2)
-        
-        # Add total_salary (gross_pay) if it exists
-        if 'gross_pay' in sums:
-            result['total_salary'] = round(sums['gross_pay'], 2)
+        else:
+            if not rows:
+                return jsonify({'error': 'No data found for the specified period'}), 404
+            result = add_total_salary(columns.totals())
         
         # Get display names for all filters
-        filter_display = {}
-        filter_map = [
-            (location_id, 'location_and_offices', 'location_and_offices_id', 'name', 'location_name'),
-            (department_id, 'department', 'dept_id', 'department_name', 'department_name'),
-            (rank_id, 'rank', 'rank_id', 'rank_name', 'rank_name'),
-            (employment_type_id, 'employment_type', 'emp_type_id', 'name', 'employment_type_name'),
-            (position_id, 'position', 'position_id', 'position_name', 'position_name'),
-            (cost_center_id, 'cost_center', 'cost_center_id', 'cost_center_code', 'cost_center_code'),
-            (project_id, 'project', 'project_id', 'project_name', 'project_name'),
-        ]
-        for id_value, table, id_field, name_field, resp_field in filter_map:
-            if id_value:
-                display = get_display_name(cursor, table, id_field, name_field, id_value, company_id)
-                filter_display[resp_field] = display
+        filter_display = settings_cache.filter_display(cursor, company_id, filters)
         
         result['filters'] = filter_display
         
         cursor.close()
         return jsonify(result)
         
+    except PoolTimeout:
+        raise
     except Exception as e:
         app.logger.error(f"Error in analytics: {str(e)}")
         return jsonify({'error': f'Failed to retrieve analytics data: {str(e)}'}), 500
@@ -536,6 +612,8 @@ def search_employees_by_name_endpoint(company_id, name_search):
             'total_results': len(employees)
         })
         
+    except PoolTimeout:
+        raise
     except Exception as e:
         app.logger.error(f"Error in search-employees-by-name: {str(e)}")
         return jsonify({'error': f'Failed to search employees: {str(e)}'}), 500
@@ -680,6 +758,8 @@ def get_shifts_changes_by_period(company_id, date_from, date_to):
             'total_changes': len(unique_changes)
         })
         
+    except PoolTimeout:
+        raise
     except Exception as e:
         app.logger.error(f"Error in shifts-changes-by-period: {str(e)}")
         return jsonify({'error': f'Failed to analyze shift changes: {str(e)}'}), 500
@@ -703,126 +783,23 @@ def get_payroll_groups(company_id):
     cursor.close()
     return jsonify({'payroll_groups': payroll_groups})
 
-@app.route('/api/dates/<int:company_id>/<string:emp_id>', methods=['GET'])
-def get_employee_dates(company_id, emp_id):
-    cursor = mysql.connection.cursor()
-    
+def period_dates_response(company_id, emp_id):
     # Get payroll group ID from query parameters (optional)
     payroll_group_id = request.args.get('payroll_group_id', None)
-    
-    # First get period_from dates
-    period_from_query = """
-        SELECT DISTINCT period_from
-        FROM payroll_payslip
-        WHERE company_id = %s
-        AND period_from IS NOT NULL
-    """
-    
-    params = [company_id]
-    if emp_id != 'all':
-        period_from_query += " AND emp_id = %s"
-        params.append(emp_id)
-    
-    if payroll_group_id:
-        period_from_query += " AND payroll_group_id = %s"
-        params.append(payroll_group_id)
-    
-    period_from_query += " ORDER BY period_from DESC"
-    cursor.execute(period_from_query, tuple(params))
-    period_from_results = cursor.fetchall()
-    
-    # Then get period_to dates
-    period_to_query = """
-        SELECT DISTINCT period_to
-        FROM payroll_payslip
-        WHERE company_id = %s
-        AND period_to IS NOT NULL
-    """
-    
-    params = [company_id]
-    if emp_id != 'all':
-        period_to_query += " AND emp_id = %s"
-        params.append(emp_id)
-    
-    if payroll_group_id:
-        period_to_query += " AND payroll_group_id = %s"
-        params.append(payroll_group_id)
-    
-    period_to_query += " ORDER BY period_to DESC"
-    cursor.execute(period_to_query, tuple(params))
-    period_to_results = cursor.fetchall()
-    
-    # Format dates
-    period_from_dates = []
-    for row in period_from_results:
-        try:
-            date_str = row[0].strftime('%Y-%m-%d')
-            period_from_dates.append(date_str)
-        except Exception:
-            pass
-            
-    period_to_dates = []
-    for row in period_to_results:
-        try:
-            date_str = row[0].strftime('%Y-%m-%d')
-            period_to_dates.append(date_str)
-        except Exception:
-            pass
-    
+    cursor = mysql.connection.cursor()
+    periods = period_dates_cache.get(cursor, company_id, emp_id, payroll_group_id)
     cursor.close()
-    return jsonify({
-        'period_from_dates': period_from_dates,
-        'period_to_dates': period_to_dates
-    })
+    return jsonify(periods.to_dict())
+
+@app.route('/api/dates/<int:company_id>/<string:emp_id>', methods=['GET'])
+@conditional_by_company
+def get_employee_dates(company_id, emp_id):
+    return period_dates_response(company_id, emp_id)
 
 @app.route('/api/dates/<int:company_id>', methods=['GET'])
+@conditional_by_company
 def get_company_dates(company_id):
-    cursor = mysql.connection.cursor()
-    
-    # First get period_from dates
-    period_from_query = """
-        SELECT DISTINCT period_from
-        FROM payroll_payslip
-        WHERE company_id = %s
-        AND period_from IS NOT NULL
-        ORDER BY period_from DESC
-    """
-    cursor.execute(period_from_query, (company_id,))
-    period_from_results = cursor.fetchall()
-    
-    # Then get period_to dates
-    period_to_query = """
-        SELECT DISTINCT period_to
-        FROM payroll_payslip
-        WHERE company_id = %s
-        AND period_to IS NOT NULL
-        ORDER BY period_to DESC
-    """
-    cursor.execute(period_to_query, (company_id,))
-    period_to_results = cursor.fetchall()
-    
-    # Format dates
-    period_from_dates = []
-    for row in period_from_results:
-        try:
-            date_str = row[0].strftime('%Y-%m-%d')
-            period_from_dates.append(date_str)
-        except Exception:
-            pass
-            
-    period_to_dates = []
-    for row in period_to_results:
-        try:
-            date_str = row[0].strftime('%Y-%m-%d')
-            period_to_dates.append(date_str)
-        except Exception:
-            pass
-    
-    cursor.close()
-    return jsonify({
-        'period_from_dates': period_from_dates,
-        'period_to_dates': period_to_dates
-    })
+    return period_dates_response(company_id, 'all')
 
 @app.route('/api/payslip-fields', methods=['GET'])
 def get_payslip_fields():
@@ -838,6 +815,8 @@ def get_payslip_fields():
             'tax_fields': categories.get('TAXES', {}),
             **categories
         })
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -845,59 +824,31 @@ def get_payslip_fields():
 def get_settings_options(company_id, table_name):
     try:
         # Validate table name to prevent SQL injection
-        valid_tables = {
-            'department': {'id_field': 'dept_id', 'name_field': 'department_name'},
-            'rank': {'id_field': 'rank_id', 'name_field': 'rank_name'},
-            'employment_type': {'id_field': 'emp_type_id', 'name_field': 'name'},
-            'position': {'id_field': 'position_id', 'name_field': 'position_name'},
-            'cost_center': {'id_field': 'cost_center_id', 'name_field': 'cost_center_code'},
-            'project': {'id_field': 'project_id', 'name_field': 'project_name'},
-            'location_and_offices': {'id_field': 'location_and_offices_id', 'name_field': 'name'}
-        }
-        
-        if table_name not in valid_tables:
+        if table_name not in SETTINGS_TABLES:
             return jsonify({'error': 'Invalid table name'}), 400
         
-        table_config = valid_tables[table_name]
-        id_field = table_config['id_field']
-        name_field = table_config['name_field']
-        
         cursor = mysql.connection.cursor()
         
-        # Query the settings table for active records
-        query = f"""
-            SELECT {id_field}, {name_field}
-            FROM `{table_name}`
-            WHERE company_id = %s AND status = 'Active'
-            ORDER BY {name_field}
-        """
-        
-        cursor.execute(query, (company_id,))
-        rows = cursor.fetchall()
+        # Active records for every settings table are loaded together and cached per company
+        options = settings_cache.get(cursor, company_id).options[table_name]
         cursor.close()
         
-        # Format the response
-        options = []
-        for row in rows:
-            options.append({
-                'id': row[0],
-                'name': row[1]
-            })
-        
         return jsonify({
             'table_name': table_name,
             'options': options,
             'count': len(options)
         })
         
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/analytics-prefetch/<int:company_id>/<string:period_from>/<string:period_to>/<string:aggregation_type>', methods=['GET'])
+@conditional_by_period
 def analytics_prefetch(company_id, period_from, period_to, aggregation_type):
     try:
         import json
-        ENCRYPT_KEY = os.getenv('MYSQL_ENCRYPT_KEY')
         # Parse fields from query param
         selected_fields = request.args.get('fields', None)
         if selected_fields:
@@ -909,94 +860,73 @@ def analytics_prefetch(company_id, period_from, period_to, aggregation_type):
                 selected_fields = None
         if not selected_fields:
             return jsonify({'error': 'No fields specified'}), 400
+        # MessagePack/Arrow when the Accept header asks for it, JSON otherwise
+        binary_format = negotiate_format(request)
+        unavailable = unavailable_format_response(binary_format)
+        if unavailable:
+            return unavailable
         # Optional filters
-        location_id = request.args.get('location_id', None)
-        department_id = request.args.get('department_id', None)
-        rank_id = request.args.get('rank_id', None)
-        employment_type_id = request.args.get('employment_type_id', None)
-        position_id = request.args.get('position_id', None)
-        cost_center_id = request.args.get('cost_center_id', None)
-        project_id = request.args.get('project_id', None)
         drilldown = request.args.get('drilldown', 'false').lower() == 'true'
-        # Build SQL for selected fields
-        field_sql = ', '.join([
-            f"CAST(AES_DECRYPT(p.{field}, '{ENCRYPT_KEY}') AS DECIMAL(10,2)) AS {field}" for field in selected_fields
-        ])
-        # Employee name fields (decrypted)
-        name_fields = [
-            f"CAST(AES_DECRYPT(e.last_name, '{ENCRYPT_KEY}') AS CHAR(150) CHARACTER SET utf8) AS last_name",
-            f"CAST(AES_DECRYPT(e.first_name, '{ENCRYPT_KEY}') AS CHAR(150) CHARACTER SET utf8) AS first_name"
-        ]
-        # Build the query
-        query = f'''
-            SELECT p.emp_id, {', '.join(name_fields)}, p.period_from, p.period_to, {field_sql}
-            FROM payroll_payslip p
-            JOIN employee e ON p.emp_id = e.emp_id
-            WHERE p.company_id = %s
-              AND p.period_from >= %s AND p.period_to <= %s
-        '''
-        params = [company_id, period_from, period_to]
-        if location_id:
-            query += ''' AND p.emp_id IN (
-                SELECT emp_id FROM employee_payroll_information epi
-                WHERE epi.location_and_offices_id = %s
-            )'''
-            params.append(location_id)
-        # ... add other filters as needed ...
-        query += ' ORDER BY p.period_from, p.period_to, last_name, first_name'
+        filters = filters_from_args(request.args)
         cursor = mysql.connection.cursor()
-        cursor.execute(query, tuple(params))
-        rows = cursor.fetchall()
-        colnames = [desc[0] for desc in cursor.description]
-        data = [dict(zip(colnames, row)) for row in rows]
+
+        def load_dataset():
+            query, params = build_prefetch_query(company_id, period_from, period_to, selected_fields, filters)
+            cursor.execute(query, tuple(params))
+            return [desc[0] for desc in cursor.description], cursor.fetchall()
+
+        # Summary and drilldown requests for the same slice share one decrypt round trip,
+        # as long as the data version the ETag was built from has not moved
+        cache_key = make_key(company_id, period_from, period_to, selected_fields, filters,
+                             request_data_version(cursor, company_id, period_from, period_to,
+                                                  cache=data_version_cache))
+        stream_format = requested_stream_format(request)
+        if drilldown and stream_format:
+            def open_rows():
+                # Stream from the cache when the summary already loaded this slice, otherwise
+                # read through a server-side cursor without materializing the result set
+                cached = dataset_cache.get(cache_key)
+                if cached is not None:
+                    return CachedRows(cached, DRILLDOWN_STREAM_CHUNK_ROWS)
+                query, params = build_prefetch_query(company_id, period_from, period_to, selected_fields, filters)
+                return ServerSideRows(mysql.pool, query, params, DRILLDOWN_STREAM_CHUNK_ROWS)
+            return stream_drilldown(open_rows, stream_format, aggregation_type == 'separate', cursor, company_id, filters)
+        dataset = dataset_cache.get_or_load(cache_key, load_dataset)
+        colnames = dataset.colnames
+        if binary_format:
+            filter_display = settings_cache.filter_display(cursor, company_id, filters)
+            return binary_analytics_response(binary_format, colnames, dataset.rows, selected_fields, drilldown,
+                                             aggregation_type == 'separate', filter_display)
+        if drilldown:
+            data = [dict(zip(colnames, row)) for row in dataset.rows]
+        else:
+            columns = PayslipColumns(dataset.rows, colnames, selected_fields)
         # Group by period if 'separate', else aggregate
         if aggregation_type == 'separate':
-            periods = {}
-            for row in data:
-                period_key = (row['period_from'], row['period_to'])
-                if period_key not in periods:
-                    periods[period_key] = []
-                periods[period_key].append(row)
             result = {'periods': [], 'filters': {}}
-            for (from_date, to_date), employees in sorted(periods.items()):
-                if drilldown:
+            if drilldown:
+                periods = {}
+                for row in data:
+                    period_key = (row['period_from'], row['period_to'])
+                    if period_key not in periods:
+                        periods[period_key] = []
+                    periods[period_key].append(row)
+                for (from_date, to_date), employees in sorted(periods.items()):
                     # Drill-down: return all employee rows for this period
                     result['periods'].append({
                         'period': {'from': str(from_date), 'to': str(to_date)},
                         'employees': employees
                     })
-                else:
-                    # Summary: aggregate by field
-                    summary = {field: 0.0 for field in selected_fields}
-                    for emp in employees:
-                        for field in selected_fields:
-                            summary[field] += float(emp[field] or 0)
+            else:
+                # Summary: vectorized per-period sums, plus the total across all periods
+                for (from_date, to_date), summary in columns.totals_by_period():
                     result['periods'].append({
                         'period': {'from': str(from_date), 'to': str(to_date)},
-                        'summary': {k: round(v, 2) for k, v in summary.items()}
+                        'summary': summary
                     })
-            if not drilldown:
-                # Add total across all periods
-                total = {field: 0.0 for field in selected_fields}
-                for period in result['periods']:
-                    for field in selected_fields:
-                        total[field] += period['summary'][field]
-                result['total'] = {k: round(v, 2) for k, v in total.items()}
+                result['total'] = columns.totals()
             # Get display names for all filters
-            filter_display = {}
-            filter_map = [
-                (location_id, 'location_and_offices', 'location_and_offices_id', 'name', 'location_name'),
-                (department_id, 'department', 'dept_id', 'department_name', 'department_name'),
-                (rank_id, 'rank', 'rank_id', 'rank_name', 'rank_name'),
-                (employment_type_id, 'employment_type', 'emp_type_id', 'name', 'employment_type_name'),
-                (position_id, 'position', 'position_id', 'position_name', 'position_name'),
-                (cost_center_id, 'cost_center', 'cost_center_id', 'cost_center_code', 'cost_center_code'),
-                (project_id, 'project', 'project_id', 'project_name', 'project_name'),
-            ]
-            for id_value, table, id_field, name_field, resp_field in filter_map:
-                if id_value:
-                    display = get_display_name(cursor, table, id_field, name_field, id_value, company_id)
-                    filter_display[resp_field] = display
+            filter_display = settings_cache.filter_display(cursor, company_id, filters)
             result['filters'] = filter_display
             return jsonify(result)
         else:
@@ -1005,33 +935,76 @@ def analytics_prefetch(company_id, period_from, period_to, aggregation_type):
                 # Drill-down: return all employee rows
                 return jsonify({'employees': data})
             else:
-                # Summary: aggregate by field
-                summary = {field: 0.0 for field in selected_fields}
-                for row in data:
-                    for field in selected_fields:
-                        summary[field] += float(row[field] or 0)
                 # Get display names for all filters
-                filter_display = {}
-                filter_map = [
-                    (location_id, 'location_and_offices', 'location_and_offices_id', 'name', 'location_name'),
-                    (department_id, 'department', 'dept_id', 'department_name', 'department_name'),
-                    (rank_id, 'rank', 'rank_id', 'rank_name', 'rank_name'),
-                    (employment_type_id, 'employment_type', 'emp_type_id', 'name', 'employment_type_name'),
-                    (position_id, 'position', 'position_id', 'position_name', 'position_name'),
-                    (cost_center_id, 'cost_center', 'cost_center_id', 'cost_center_code', 'cost_center_code'),
-                    (project_id, 'project', 'project_id', 'project_name', 'project_name'),
-                ]
-                for id_value, table, id_field, name_field, resp_field in filter_map:
-                    if id_value:
-                        display = get_display_name(cursor, table, id_field, name_field, id_value, company_id)
-                        filter_display[resp_field] = display
-                result = {k: round(v, 2) for k, v in summary.items()}
+                filter_display = settings_cache.filter_display(cursor, company_id, filters)
+                # Summary: vectorized sums by field
+                result = columns.totals()
                 result['filters'] = filter_display
                 return jsonify(result)
+    except PoolTimeout:
+        raise
     except Exception as e:
         app.logger.error(f"Error in analytics-prefetch: {str(e)}")
         return jsonify({'error': f'Failed to retrieve analytics-prefetch data: {str(e)}'}), 500
 
+@app.route('/api/analytics-export/<int:company_id>/<string:period_from>/<string:period_to>/<string:aggregation_type>', methods=['GET'])
+def analytics_export(company_id, period_from, period_to, aggregation_type):
+    """
+    Stream a CSV export of the analytics-prefetch drilldown.
+
+    Takes the same fields and filter parameters as /api/analytics-prefetch.
+    The separate view is a zip with one CSV per period, or a single CSV with
+    period columns when format=csv. Aggregate exports have one row per employee,
+    summed while the rows stream past.
+    """
+    try:
+        import json
+        # Parse fields from query param
+        selected_fields = request.args.get('fields', None)
+        if selected_fields:
+            try:
+                selected_fields = json.loads(selected_fields)
+                if not isinstance(selected_fields, list):
+                    selected_fields = None
+            except:
+                selected_fields = None
+        if not selected_fields:
+            return jsonify({'error': 'No fields specified'}), 400
+        filters = filters_from_args(request.args)
+        labels = get_all_field_display_names()
+        name_prefix = f'drilldown_{company_id}'
+        if aggregation_type == 'separate':
+            # Period-ordered rows, reused from the cache when the summary loaded them at this data version
+            cursor = mysql.connection.cursor()
+            version = request_data_version(cursor, company_id, period_from, period_to, cache=data_version_cache)
+            cursor.close()
+            cached = dataset_cache.get(make_key(company_id, period_from, period_to, selected_fields, filters, version))
+            if cached is not None:
+                rows = CachedRows(cached, DRILLDOWN_STREAM_CHUNK_ROWS)
+            else:
+                query, params = build_prefetch_query(company_id, period_from, period_to, selected_fields, filters)
+                rows = ServerSideRows(mysql.pool, query, params, DRILLDOWN_STREAM_CHUNK_ROWS)
+            if request.args.get('format') == 'csv':
+                response = streamed_response(rows, csv_body(rows, selected_fields, labels), 'text/csv')
+                filename = f'{name_prefix}_{period_from}_{period_to}.csv'
+            else:
+                response = streamed_response(rows, zip_body(rows, selected_fields, labels, name_prefix), 'application/zip')
+                filename = f'{name_prefix}_{period_from}_{period_to}.zip'
+        else:
+            # Employee-ordered rows so each employee collapses to one row as it streams past
+            query, params = build_prefetch_query(company_id, period_from, period_to, selected_fields, filters,
+                                                 order_by='employee')
+            rows = ServerSideRows(mysql.pool, query, params, DRILLDOWN_STREAM_CHUNK_ROWS)
+            response = streamed_response(rows, csv_body(rows, selected_fields, labels, collapse=True), 'text/csv')
+            filename = f'{name_prefix}_{period_from}_{period_to}.csv'
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        app.logger.error(f"Error in analytics-export: {str(e)}")
+        return jsonify({'error': f'Failed to export analytics data: {str(e)}'}), 500
+
 @app.route('/api/shifts/schedule-type-counts/<int:company_id>', methods=['GET'])
 def get_schedule_type_counts(company_id):
     try:
@@ -1052,6 +1025,8 @@ def get_schedule_type_counts(company_id):
             {"work_type_name": row[0], "count": row[1]} for row in results
         ]
         return jsonify({"schedule_types": data})
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1078,6 +1053,8 @@ def get_schedules_by_type(company_id, schedule_type):
             {"work_schedule_id": row[0], "name": row[1], "employee_count": row[2]} for row in results
         ]
         return jsonify({"schedules": data})
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1138,6 +1115,8 @@ def get_shifts_allocation_drilldown(company_id, schedule_type, shift_id):
             'employee_count': len(employees)
         })
         
+    except PoolTimeout:
+        raise
     except Exception as e:
         app.logger.error(f"Error in shifts allocation drilldown: {str(e)}")
         return jsonify({'error': f'Failed to retrieve shifts allocation drilldown data: {str(e)}'}), 500
@@ -1327,6 +1306,8 @@ def get_shifts_by_start_time(company_id, start_time):
         
         return jsonify(response_data)
         
+    except PoolTimeout:
+        raise
     except Exception as e:
         app.logger.error(f"Error in shifts by start time: {str(e)}")
         return jsonify({'error': f'Failed to retrieve shifts by start time: {str(e)}'}), 500
@@ -1375,20 +1356,26 @@ def get_employee_shifts(company_id, name_search):
             LEFT JOIN `rank` rk ON epi.rank_id = rk.rank_id AND rk.company_id = %s
             WHERE ess.company_id = %s 
                 AND ws.comp_id = %s
-                AND (CAST(AES_DECRYPT(e.last_name, %s) AS CHAR(150) CHARACTER SET utf8) LIKE %s
-                     OR CAST(AES_DECRYPT(e.first_name, %s) AS CHAR(150) CHARACTER SET utf8) LIKE %s)
         '''
         
+        # Resolve the name search from the in-memory index instead of decrypting every employee
+        matching_emp_ids = [
+            employee.emp_id for employee in name_index.search(cursor, company_id, name_search)
+        ]
+        
         # Build parameters array
-        search_param = f"%{name_search}%"
         params = [
             ENCRYPT_KEY, ENCRYPT_KEY,  # For name decryption
             company_id, company_id, company_id,  # For joins
             company_id, company_id,  # For main filters
-            ENCRYPT_KEY, search_param,  # For last_name search
-            ENCRYPT_KEY, search_param   # For first_name search
         ]
         
+        if matching_emp_ids:
+            query += f" AND ess.emp_id IN ({', '.join(['%s'] * len(matching_emp_ids))})"
+            params.extend(matching_emp_ids)
+        else:
+            query += " AND 1 = 0"
+        
         # Add optional filters
         if status_filter and status_filter != 'all':
             query += " AND ess.status = %s"
@@ -1500,10 +1487,237 @@ def get_employee_shifts(company_id, name_search):
                 }
             })
             
+    except PoolTimeout:
+        raise
     except Exception as e:
         app.logger.error(f"Error in employee-shifts: {str(e)}")
         return jsonify({'error': f'Failed to retrieve employee shifts data: {str(e)}'}), 500
 
+def shift_details_queries(company_id, shift_id):
+    """
+    The independent queries behind /api/shift-details, keyed by result name.
+    
+    Returns:
+        Dict of name -> (query, params, fetch) for mysql.fetch_concurrently
+    """
+    # Comprehensive query to get ALL existing work_schedule fields
+    work_schedule_query = '''
+        SELECT 
+            work_schedule_id, name, work_type_name, comp_id, flag_custom, status, `default`,
+            category_id, employees_required, notes, bg_color, break_rules, assumed_breaks,
+            advanced_settings, account_id, enable_lunch_break, break_type_1, track_break_1,
+            break_schedule_1, break_started_after, enable_additional_breaks,
+            num_of_additional_breaks, break_type_2, track_break_2, break_schedule_2,
+            additional_break_started_after_1, additional_break_started_after_2,
+            enable_shift_threshold, enable_grace_period, tardiness_rule, disable_premium_payments,
+            enable_premium_payments_starts_on_holiday_restday, flag_migrate, enable_breaks_on_holiday,
+            enable_working_on_restday, total_hrs_per_pay_period, total_hrs_per_day, period_type,
+            advanced_rules_premium_pay, pay_holiday_premium_on_regular_workday,
+            pay_holiday_premium_on_regular_workday_nsd, pay_holiday_premium_on_holiday,
+            pay_holiday_premium_on_holiday_nsd, pay_restday_premium_on_regular_workday,
+            pay_restday_premium_on_regular_workday_nsd, pay_holiday_premium_on_restday,
+            pay_holiday_premium_on_restday_nsd, total_hrs_per_week, created_date, updated_date,
+            created_by_account_id, updated_by_account_id, flag_default_restday,
+            pay_ot_holiday_rates_workday_holiday, pay_ot_holiday_rates_holiday_workday,
+            pay_ot_rest_day_rates_workday_restday, pay_ot_rest_day_rates_restday_workday,
+            paycheck_total_hrs_per_pay_period, enable_advance_break_rules, archive, archived_date
+        FROM work_schedule 
+        WHERE work_schedule_id = %s AND comp_id = %s AND status = 'Active'
+        LIMIT 1
+    '''
+    
+    # Get ALL regular_schedule fields
+    regular_schedule_query = '''
+        SELECT 
+            reg_work_sched_id, work_schedule_id, work_schedule_name, days_of_work,
+            work_start_time, work_end_time, total_work_hours, company_id, break_in_min,
+            latest_time_in_allowed, status, break_1, break_2, flag_half_day
+        FROM regular_schedule 
+        WHERE work_schedule_id = %s AND company_id = %s
+        LIMIT 1
+    '''
+    
+    # Get ALL flexible_hours fields if they exist
+    flexible_hours_query = '''
+        SELECT 
+            workday_settings_id, not_required_login, total_hours_for_the_day, 
+            total_hours_for_the_week, total_days_per_year, latest_time_in_allowed,
+            number_of_breaks_per_day, duration_of_lunch_break_per_day, 
+            duration_of_short_break_per_day, work_schedule_id, company_id
+        FROM flexible_hours 
+        WHERE work_schedule_id = %s AND company_id = %s
+        LIMIT 1
+    '''
+    
+    # Get ALL rest_day entries
+    rest_day_query = '''
+        SELECT 
+            rest_day_id, rest_day, company_id, work_schedule_id, status, deleted
+        FROM rest_day 
+        WHERE work_schedule_id = %s AND company_id = %s AND status = 'Active' AND deleted = '0'
+    '''
+    
+    # Get employee count for summary
+    count_query = '''
+        SELECT COUNT(DISTINCT ess.emp_id) as employee_count
+        FROM employee_shifts_schedule ess
+        WHERE ess.work_schedule_id = %s 
+            AND ess.status = 'Active' 
+            AND ess.company_id = %s
+    '''
+    params = (shift_id, company_id)
+    return {
+        'work_schedule': (work_schedule_query, params, 'one'),
+        'regular_schedule': (regular_schedule_query, params, 'one'),
+        'flexible_hours': (flexible_hours_query, params, 'one'),
+        'rest_days': (rest_day_query, params, 'all'),
+        'employee_count': (count_query, params, 'one'),
+    }
+
+def build_shift_details(company_id, shift_id, results):
+    """
+    Map the results of shift_details_queries to the /api/shift-details document.
+    
+    Returns:
+        The response dict, or None if the shift is not found or inactive
+    """
+    ws_result = results['work_schedule']
+    if not ws_result:
+        return None
+    
+    # Map ALL work_schedule fields
+    work_schedule_data = {
+        'WORK_SCHEDULE_ID': ws_result[0],
+        'NAME': ws_result[1] if ws_result[1] else 'N/A',
+        'WORK_TYPE_NAME': ws_result[2] if ws_result[2] else 'N/A',
+        'COMP_ID': ws_result[3] if ws_result[3] else 'N/A',
+        'FLAG_CUSTOM': ws_result[4] if ws_result[4] else 'N/A',
+        'STATUS': ws_result[5] if ws_result[5] else 'N/A',
+        'DEFAULT': ws_result[6] if ws_result[6] else 'N/A',
+        'CATEGORY_ID': ws_result[7] if ws_result[7] else 'N/A',
+        'EMPLOYEES_REQUIRED': ws_result[8] if ws_result[8] else 'N/A',
+        'NOTES': ws_result[9] if ws_result[9] else 'N/A',
+        'BG_COLOR': ws_result[10] if ws_result[10] else 'N/A',
+        'BREAK_RULES': ws_result[11] if ws_result[11] else 'N/A',
+        'ASSUMED_BREAKS': ws_result[12] if ws_result[12] else 'N/A',
+        'ADVANCED_SETTINGS': ws_result[13] if ws_result[13] else 'N/A',
+        'ACCOUNT_ID': ws_result[14] if ws_result[14] else 'N/A',
+        'ENABLE_LUNCH_BREAK': ws_result[15] if ws_result[15] else 'N/A',
+        'BREAK_TYPE_1': ws_result[16] if ws_result[16] else 'N/A',
+        'TRACK_BREAK_1': ws_result[17] if ws_result[17] else 'N/A',
+        'BREAK_SCHEDULE_1': ws_result[18] if ws_result[18] else 'N/A',
+        'BREAK_STARTED_AFTER': ws_result[19] if ws_result[19] else 'N/A',
+        'ENABLE_ADDITIONAL_BREAKS': ws_result[20] if ws_result[20] else 'N/A',
+        'NUM_OF_ADDITIONAL_BREAKS': ws_result[21] if ws_result[21] else 'N/A',
+        'BREAK_TYPE_2': ws_result[22] if ws_result[22] else 'N/A',
+        'TRACK_BREAK_2': ws_result[23] if ws_result[23] else 'N/A',
+        'BREAK_SCHEDULE_2': ws_result[24] if ws_result[24] else 'N/A',
+        'ADDITIONAL_BREAK_STARTED_AFTER_1': ws_result[25] if ws_result[25] else 'N/A',
+        'ADDITIONAL_BREAK_STARTED_AFTER_2': ws_result[26] if ws_result[26] else 'N/A',
+        'ENABLE_SHIFT_THRESHOLD': ws_result[27] if ws_result[27] else 'N/A',
+        'ENABLE_GRACE_PERIOD': ws_result[28] if ws_result[28] else 'N/A',
+        'TARDINESS_RULE': ws_result[29] if ws_result[29] else 'N/A',
+        'DISABLE_PREMIUM_PAYMENTS': ws_result[30] if ws_result[30] else 'N/A',
+        'ENABLE_PREMIUM_PAYMENTS_STARTS_ON_HOLIDAY_RESTDAY': ws_result[31] if ws_result[31] else 'N/A',
+        'FLAG_MIGRATE': ws_result[32] if ws_result[32] else 'N/A',
+        'ENABLE_BREAKS_ON_HOLIDAY': ws_result[33] if ws_result[33] else 'N/A',
+        'ENABLE_WORKING_ON_RESTDAY': ws_result[34] if ws_result[34] else 'N/A',
+        'TOTAL_HRS_PER_PAY_PERIOD': ws_result[35] if ws_result[35] else 'N/A',
+        'TOTAL_HRS_PER_DAY': ws_result[36] if ws_result[36] else 'N/A',
+        'PERIOD_TYPE': ws_result[37] if ws_result[37] else 'N/A',
+        'ADVANCED_RULES_PREMIUM_PAY': ws_result[38] if ws_result[38] else 'N/A',
+        'PAY_HOLIDAY_PREMIUM_ON_REGULAR_WORKDAY': ws_result[39] if ws_result[39] else 'N/A',
+        'PAY_HOLIDAY_PREMIUM_ON_REGULAR_WORKDAY_NSD': ws_result[40] if ws_result[40] else 'N/A',
+        'PAY_HOLIDAY_PREMIUM_ON_HOLIDAY': ws_result[41] if ws_result[41] else 'N/A',
+        'PAY_HOLIDAY_PREMIUM_ON_HOLIDAY_NSD': ws_result[42] if ws_result[42] else 'N/A',
+        'PAY_RESTDAY_PREMIUM_ON_REGULAR_WORKDAY': ws_result[43] if ws_result[43] else 'N/A',
+        'PAY_RESTDAY_PREMIUM_ON_REGULAR_WORKDAY_NSD': ws_result[44] if ws_result[44] else 'N/A',
+        'PAY_HOLIDAY_PREMIUM_ON_RESTDAY': ws_result[45] if ws_result[45] else 'N/A',
+        'PAY_HOLIDAY_PREMIUM_ON_RESTDAY_NSD': ws_result[46] if ws_result[46] else 'N/A',
+        'TOTAL_HRS_PER_WEEK': ws_result[47] if ws_result[47] else 'N/A',
+        'CREATED_DATE': ws_result[48].strftime('%Y-%m-%d %H:%M:%S') if ws_result[48] else 'N/A',
+        'UPDATED_DATE': ws_result[49].strftime('%Y-%m-%d %H:%M:%S') if ws_result[49] else 'N/A',
+        'CREATED_BY_ACCOUNT_ID': ws_result[50] if ws_result[50] else 'N/A',
+        'UPDATED_BY_ACCOUNT_ID': ws_result[51] if ws_result[51] else 'N/A',
+        'FLAG_DEFAULT_RESTDAY': ws_result[52] if ws_result[52] else 'N/A',
+        'PAY_OT_HOLIDAY_RATES_WORKDAY_HOLIDAY': ws_result[53] if ws_result[53] else 'N/A',
+        'PAY_OT_HOLIDAY_RATES_HOLIDAY_WORKDAY': ws_result[54] if ws_result[54] else 'N/A',
+        'PAY_OT_REST_DAY_RATES_WORKDAY_RESTDAY': ws_result[55] if ws_result[55] else 'N/A',
+        'PAY_OT_REST_DAY_RATES_RESTDAY_WORKDAY': ws_result[56] if ws_result[56] else 'N/A',
+        'PAYCHECK_TOTAL_HRS_PER_PAY_PERIOD': ws_result[57] if ws_result[57] else 'N/A',
+        'ENABLE_ADVANCE_BREAK_RULES': ws_result[58] if ws_result[58] else 'N/A',
+        'ARCHIVE': ws_result[59] if ws_result[59] else 'N/A',
+        'ARCHIVED_DATE': ws_result[60].strftime('%Y-%m-%d %H:%M:%S') if ws_result[60] else 'N/A'
+    }
+    
+    rs_result = results['regular_schedule']
+    regular_schedule_data = {}
+    if rs_result:
+        regular_schedule_data = {
+            'REG_WORK_SCHED_ID': rs_result[0] if rs_result[0] else 'N/A',
+            'WORK_SCHEDULE_ID': rs_result[1] if rs_result[1] else 'N/A',
+            'WORK_SCHEDULE_NAME': rs_result[2] if rs_result[2] else 'N/A',
+            'DAYS_OF_WORK': rs_result[3] if rs_result[3] else 'N/A',
+            'WORK_START_TIME': str(rs_result[4]) if rs_result[4] else 'N/A',
+            'WORK_END_TIME': str(rs_result[5]) if rs_result[5] else 'N/A',
+            'TOTAL_WORK_HOURS': float(rs_result[6]) if rs_result[6] else 'N/A',
+            'COMPANY_ID': rs_result[7] if rs_result[7] else 'N/A',
+            'BREAK_IN_MIN': rs_result[8] if rs_result[8] else 'N/A',
+            'LATEST_TIME_IN_ALLOWED': rs_result[9] if rs_result[9] else 'N/A',
+            'STATUS': rs_result[10] if rs_result[10] else 'N/A',
+            'BREAK_1': float(rs_result[11]) if rs_result[11] else 'N/A',
+            'BREAK_2': float(rs_result[12]) if rs_result[12] else 'N/A',
+            'FLAG_HALF_DAY': rs_result[13] if rs_result[13] else 'N/A'
+        }
+    
+    fh_result = results['flexible_hours']
+    flexible_hours_data = {}
+    if fh_result:
+        flexible_hours_data = {
+            'WORKDAY_SETTINGS_ID': fh_result[0] if fh_result[0] else 'N/A',
+            'NOT_REQUIRED_LOGIN': fh_result[1] if fh_result[1] else 'N/A',
+            'TOTAL_HOURS_FOR_THE_DAY': fh_result[2] if fh_result[2] else 'N/A',
+            'TOTAL_HOURS_FOR_THE_WEEK': fh_result[3] if fh_result[3] else 'N/A',
+            'TOTAL_DAYS_PER_YEAR': fh_result[4] if fh_result[4] else 'N/A',
+            'LATEST_TIME_IN_ALLOWED': str(fh_result[5]) if fh_result[5] else 'N/A',
+            'NUMBER_OF_BREAKS_PER_DAY': fh_result[6] if fh_result[6] else 'N/A',
+            'DURATION_OF_LUNCH_BREAK_PER_DAY': fh_result[7] if fh_result[7] else 'N/A',
+            'DURATION_OF_SHORT_BREAK_PER_DAY': fh_result[8] if fh_result[8] else 'N/A',
+            'WORK_SCHEDULE_ID': fh_result[9] if fh_result[9] else 'N/A',
+            'COMPANY_ID': fh_result[10] if fh_result[10] else 'N/A'
+        }
+    
+    rd_results = results['rest_days']
+    rest_days_data = []
+    for rd_result in rd_results:
+        rest_days_data.append({
+            'REST_DAY_ID': rd_result[0] if rd_result[0] else 'N/A',
+            'REST_DAY': rd_result[1] if rd_result[1] else 'N/A',
+            'COMPANY_ID': rd_result[2] if rd_result[2] else 'N/A',
+            'WORK_SCHEDULE_ID': rd_result[3] if rd_result[3] else 'N/A',
+            'STATUS': rd_result[4] if rd_result[4] else 'N/A',
+            'DELETED': rd_result[5] if rd_result[5] else 'N/A'
+        })
+    
+    count_result = results['employee_count']
+    employee_count = count_result[0] if count_result else 0
+    
+    # Return comprehensive data exactly as shown in the UI
+    response = {
+        'shift_summary': {
+            'shift_name': work_schedule_data['NAME'],
+            'employee_count': employee_count
+        },
+        'work_schedule': work_schedule_data,
+        'regular_schedule': regular_schedule_data,
+        'flexible_hours': flexible_hours_data if flexible_hours_data else None,
+        'rest_days': rest_days_data,
+        'company_id': company_id,
+        'shift_id': shift_id
+    }
+    
+    return response
+
 @app.route('/api/shift-details/<int:company_id>/<int:shift_id>', methods=['GET'])
 def get_shift_details(company_id, shift_id):
     """
@@ -1514,223 +1728,17 @@ def get_shift_details(company_id, shift_id):
         # Validate parameters
         if not all([company_id, shift_id]):
             return jsonify({'error': 'Missing required parameters'}), 400
-            
-        cursor = mysql.connection.cursor()
-        
-        # Comprehensive query to get ALL existing work_schedule fields
-        work_schedule_query = '''
-            SELECT 
-                work_schedule_id, name, work_type_name, comp_id, flag_custom, status, `default`,
-                category_id, employees_required, notes, bg_color, break_rules, assumed_breaks,
-                advanced_settings, account_id, enable_lunch_break, break_type_1, track_break_1,
-                break_schedule_1, break_started_after, enable_additional_breaks,
-                num_of_additional_breaks, break_type_2, track_break_2, break_schedule_2,
-                additional_break_started_after_1, additional_break_started_after_2,
-                enable_shift_threshold, enable_grace_period, tardiness_rule, disable_premium_payments,
-                enable_premium_payments_starts_on_holiday_restday, flag_migrate, enable_breaks_on_holiday,
-                enable_working_on_restday, total_hrs_per_pay_period, total_hrs_per_day, period_type,
-                advanced_rules_premium_pay, pay_holiday_premium_on_regular_workday,
-                pay_holiday_premium_on_regular_workday_nsd, pay_holiday_premium_on_holiday,
-                pay_holiday_premium_on_holiday_nsd, pay_restday_premium_on_regular_workday,
-                pay_restday_premium_on_regular_workday_nsd, pay_holiday_premium_on_restday,
-                pay_holiday_premium_on_restday_nsd, total_hrs_per_week, created_date, updated_date,
-                created_by_account_id, updated_by_account_id, flag_default_restday,
-                pay_ot_holiday_rates_workday_holiday, pay_ot_holiday_rates_holiday_workday,
-                pay_ot_rest_day_rates_workday_restday, pay_ot_rest_day_rates_restday_workday,
-                paycheck_total_hrs_per_pay_period, enable_advance_break_rules, archive, archived_date
-            FROM work_schedule 
-            WHERE work_schedule_id = %s AND comp_id = %s AND status = 'Active'
-            LIMIT 1
-        '''
         
-        cursor.execute(work_schedule_query, (shift_id, company_id))
-        ws_result = cursor.fetchone()
-        
-        if not ws_result:
-            cursor.close()
+        # The five lookups are independent, run them concurrently on pooled connections
+        results = mysql.fetch_concurrently(shift_details_queries(company_id, shift_id))
+        response = build_shift_details(company_id, shift_id, results)
+        if response is None:
             return jsonify({'error': 'Shift not found or inactive'}), 404
         
-        # Map ALL work_schedule fields
-        work_schedule_data = {
-            'WORK_SCHEDULE_ID': ws_result[0],
-            'NAME': ws_result[1] if ws_result[1] else 'N/A',
-            'WORK_TYPE_NAME': ws_result[2] if ws_result[2] else 'N/A',
-            'COMP_ID': ws_result[3] if ws_result[3] else 'N/A',
-            'FLAG_CUSTOM': ws_result[4] if ws_result[4] else 'N/A',
-            'STATUS': ws_result[5] if ws_result[5] else 'N/A',
-            'DEFAULT': ws_result[6] if ws_result[6] else 'N/A',
-            'CATEGORY_ID': ws_result[7] if ws_result[7] else 'N/A',
-            'EMPLOYEES_REQUIRED': ws_result[8] if ws_result[8] else 'N/A',
-            'NOTES': ws_result[9] if ws_result[9] else 'N/A',
-            'BG_COLOR': ws_result[10] if ws_result[10] else 'N/A',
-            'BREAK_RULES': ws_result[11] if ws_result[11] else 'N/A',
-            'ASSUMED_BREAKS': ws_result[12] if ws_result[12] else 'N/A',
-            'ADVANCED_SETTINGS': ws_result[13] if ws_result[13] else 'N/A',
-            'ACCOUNT_ID': ws_result[14] if ws_result[14] else 'N/A',
-            'ENABLE_LUNCH_BREAK': ws_result[15] if ws_result[15] else 'N/A',
-            'BREAK_TYPE_1': ws_result[16] if ws_result[16] else 'N/A',
-            'TRACK_BREAK_1': ws_result[17] if ws_result[17] else 'N/A',
-            'BREAK_SCHEDULE_1': ws_result[18] if ws_result[18] else 'N/A',
-            'BREAK_STARTED_AFTER': ws_result[19] if ws_result[19] else 'N/A',
-            'ENABLE_ADDITIONAL_BREAKS': ws_result[20] if ws_result[20] else 'N/A',
-            'NUM_OF_ADDITIONAL_BREAKS': ws_result[21] if ws_result[21] else 'N/A',
-            'BREAK_TYPE_2': ws_result[22] if ws_result[22] else 'N/A',
-            'TRACK_BREAK_2': ws_result[23] if ws_result[23] else 'N/A',
-            'BREAK_SCHEDULE_2': ws_result[24] if ws_result[24] else 'N/A',
-            'ADDITIONAL_BREAK_STARTED_AFTER_1': ws_result[25] if ws_result[25] else 'N/A',
-            'ADDITIONAL_BREAK_STARTED_AFTER_2': ws_result[26] if ws_result[26] else 'N/A',
-            'ENABLE_SHIFT_THRESHOLD': ws_result[27] if ws_result[27] else 'N/A',
-            'ENABLE_GRACE_PERIOD': ws_result[28] if ws_result[28] else 'N/A',
-            'TARDINESS_RULE': ws_result[29] if ws_result[29] else 'N/A',
-            'DISABLE_PREMIUM_PAYMENTS': ws_result[30] if ws_result[30] else 'N/A',
-            'ENABLE_PREMIUM_PAYMENTS_STARTS_ON_HOLIDAY_RESTDAY': ws_result[31] if ws_result[31] else 'N/A',
-            'FLAG_MIGRATE': ws_result[32] if ws_result[32] else 'N/A',
-            'ENABLE_BREAKS_ON_HOLIDAY': ws_result[33] if ws_result[33] else 'N/A',
-            'ENABLE_WORKING_ON_RESTDAY': ws_result[34] if ws_result[34] else 'N/A',
-            'TOTAL_HRS_PER_PAY_PERIOD': ws_result[35] if ws_result[35] else 'N/A',
-            'TOTAL_HRS_PER_DAY': ws_result[36] if ws_result[36] else 'N/A',
-            'PERIOD_TYPE': ws_result[37] if ws_result[37] else 'N/A',
-            'ADVANCED_RULES_PREMIUM_PAY': ws_result[38] if ws_result[38] else 'N/A',
-            'PAY_HOLIDAY_PREMIUM_ON_REGULAR_WORKDAY': ws_result[39] if ws_result[39] else 'N/A',
-            'PAY_HOLIDAY_PREMIUM_ON_REGULAR_WORKDAY_NSD': ws_result[40] if ws_result[40] else 'N/A',
-            'PAY_HOLIDAY_PREMIUM_ON_HOLIDAY': ws_result[41] if ws_result[41] else 'N/A',
-            'PAY_HOLIDAY_PREMIUM_ON_HOLIDAY_NSD': ws_result[42] if ws_result[42] else 'N/A',
-            'PAY_RESTDAY_PREMIUM_ON_REGULAR_WORKDAY': ws_result[43] if ws_result[43] else 'N/A',
-            'PAY_RESTDAY_PREMIUM_ON_REGULAR_WORKDAY_NSD': ws_result[44] if ws_result[44] else 'N/A',
-            'PAY_HOLIDAY_PREMIUM_ON_RESTDAY': ws_result[45] if ws_result[45] else 'N/A',
-            'PAY_HOLIDAY_PREMIUM_ON_RESTDAY_NSD': ws_result[46] if ws_result[46] else 'N/A',
-            'TOTAL_HRS_PER_WEEK': ws_result[47] if ws_result[47] else 'N/A',
-            'CREATED_DATE': ws_result[48].strftime('%Y-%m-%d %H:%M:%S') if ws_result[48] else 'N/A',
-            'UPDATED_DATE': ws_result[49].strftime('%Y-%m-%d %H:%M:%S') if ws_result[49] else 'N/A',
-            'CREATED_BY_ACCOUNT_ID': ws_result[50] if ws_result[50] else 'N/A',
-            'UPDATED_BY_ACCOUNT_ID': ws_result[51] if ws_result[51] else 'N/A',
-            'FLAG_DEFAULT_RESTDAY': ws_result[52] if ws_result[52] else 'N/A',
-            'PAY_OT_HOLIDAY_RATES_WORKDAY_HOLIDAY': ws_result[53] if ws_result[53] else 'N/A',
-            'PAY_OT_HOLIDAY_RATES_HOLIDAY_WORKDAY': ws_result[54] if ws_result[54] else 'N/A',
-            'PAY_OT_REST_DAY_RATES_WORKDAY_RESTDAY': ws_result[55] if ws_result[55] else 'N/A',
-            'PAY_OT_REST_DAY_RATES_RESTDAY_WORKDAY': ws_result[56] if ws_result[56] else 'N/A',
-            'PAYCHECK_TOTAL_HRS_PER_PAY_PERIOD': ws_result[57] if ws_result[57] else 'N/A',
-            'ENABLE_ADVANCE_BREAK_RULES': ws_result[58] if ws_result[58] else 'N/A',
-            'ARCHIVE': ws_result[59] if ws_result[59] else 'N/A',
-            'ARCHIVED_DATE': ws_result[60].strftime('%Y-%m-%d %H:%M:%S') if ws_result[60] else 'N/A'
-        }
-        
-        # Get ALL regular_schedule fields
-        regular_schedule_query = '''
-            SELECT 
-                reg_work_sched_id, work_schedule_id, work_schedule_name, days_of_work,
-                work_start_time, work_end_time, total_work_hours, company_id, break_in_min,
-                latest_time_in_allowed, status, break_1, break_2, flag_half_day
-            FROM regular_schedule 
-            WHERE work_schedule_id = %s AND company_id = %s
-            LIMIT 1
-        '''
-        
-        cursor.execute(regular_schedule_query, (shift_id, company_id))
-        rs_result = cursor.fetchone()
-        
-        regular_schedule_data = {}
-        if rs_result:
-            regular_schedule_data = {
-                'REG_WORK_SCHED_ID': rs_result[0] if rs_result[0] else 'N/A',
-                'WORK_SCHEDULE_ID': rs_result[1] if rs_result[1] else 'N/A',
-                'WORK_SCHEDULE_NAME': rs_result[2] if rs_result[2] else 'N/A',
-                'DAYS_OF_WORK': rs_result[3] if rs_result[3] else 'N/A',
-                'WORK_START_TIME': str(rs_result[4]) if rs_result[4] else 'N/A',
-                'WORK_END_TIME': str(rs_result[5]) if rs_result[5] else 'N/A',
-                'TOTAL_WORK_HOURS': float(rs_result[6]) if rs_result[6] else 'N/A',
-                'COMPANY_ID': rs_result[7] if rs_result[7] else 'N/A',
-                'BREAK_IN_MIN': rs_result[8] if rs_result[8] else 'N/A',
-                'LATEST_TIME_IN_ALLOWED': rs_result[9] if rs_result[9] else 'N/A',
-                'STATUS': rs_result[10] if rs_result[10] else 'N/A',
-                'BREAK_1': float(rs_result[11]) if rs_result[11] else 'N/A',
-                'BREAK_2': float(rs_result[12]) if rs_result[12] else 'N/A',
-                'FLAG_HALF_DAY': rs_result[13] if rs_result[13] else 'N/A'
-            }
-        
-        # Get ALL flexible_hours fields if they exist
-        flexible_hours_query = '''
-            SELECT 
-                workday_settings_id, not_required_login, total_hours_for_the_day, 
-                total_hours_for_the_week, total_days_per_year, latest_time_in_allowed,
-                number_of_breaks_per_day, duration_of_lunch_break_per_day, 
-                duration_of_short_break_per_day, work_schedule_id, company_id
-            FROM flexible_hours 
-            WHERE work_schedule_id = %s AND company_id = %s
-            LIMIT 1
-        '''
-        
-        cursor.execute(flexible_hours_query, (shift_id, company_id))
-        fh_result = cursor.fetchone()
-        
-        flexible_hours_data = {}
-        if fh_result:
-            flexible_hours_data = {
-                'WORKDAY_SETTINGS_ID': fh_result[0] if fh_result[0] else 'N/A',
-                'NOT_REQUIRED_LOGIN': fh_result[1] if fh_result[1] else 'N/A',
-                'TOTAL_HOURS_FOR_THE_DAY': fh_result[2] if fh_result[2] else 'N/A',
-                'TOTAL_HOURS_FOR_THE_WEEK': fh_result[3] if fh_result[3] else 'N/A',
-                'TOTAL_DAYS_PER_YEAR': fh_result[4] if fh_result[4] else 'N/A',
-                'LATEST_TIME_IN_ALLOWED': str(fh_result[5]) if fh_result[5] else 'N/A',
-                'NUMBER_OF_BREAKS_PER_DAY': fh_result[6] if fh_result[6] else 'N/A',
-                'DURATION_OF_LUNCH_BREAK_PER_DAY': fh_result[7] if fh_result[7] else 'N/A',
-                'DURATION_OF_SHORT_BREAK_PER_DAY': fh_result[8] if fh_result[8] else 'N/A',
-                'WORK_SCHEDULE_ID': fh_result[9] if fh_result[9] else 'N/A',
-                'COMPANY_ID': fh_result[10] if fh_result[10] else 'N/A'
-            }
-        
-        # Get ALL rest_day entries
-        rest_day_query = '''
-            SELECT 
-                rest_day_id, rest_day, company_id, work_schedule_id, status, deleted
-            FROM rest_day 
-            WHERE work_schedule_id = %s AND company_id = %s AND status = 'Active' AND deleted = '0'
-        '''
-        
-        cursor.execute(rest_day_query, (shift_id, company_id))
-        rd_results = cursor.fetchall()
-        
-        rest_days_data = []
-        for rd_result in rd_results:
-            rest_days_data.append({
-                'REST_DAY_ID': rd_result[0] if rd_result[0] else 'N/A',
-                'REST_DAY': rd_result[1] if rd_result[1] else 'N/A',
-                'COMPANY_ID': rd_result[2] if rd_result[2] else 'N/A',
-                'WORK_SCHEDULE_ID': rd_result[3] if rd_result[3] else 'N/A',
-                'STATUS': rd_result[4] if rd_result[4] else 'N/A',
-                'DELETED': rd_result[5] if rd_result[5] else 'N/A'
-            })
-        
-        # Get employee count for summary
-        count_query = '''
-            SELECT COUNT(DISTINCT ess.emp_id) as employee_count
-            FROM employee_shifts_schedule ess
-            WHERE ess.work_schedule_id = %s 
-                AND ess.status = 'Active' 
-                AND ess.company_id = %s
-        '''
-        cursor.execute(count_query, (shift_id, company_id))
-        count_result = cursor.fetchone()
-        employee_count = count_result[0] if count_result else 0
-        
-        cursor.close()
-        
-        # Return comprehensive data exactly as shown in the UI
-        response = {
-            'shift_summary': {
-                'shift_name': work_schedule_data['NAME'],
-                'employee_count': employee_count
-            },
-            'work_schedule': work_schedule_data,
-            'regular_schedule': regular_schedule_data,
-            'flexible_hours': flexible_hours_data if flexible_hours_data else None,
-            'rest_days': rest_days_data,
-            'company_id': company_id,
-            'shift_id': shift_id
-        }
-        
         return jsonify(response)
         
+    except PoolTimeout:
+        raise
     except Exception as e:
         app.logger.error(f"Error in shift details: {str(e)}")
         return jsonify({'error': f'Failed to retrieve shift details: {str(e)}'}), 500
@@ -1794,6 +1802,8 @@ def get_shift_employees(company_id, shift_id):
             'shift_id': shift_id
         })
         
+    except PoolTimeout:
+        raise
     except Exception as e:
         app.logger.error(f"Error in shift employees: {str(e)}")
         return jsonify({'error': f'Failed to retrieve shift employees: {str(e)}'}), 500
@@ -1815,10 +1825,120 @@ def get_companies():
             {"company_id": row[0], "company_name": row[1]} for row in rows
         ]
         return jsonify({"companies": companies})
+    except PoolTimeout:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/pool-stats', methods=['GET'])
+def get_pool_stats():
+    return jsonify(mysql.pool.stats())
+
+@app.route('/api/query-cache-stats', methods=['GET'])
+def get_query_cache_stats():
+    return jsonify(query_cache.stats())
+
+@app.route('/api/admin/slow-queries', methods=['GET'])
+@admin_only
+def get_slow_queries():
+    """Statement shapes slower than SLOW_QUERY_MS, by total time spent in them."""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({
+        'threshold_ms': slow_query_log.threshold_ms,
+        'queries': slow_query_log.top(limit),
+    })
+
+@app.route('/metrics', methods=['GET'])
+@admin_only
+def get_metrics():
+    return request_timing.metrics_response()
+
+# Views re-raise PoolTimeout past their generic 500 handlers so it ends up here
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    app.logger.error(f"Database pool exhausted: {str(e)}")
+    return jsonify({'error': 'Database is busy, please retry'}), 503
+
 # --- Deep Dive Endpoints ---
+def deepdive_payroll_cronjob_query(company_id, emp_id, date_from, date_to=None):
+    """
+    payroll_cronjob rows whose period overlaps date_from..date_to (or covers
+    date_from), joined to the payslip of the same period.
+    """
+    query = '''
+        SELECT 
+            pc.payroll_cronjob_id,
+            pc.datetimestamp,
+            pc.period_from,
+            pc.period_to,
+            pc.hoursworked_details,
+            pc.absences_details,
+            pc.tardiness_details,
+            pc.undertime_details,
+            pc.paid_leave_details,
+            pc.overtime_details,
+            pc.rest_day_details,
+            pc.holiday_premium_details,
+            pc.night_differential_details,
+            CAST(AES_DECRYPT(pp.basic_pay, %s) AS DECIMAL(10,2)) AS basic_pay,
+            CAST(AES_DECRYPT(pp.rate, %s) AS DECIMAL(10,2)) AS rate
+        FROM payroll_cronjob pc
+        LEFT JOIN payroll_payslip pp ON pc.emp_id = pp.emp_id 
+            AND pc.company_id = pp.company_id 
+            AND pc.period_from = pp.period_from 
+            AND pc.period_to = pp.period_to
+        WHERE pc.company_id = %s AND pc.emp_id = %s
+          AND pc.period_from <= %s AND pc.period_to >= %s
+        ORDER BY pc.period_from, pc.period_to
+    '''
+    return query, (ENCRYPT_KEY, ENCRYPT_KEY, company_id, emp_id, date_to or date_from, date_from), 'dicts'
+
+def process_payroll_cronjob_records(data, date):
+    """Add the hours and amounts for date from the *_details arrays to each record."""
+    day = datetime.strptime(date, '%Y-%m-%d').date()
+    for record in data:
+        record.update(cronjob_details_cache.get(record).day(day))
+
+def payroll_cronjob_breakdown(data, date_from, date_to):
+    """
+    One entry per day of date_from..date_to covered by a record, with that day's
+    hours and amounts. Each record's details are parsed once for the whole range.
+    """
+    days = []
+    for record in data:
+        parsed = cronjob_details_cache.get(record)
+        for day in record_days(record, date_from, date_to):
+            entry = {
+                'date': day.isoformat(),
+                'period_from': record['period_from'],
+                'period_to': record['period_to'],
+                'basic_pay': record['basic_pay'],
+                'rate': record['rate']
+            }
+            entry.update(parsed.day(day))
+            days.append(entry)
+    days.sort(key=lambda entry: entry['date'])
+    return days
+
+def deepdive_timekeeping_query(company_id, emp_id, date):
+    """employee_time_in rows for the given company, emp_id, and date."""
+    query = '''
+        SELECT * FROM employee_time_in
+        WHERE comp_id = %s AND emp_id = %s AND date = %s
+    '''
+    return query, (company_id, emp_id, date), 'dicts'
+
+def deepdive_shifts_query(company_id, emp_id, date):
+    """Shift assignments for the given company, emp_id, and date (date between valid_from and until)."""
+    query = '''
+        SELECT ess.*, ws.name AS shift_name, ws.work_type_name, ws.status AS shift_status
+        FROM employee_shifts_schedule ess
+        JOIN work_schedule ws ON ess.work_schedule_id = ws.work_schedule_id
+        WHERE ess.company_id = %s AND ess.emp_id = %s
+          AND %s BETWEEN ess.valid_from AND ess.until
+    '''
+    return query, (company_id, emp_id, date), 'dicts'
+
 @app.route('/api/deepdive/payroll-cronjob/<int:company_id>/<int:emp_id>/<string:date>', methods=['GET'])
 def deepdive_payroll_cronjob(company_id, emp_id, date):
     """
@@ -1826,111 +1946,46 @@ def deepdive_payroll_cronjob(company_id, emp_id, date):
     """
     try:
         cursor = mysql.connection.cursor()
-        query = '''
-            SELECT 
-                pc.hoursworked_details,
-                pc.absences_details,
-                pc.tardiness_details,
-                pc.undertime_details,
-                pc.paid_leave_details,
-                pc.overtime_details,
-                pc.rest_day_details,
-                pc.holiday_premium_details,
-                pc.night_differential_details,
-                CAST(AES_DECRYPT(pp.basic_pay, %s) AS DECIMAL(10,2)) AS basic_pay,
-                CAST(AES_DECRYPT(pp.rate, %s) AS DECIMAL(10,2)) AS rate
-            FROM payroll_cronjob pc
-            LEFT JOIN payroll_payslip pp ON pc.emp_id = pp.emp_id 
-                AND pc.company_id = pp.company_id 
-                AND pc.period_from = pp.period_from 
-                AND pc.period_to = pp.period_to
-            WHERE pc.company_id = %s AND pc.emp_id = %s
-              AND %s BETWEEN pc.period_from AND pc.period_to
-        '''
-        cursor.execute(query, (ENCRYPT_KEY, ENCRYPT_KEY, company_id, emp_id, date))
-        rows = cursor.fetchall()
-        colnames = [desc[0] for desc in cursor.description]
-        data = [dict(zip(colnames, row)) for row in rows]
+        data = fetch_query(cursor, deepdive_payroll_cronjob_query(company_id, emp_id, date))
         cursor.close()
         
-        # Process detail fields to extract hours and amounts for the specific date
-        import json
-        from datetime import datetime
-        
-        target_date = datetime.strptime(date, '%Y-%m-%d')
-        formatted_target_date = target_date.strftime('%B %d, %Y')
-        formatted_date = target_date.strftime('%d-%b-%y')
-        
-        for record in data:
-            # Process hoursworked_details
-            if record['hoursworked_details']:
-                try:
-                    hours_data = json.loads(record['hoursworked_details'])
-                    hours_worked = None
-                    for entry in hours_data:
-                        parts = entry.split('-')
-                        if len(parts) >= 3:
-                            entry_date = parts[1].strip()
-                            if entry_date == formatted_target_date:
-                                hours_worked = parts[2].strip()
-                                break
-                    
-                    if hours_worked:
-                        record['hours_worked'] = f"{formatted_date} | {hours_worked} hrs"
-                    else:
-                        record['hours_worked'] = "No hours data for this date"
-                except (json.JSONDecodeError, ValueError) as e:
-                    record['hours_worked'] = "Error parsing hours data"
-            else:
-                record['hours_worked'] = "No hours data available"
-            
-            # Process other detail fields (with hours and amounts)
-            detail_fields = [
-                'absences_details', 'tardiness_details', 'undertime_details', 
-                'paid_leave_details', 'overtime_details', 'rest_day_details', 
-                'holiday_premium_details', 'night_differential_details'
-            ]
-            
-            for field in detail_fields:
-                processed_field = field.replace('_details', '')
-                if record[field]:
-                    try:
-                        field_data = json.loads(record[field])
-                        hours = None
-                        amount = None
-                        
-                        for entry in field_data:
-                            parts = entry.split('-')
-                            if len(parts) >= 4:
-                                # Check if date matches (position 3 for most fields)
-                                entry_date_part = parts[3].strip()
-                                # Convert date format from "2025/05/01" to "May 01, 2025"
-                                try:
-                                    if '/' in entry_date_part:
-                                        entry_date_obj = datetime.strptime(entry_date_part, '%Y/%m/%d')
-                                        entry_date_formatted = entry_date_obj.strftime('%B %d, %Y')
-                                    else:
-                                        entry_date_formatted = entry_date_part
-                                    
-                                    if entry_date_formatted == formatted_target_date:
-                                        hours = parts[1].strip()
-                                        amount = parts[2].strip()
-                                        break
-                                except ValueError:
-                                    continue
-                        
-                        if hours and amount:
-                            record[processed_field] = f"{formatted_date} | {hours} hrs | {amount}"
-                        else:
-                            record[processed_field] = "~"
-                    except (json.JSONDecodeError, ValueError) as e:
-                        record[processed_field] = "~"
-                else:
-                    record[processed_field] = "~"
+        process_payroll_cronjob_records(data, date)
         
         if not data:
             return jsonify({"data": [], "message": "No data found"})
         return jsonify({"data": data})
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        return make_response(jsonify({"error": str(e)}), 500)
+
+@app.route('/api/deepdive/payroll-cronjob/<int:company_id>/<int:emp_id>/<string:date_from>/<string:date_to>', methods=['GET'])
+def deepdive_payroll_cronjob_range(company_id, emp_id, date_from, date_to):
+    """
+    Return a per-day payroll breakdown for the given company and emp_id over date_from..date_to.
+    """
+    try:
+        try:
+            start_date = datetime.strptime(date_from, '%Y-%m-%d').date()
+            end_date = datetime.strptime(date_to, '%Y-%m-%d').date()
+        except ValueError as e:
+            return jsonify({'error': f'Invalid date format: {str(e)}'}), 400
+        if end_date < start_date:
+            return jsonify({'error': 'End date must be after start date'}), 400
+        if (end_date - start_date).days >= DEEPDIVE_MAX_RANGE_DAYS:
+            return jsonify({'error': f'Date range cannot exceed {DEEPDIVE_MAX_RANGE_DAYS} days'}), 400
+        
+        cursor = mysql.connection.cursor()
+        data = fetch_query(cursor, deepdive_payroll_cronjob_query(company_id, emp_id, date_from, date_to))
+        cursor.close()
+        
+        days = payroll_cronjob_breakdown(data, start_date, end_date)
+        response = {"date_from": date_from, "date_to": date_to, "data": days}
+        if not days:
+            response["message"] = "No data found"
+        return jsonify(response)
+    except PoolTimeout:
+        raise
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
 
@@ -1941,18 +1996,13 @@ def deepdive_timekeeping(company_id, emp_id, date):
     """
     try:
         cursor = mysql.connection.cursor()
-        query = '''
-            SELECT * FROM employee_time_in
-            WHERE comp_id = %s AND emp_id = %s AND date = %s
-        '''
-        cursor.execute(query, (company_id, emp_id, date))
-        rows = cursor.fetchall()
-        colnames = [desc[0] for desc in cursor.description]
-        data = [dict(zip(colnames, row)) for row in rows]
+        data = fetch_query(cursor, deepdive_timekeeping_query(company_id, emp_id, date))
         cursor.close()
         if not data:
             return jsonify({"data": [], "message": "No data found"})
         return jsonify({"data": data})
+    except PoolTimeout:
+        raise
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
 
@@ -1963,29 +2013,67 @@ def deepdive_shifts(company_id, emp_id, date):
     """
     try:
         cursor = mysql.connection.cursor()
-        query = '''
-            SELECT ess.*, ws.name AS shift_name, ws.work_type_name, ws.status AS shift_status
-            FROM employee_shifts_schedule ess
-            JOIN work_schedule ws ON ess.work_schedule_id = ws.work_schedule_id
-            WHERE ess.company_id = %s AND ess.emp_id = %s
-              AND %s BETWEEN ess.valid_from AND ess.until
-        '''
-        cursor.execute(query, (company_id, emp_id, date))
-        rows = cursor.fetchall()
-        colnames = [desc[0] for desc in cursor.description]
-        data = [dict(zip(colnames, row)) for row in rows]
+        data = fetch_query(cursor, deepdive_shifts_query(company_id, emp_id, date))
         cursor.close()
         if not data:
             return jsonify({"data": [], "message": "No data found"})
         return jsonify({"data": data})
+    except PoolTimeout:
+        raise
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
 
+@app.route('/api/deepdive/bundle/<int:company_id>/<int:emp_id>/<string:date>', methods=['GET'])
+def deepdive_bundle(company_id, emp_id, date):
+    """
+    Everything the deep dive view needs for one employee and date in one response:
+    timekeeping rows, payroll cronjob data, shift assignments and the details of
+    every assigned shift. The first three queries run concurrently, then the
+    shift-details lookups of all assigned shifts run concurrently.
+    """
+    try:
+        results = mysql.fetch_concurrently({
+            'timekeeping': deepdive_timekeeping_query(company_id, emp_id, date),
+            'payroll_cronjob': deepdive_payroll_cronjob_query(company_id, emp_id, date),
+            'shifts': deepdive_shifts_query(company_id, emp_id, date),
+        })
+        process_payroll_cronjob_records(results['payroll_cronjob'], date)
+        
+        # Details for each distinct assigned shift, in assignment order
+        shift_ids = list(dict.fromkeys(
+            row['work_schedule_id'] for row in results['shifts'] if row.get('work_schedule_id')
+        ))
+        detail_queries = {}
+        for shift_id in shift_ids:
+            for name, spec in shift_details_queries(company_id, shift_id).items():
+                detail_queries[(shift_id, name)] = spec
+        detail_results = mysql.fetch_concurrently(detail_queries) if detail_queries else {}
+        shift_details = {}
+        for shift_id in shift_ids:
+            shift_results = {name: result for (result_shift_id, name), result in detail_results.items()
+                             if result_shift_id == shift_id}
+            shift_details[str(shift_id)] = build_shift_details(company_id, shift_id, shift_results)
+        
+        return jsonify({
+            'company_id': company_id,
+            'emp_id': emp_id,
+            'date': date,
+            'timekeeping': results['timekeeping'],
+            'payroll_cronjob': results['payroll_cronjob'],
+            'shifts': results['shifts'],
+            'shift_details': shift_details
+        })
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        app.logger.error(f"Error in deepdive bundle: {str(e)}")
+        return make_response(jsonify({"error": str(e)}), 500)
+
 @app.route('/api/analytics-single-employee/<int:company_id>/<emp_id>/<string:period_from>/<string:period_to>/<string:aggregation_type>', methods=['GET'])
+@conditional_by_period
 def analytics_single_employee(company_id, emp_id, period_from, period_to, aggregation_type='single'):
     try:
         import json
-        ENCRYPT_KEY = os.getenv('MYSQL_ENCRYPT_KEY')
         # Parse fields from query param
         selected_fields = request.args.get('fields', None)
         if selected_fields:
@@ -1997,134 +2085,60 @@ def analytics_single_employee(company_id, emp_id, period_from, period_to, aggreg
                 selected_fields = None
         if not selected_fields:
             return jsonify({'error': 'No fields specified'}), 400
+        # MessagePack/Arrow when the Accept header asks for it, JSON otherwise
+        binary_format = negotiate_format(request)
+        unavailable = unavailable_format_response(binary_format)
+        if unavailable:
+            return unavailable
         # Optional filters
         payroll_group_id = request.args.get('payroll_group_id', None)
-        location_id = request.args.get('location_id', None)
-        department_id = request.args.get('department_id', None)
-        rank_id = request.args.get('rank_id', None)
-        employment_type_id = request.args.get('employment_type_id', None)
-        position_id = request.args.get('position_id', None)
-        cost_center_id = request.args.get('cost_center_id', None)
-        project_id = request.args.get('project_id', None)
         drilldown = request.args.get('drilldown', 'false').lower() == 'true'
-        # Build SQL for selected fields
-        field_sql = ', '.join([
-            f"CAST(AES_DECRYPT(p.{field}, '{ENCRYPT_KEY}') AS DECIMAL(10,2)) AS {field}" for field in selected_fields
-        ])
-        # Employee name fields (decrypted)
-        name_fields = [
-            f"CAST(AES_DECRYPT(e.last_name, '{ENCRYPT_KEY}') AS CHAR(150) CHARACTER SET utf8) AS last_name",
-            f"CAST(AES_DECRYPT(e.first_name, '{ENCRYPT_KEY}') AS CHAR(150) CHARACTER SET utf8) AS first_name"
-        ]
-        # Build the query
-        query = f'''
-            SELECT p.emp_id, {', '.join(name_fields)}, p.period_from, p.period_to, {field_sql}
-            FROM payroll_payslip p
-            JOIN employee e ON p.emp_id = e.emp_id
-            WHERE p.company_id = %s
-              AND p.emp_id = %s
-              AND p.period_from >= %s AND p.period_to <= %s
-        '''
-        params = [company_id, emp_id, period_from, period_to]
-        if payroll_group_id:
-            query += ' AND p.payroll_group_id = %s'
-            params.append(payroll_group_id)
-        if location_id:
-            query += ''' AND p.emp_id IN (
-                SELECT emp_id FROM employee_payroll_information epi
-                WHERE epi.location_and_offices_id = %s
-            )'''
-            params.append(location_id)
-        if department_id:
-            query += ''' AND p.emp_id IN (
-                SELECT emp_id FROM employee_payroll_information epi
-                WHERE epi.department_id = %s
-            )'''
-            params.append(department_id)
-        if rank_id:
-            query += ''' AND p.emp_id IN (
-                SELECT emp_id FROM employee_payroll_information epi
-                WHERE epi.rank_id = %s
-            )'''
-            params.append(rank_id)
-        if employment_type_id:
-            query += ''' AND p.emp_id IN (
-                SELECT emp_id FROM employee_payroll_information epi
-                WHERE epi.employment_type = %s
-            )'''
-            params.append(employment_type_id)
-        if position_id:
-            query += ''' AND p.emp_id IN (
-                SELECT emp_id FROM employee_payroll_information epi
-                WHERE epi.position = %s
-            )'''
-            params.append(position_id)
-        if cost_center_id:
-            query += ''' AND p.emp_id IN (
-                SELECT emp_id FROM employee_payroll_information epi
-                WHERE epi.cost_center = %s
-            )'''
-            params.append(cost_center_id)
-        if project_id:
-            query += ''' AND p.emp_id IN (
-                SELECT emp_id FROM employee_payroll_information epi
-                WHERE epi.project_id = %s
-            )'''
-            params.append(project_id)
-        query += ' ORDER BY p.period_from, p.period_to'
+        filters = filters_from_args(request.args)
+        query, params = build_prefetch_query(company_id, period_from, period_to, selected_fields, filters,
+                                             emp_id=emp_id, payroll_group_id=payroll_group_id)
         cursor = mysql.connection.cursor()
+        stream_format = requested_stream_format(request)
+        if drilldown and stream_format:
+            def open_rows():
+                return ServerSideRows(mysql.pool, query, params, DRILLDOWN_STREAM_CHUNK_ROWS)
+            return stream_drilldown(open_rows, stream_format, aggregation_type == 'separate', cursor, company_id, filters)
         cursor.execute(query, tuple(params))
         rows = cursor.fetchall()
         colnames = [desc[0] for desc in cursor.description]
-        data = [dict(zip(colnames, row)) for row in rows]
+        if binary_format:
+            filter_display = settings_cache.filter_display(cursor, company_id, filters)
+            return binary_analytics_response(binary_format, colnames, rows, selected_fields, drilldown,
+                                             aggregation_type == 'separate', filter_display)
+        if drilldown:
+            data = [dict(zip(colnames, row)) for row in rows]
+        else:
+            columns = PayslipColumns(rows, colnames, selected_fields)
         # Group by period if 'separate', else aggregate
         if aggregation_type == 'separate':
-            periods = {}
-            for row in data:
-                period_key = (row['period_from'], row['period_to'])
-                if period_key not in periods:
-                    periods[period_key] = []
-                periods[period_key].append(row)
             result = {'periods': [], 'filters': {}}
-            for (from_date, to_date), employees in sorted(periods.items()):
-                if drilldown:
+            if drilldown:
+                periods = {}
+                for row in data:
+                    period_key = (row['period_from'], row['period_to'])
+                    if period_key not in periods:
+                        periods[period_key] = []
+                    periods[period_key].append(row)
+                for (from_date, to_date), employees in sorted(periods.items()):
                     # Drill-down: return all employee rows for this period
                     result['periods'].append({
                         'period': {'from': str(from_date), 'to': str(to_date)},
                         'employees': employees
                     })
-                else:
-                    # Summary: aggregate by field
-                    summary = {field: 0.0 for field in selected_fields}
-                    for emp in employees:
-                        for field in selected_fields:
-                            summary[field] += float(emp[field] or 0)
+            else:
+                # Summary: vectorized per-period sums, plus the total across all periods
+                for (from_date, to_date), summary in columns.totals_by_period():
                     result['periods'].append({
                         'period': {'from': str(from_date), 'to': str(to_date)},
-                        'summary': {k: round(v, 2) for k, v in summary.items()}
+                        'summary': summary
                     })
-            if not drilldown:
-                # Add total across all periods
-                total = {field: 0.0 for field in selected_fields}
-                for period in result['periods']:
-                    for field in selected_fields:
-                        total[field] += period['summary'][field]
-                result['total'] = {k: round(v, 2) for k, v in total.items()}
+                result['total'] = columns.totals()
             # Get display names for all filters
-            filter_display = {}
-            filter_map = [
-                (location_id, 'location_and_offices', 'location_and_offices_id', 'name', 'location_name'),
-                (department_id, 'department', 'dept_id', 'department_name', 'department_name'),
-                (rank_id, 'rank', 'rank_id', 'rank_name', 'rank_name'),
-                (employment_type_id, 'employment_type', 'emp_type_id', 'name', 'employment_type_name'),
-                (position_id, 'position', 'position_id', 'position_name', 'position_name'),
-                (cost_center_id, 'cost_center', 'cost_center_id', 'cost_center_code', 'cost_center_code'),
-                (project_id, 'project', 'project_id', 'project_name', 'project_name'),
-            ]
-            for id_value, table, id_field, name_field, resp_field in filter_map:
-                if id_value:
-                    display = get_display_name(cursor, table, id_field, name_field, id_value, company_id)
-                    filter_display[resp_field] = display
+            filter_display = settings_cache.filter_display(cursor, company_id, filters)
             result['filters'] = filter_display
             return jsonify(result)
         else:
@@ -2133,29 +2147,14 @@ def analytics_single_employee(company_id, emp_id, period_from, period_to, aggreg
                 # Drill-down: return all employee rows
                 return jsonify({'employees': data})
             else:
-                # Summary: aggregate by field
-                summary = {field: 0.0 for field in selected_fields}
-                for row in data:
-                    for field in selected_fields:
-                        summary[field] += float(row[field] or 0)
                 # Get display names for all filters
-                filter_display = {}
-                filter_map = [
-                    (location_id, 'location_and_offices', 'location_and_offices_id', 'name', 'location_name'),
-                    (department_id, 'department', 'dept_id', 'department_name', 'department_name'),
-                    (rank_id, 'rank', 'rank_id', 'rank_name', 'rank_name'),
-                    (employment_type_id, 'employment_type', 'emp_type_id', 'name', 'employment_type_name'),
-                    (position_id, 'position', 'position_id', 'position_name', 'position_name'),
-                    (cost_center_id, 'cost_center', 'cost_center_id', 'cost_center_code', 'cost_center_code'),
-                    (project_id, 'project', 'project_id', 'project_name', 'project_name'),
-                ]
-                for id_value, table, id_field, name_field, resp_field in filter_map:
-                    if id_value:
-                        display = get_display_name(cursor, table, id_field, name_field, id_value, company_id)
-                        filter_display[resp_field] = display
-                result = {k: round(v, 2) for k, v in summary.items()}
+                filter_display = settings_cache.filter_display(cursor, company_id, filters)
+                # Summary: vectorized sums by field
+                result = columns.totals()
                 result['filters'] = filter_display
                 return jsonify(result)
+    except PoolTimeout:
+        raise
     except Exception as e:
         app.logger.error(f"Error in analytics-single-employee: {str(e)}")
         return jsonify({'error': f'Failed to retrieve analytics-single-employee data: {str(e)}'}), 500
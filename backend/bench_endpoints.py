@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Benchmark every /api route against synthetic local databases.
+
+For each scale (employees per company) a database is generated once with
+synthetic_data.py into --data-dir and served through local_db.py. Each
+scale runs in its own process, which drives every case through the Flask
+test client and records:
+
+- p50/p95 latency over --repeat runs, with the app's caches cleared before
+  each run so the full query path is measured
+- warm latency, a run straight after with the caches filled
+- SQL round trips (statements executed) of one run
+- peak Python memory of one run, from tracemalloc
+
+Results are compared with bench_baseline.json. A case regresses when its
+latency or peak memory grows by more than --threshold (and by more than the
+noise floor), when it executes more statements, or when its status changes.
+The exit status is 1 if anything regressed. --update-baseline records the
+current results instead.
+
+    python bench_endpoints.py --scales 1000,10000
+    python bench_endpoints.py --only analytics_prefetch --repeat 20
+    python bench_endpoints.py --scales 1000 --update-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import sqlite3
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, 'bench_baseline.json')
+# Fixed so generated databases and baselines are reproducible
+BENCH_ENCRYPT_KEY = 'bench-encrypt-key'
+BENCH_SEED = 1
+BENCH_PERIODS = 24
+# Differences below these are noise, whatever the relative change
+MIN_DELTA_MS = 2.0
+MIN_DELTA_KB = 256
+
+FIELDS = '["basic_pay","regular_pay","overtime_pay","gross_pay","net_amount","pp_withholding_tax"]'
+
+
+def database_path(data_dir: str, employees: int) -> str:
+    return os.path.join(data_dir, f'bench_{employees}.db')
+
+
+def ensure_database(data_dir: str, employees: int) -> str:
+    """Generate the database for a scale unless it already exists."""
+    path = database_path(data_dir, employees)
+    if not os.path.exists(path):
+        from synthetic_data import generate
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"Generating {path} ({employees:,} employees)...", flush=True)
+        started = time.perf_counter()
+        generate(path, companies=1, employees=employees, periods=BENCH_PERIODS, detail_periods=2,
+                 start=date(2025, 1, 1), encrypt_key=BENCH_ENCRYPT_KEY, seed=BENCH_SEED)
+        print(f"✅ Generated in {time.perf_counter() - started:.1f}s", flush=True)
+    return path
+
+
+def benchmark_cases(path: str) -> List[Tuple[str, str, Dict[str, str]]]:
+    """
+    (name, url, headers) per case, with ids and dates picked from the database.
+
+    Names are the route's endpoint, with a suffix when a route has several cases.
+    """
+    db = sqlite3.connect(path)
+    company_id = 1
+    periods = [row for row in db.execute(
+        'SELECT DISTINCT period_from, period_to FROM payroll_payslip WHERE company_id = ? ORDER BY period_from',
+        (company_id,))]
+    # An employee paid in every period, with deep dive details
+    emp_id = db.execute("""
+        SELECT pc.emp_id FROM payroll_cronjob pc
+        WHERE pc.company_id = ?
+          AND (SELECT COUNT(*) FROM payroll_payslip pp WHERE pp.company_id = ? AND pp.emp_id = pc.emp_id) = ?
+        ORDER BY pc.emp_id LIMIT 1
+    """, (company_id, company_id, len(periods))).fetchone()[0]
+    detail_date = db.execute("""
+        SELECT MAX(date) FROM employee_time_in WHERE comp_id = ? AND emp_id = ?
+    """, (company_id, emp_id)).fetchone()[0]
+    shift_id, work_type = db.execute("""
+        SELECT ess.work_schedule_id, ws.work_type_name FROM employee_shifts_schedule ess
+        JOIN work_schedule ws ON ws.work_schedule_id = ess.work_schedule_id
+        WHERE ess.company_id = ? GROUP BY ess.work_schedule_id ORDER BY COUNT(*) DESC LIMIT 1
+    """, (company_id,)).fetchone()
+    start_time = db.execute("""
+        SELECT work_start_time FROM regular_schedule WHERE work_schedule_id = ?
+    """, (shift_id,)).fetchone()
+    # Shift changes happen at the start of a period halfway through the range
+    switch = date.fromisoformat(db.execute("""
+        SELECT valid_from FROM employee_shifts_schedule WHERE company_id = ? AND valid_from > ?
+        ORDER BY valid_from LIMIT 1
+    """, (company_id, periods[0][0])).fetchone()[0])
+    department_id = db.execute('SELECT MIN(dept_id) FROM department WHERE company_id = ?',
+                               (company_id,)).fetchone()[0]
+    db.close()
+
+    quarter_from, quarter_to = periods[-6][0], periods[-1][1]
+    year_from, year_to = periods[0][0], periods[-1][1]
+    detail_from = date.fromisoformat(detail_date).replace(day=1).isoformat()
+    changes_from, changes_to = switch - timedelta(days=3), switch + timedelta(days=3)
+    hhmm = start_time[0][:5] if start_time else '08:00'
+    c, e = company_id, emp_id
+    ndjson = {'Accept': 'application/x-ndjson'}
+    return [
+        ('get_companies', '/api/companies', {}),
+        ('validate_company', f'/api/validate-company/{c}', {}),
+        ('search_employees', f'/api/search-employees/{c}/{str(e)[:2]}', {}),
+        ('search_employees_by_name_endpoint', f'/api/search-employees-by-name/{c}/Santos', {}),
+        ('get_shifts_changes_by_period', f'/api/shifts-changes-by-period/{c}/{changes_from}/{changes_to}', {}),
+        ('get_payroll_groups', f'/api/payroll-groups/{c}', {}),
+        ('get_company_dates', f'/api/dates/{c}', {}),
+        ('get_employee_dates', f'/api/dates/{c}/{e}', {}),
+        ('get_payslip_fields', '/api/payslip-fields', {}),
+        ('get_settings_options', f'/api/settings-options/{c}/department', {}),
+        ('get_analytics:total', f'/api/analytics/{c}/all/{quarter_from}/{quarter_to}/total', {}),
+        ('get_analytics:separate', f'/api/analytics/{c}/all/{quarter_from}/{quarter_to}/separate', {}),
+        ('get_analytics:department',
+         f'/api/analytics/{c}/all/{quarter_from}/{quarter_to}/total?department_id={department_id}', {}),
+        ('get_analytics:employee', f'/api/analytics/{c}/{e}/{year_from}/{year_to}/separate', {}),
+        ('analytics_prefetch:total', f'/api/analytics-prefetch/{c}/{quarter_from}/{quarter_to}/total?fields={FIELDS}', {}),
+        ('analytics_prefetch:separate',
+         f'/api/analytics-prefetch/{c}/{quarter_from}/{quarter_to}/separate?fields={FIELDS}', {}),
+        ('analytics_prefetch:drilldown',
+         f'/api/analytics-prefetch/{c}/{quarter_from}/{quarter_to}/total?fields={FIELDS}&drilldown=true', {}),
+        ('analytics_prefetch:drilldown_stream',
+         f'/api/analytics-prefetch/{c}/{quarter_from}/{quarter_to}/separate?fields={FIELDS}&drilldown=true', ndjson),
+        ('analytics_export', f'/api/analytics-export/{c}/{quarter_from}/{quarter_to}/total?fields={FIELDS}', {}),
+        ('analytics_single_employee',
+         f'/api/analytics-single-employee/{c}/{e}/{year_from}/{year_to}/separate?fields={FIELDS}', {}),
+        ('get_schedule_type_counts', f'/api/shifts/schedule-type-counts/{c}', {}),
+        ('get_schedules_by_type', f'/api/shifts/schedules/{c}/{work_type}', {}),
+        ('get_shifts_allocation_drilldown', f'/api/shifts/allocation-drilldown/{c}/{work_type}/{shift_id}', {}),
+        ('get_shifts_by_start_time', f'/api/shifts/by-start-time/{c}/{hhmm}', {}),
+        ('get_employee_shifts', f'/api/employee-shifts/{c}/Santos', {}),
+        ('get_shift_details', f'/api/shift-details/{c}/{shift_id}', {}),
+        ('get_shift_employees', f'/api/shift-employees/{c}/{shift_id}', {}),
+        ('get_pool_stats', '/api/pool-stats', {}),
+        ('get_query_cache_stats', '/api/query-cache-stats', {}),
+        ('get_slow_queries', '/api/admin/slow-queries', {}),
+        ('deepdive_payroll_cronjob', f'/api/deepdive/payroll-cronjob/{c}/{e}/{detail_date}', {}),
+        ('deepdive_payroll_cronjob_range',
+         f'/api/deepdive/payroll-cronjob/{c}/{e}/{detail_from}/{detail_date}', {}),
+        ('deepdive_timekeeping', f'/api/deepdive/timekeeping/{c}/{e}/{detail_date}', {}),
+        ('deepdive_shifts', f'/api/deepdive/shifts/{c}/{e}/{detail_date}', {}),
+        ('deepdive_bundle', f'/api/deepdive/bundle/{c}/{e}/{detail_date}', {}),
+    ]
+
+
+def clear_caches(app_module) -> None:
+    """Drop everything the app keeps between requests, so a run takes the full query path."""
+    app_module.dataset_cache.clear()
+    app_module.settings_cache.invalidate()
+    app_module.name_index.invalidate()
+    app_module.period_dates_cache.invalidate()
+    app_module.cronjob_details_cache.clear()
+    app_module.query_cache.clear()
+    if app_module.snapshot_store is not None:
+        app_module.snapshot_store.invalidate()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+def run_worker(path: str, repeat: int, budget_seconds: float, only: Optional[str]) -> Dict[str, Any]:
+    """Benchmark every case in this process, the app is served from the database at path."""
+    os.environ.update({
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': path,
+        'MYSQL_ENCRYPT_KEY': BENCH_ENCRYPT_KEY,
+        # Snapshots would write files and answer analytics from disk
+        'SNAPSHOT_ENABLED': 'false',
+        # EXPLAINs of slow statements would add round trips from a background thread
+        'SLOW_QUERY_MS': '0',
+    })
+    sys.path.insert(0, HERE)
+    import logging
+    logging.disable(logging.CRITICAL)
+    import app as app_module
+    from local_db import statements_executed
+
+    client = app_module.app.test_client()
+    cases = benchmark_cases(path)
+    covered = {name.split(':')[0] for name, _, _ in cases}
+    uncovered = sorted(
+        rule.endpoint for rule in app_module.app.url_map.iter_rules()
+        if rule.rule.startswith('/api/') and rule.endpoint not in covered
+    )
+    pattern = re.compile(only) if only else None
+
+    results = {}
+    for name, url, headers in cases:
+        if pattern and not pattern.search(name):
+            continue
+
+        def request():
+            response = client.get(url, headers=headers)
+            body = response.get_data()
+            return response.status_code, len(body)
+
+        timings: List[float] = []
+        started = time.perf_counter()
+        while len(timings) < repeat and (not timings or time.perf_counter() - started < budget_seconds):
+            clear_caches(app_module)
+            statements_before = statements_executed()
+            run_started = time.perf_counter()
+            status, size = request()
+            timings.append((time.perf_counter() - run_started) * 1000)
+            round_trips = statements_executed() - statements_before
+
+        warm_started = time.perf_counter()
+        request()
+        warm_ms = (time.perf_counter() - warm_started) * 1000
+
+        clear_caches(app_module)
+        tracemalloc.start()
+        request()
+        peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+
+        results[name] = {
+            'url': url,
+            'status': status,
+            'bytes': size,
+            'runs': len(timings),
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'warm_ms': round(warm_ms, 2),
+            'round_trips': round_trips,
+            'peak_kb': round(peak_kb, 1),
+        }
+    return {'cases': results, 'uncovered_routes': uncovered}
+
+
+def run_scale(args, employees: int) -> Dict[str, Any]:
+    """Benchmark one scale in a fresh process, so caches and memory start clean."""
+    path = ensure_database(args.data_dir, employees)
+    command = [sys.executable, os.path.abspath(__file__), '--worker', path,
+               '--repeat', str(args.repeat), '--budget-seconds', str(args.budget_seconds)]
+    if args.only:
+        command += ['--only', args.only]
+    output = subprocess.run(command, check=True, capture_output=True, text=True, cwd=HERE).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def regressions(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Descriptions of the ways a case got worse than its baseline."""
+    found = []
+    if current['status'] != baseline['status']:
+        found.append(f"status {baseline['status']} -> {current['status']}")
+    for metric in ('p50_ms', 'p95_ms'):
+        before, after = baseline[metric], current[metric]
+        if after > before * (1 + threshold) and after - before > MIN_DELTA_MS:
+            found.append(f"{metric} {before:.1f} -> {after:.1f}")
+    if current['round_trips'] > baseline['round_trips']:
+        found.append(f"round trips {baseline['round_trips']} -> {current['round_trips']}")
+    before, after = baseline['peak_kb'], current['peak_kb']
+    if after > before * (1 + threshold) and after - before > MIN_DELTA_KB:
+        found.append(f"peak memory {before:,.0f} -> {after:,.0f} KB")
+    return found
+
+
+def machine() -> Dict[str, str]:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(terse=True),
+        'processor': platform.machine(),
+        'sqlite': sqlite3.sqlite_version,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1000,10000', help='Comma-separated employee counts')
+    parser.add_argument('--repeat', type=int, default=10, help='Cold runs per case for p50/p95')
+    parser.add_argument('--budget-seconds', type=float, default=30,
+                        help='Stop repeating a case after this long (at least one run)')
+    parser.add_argument('--only', help='Regular expression selecting case names')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('BENCH_REGRESSION_THRESHOLD', 0.25)),
+                        help='Relative growth flagged as a regression (default 0.25, or BENCH_REGRESSION_THRESHOLD)')
+    parser.add_argument('--data-dir', default=os.path.join(HERE, 'bench_data'),
+                        help='Where generated databases are kept between runs')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help='Record these results as the baseline')
+    parser.add_argument('--worker', metavar='DB', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.repeat, args.budget_seconds, args.only)))
+        return
+
+    baseline = {'machine': machine(), 'scales': {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if baseline.get('machine') != machine() and not args.update_baseline:
+        print(f"⚠️  Baseline was recorded on {baseline.get('machine')}, latencies may not compare")
+
+    regressed = 0
+    results = {}
+    for employees in [int(scale) for scale in args.scales.split(',')]:
+        scale = str(employees)
+        run = run_scale(args, employees)
+        results[scale] = run['cases']
+        base_cases = baseline['scales'].get(scale, {})
+
+        print(f"\n{employees:,} employees")
+        print(f"{'case':<38} {'status':>6} {'p50 ms':>9} {'p95 ms':>9} {'warm ms':>9} {'trips':>6} {'peak KB':>9}")
+        for name, current in run['cases'].items():
+            print(f"{name:<38} {current['status']:>6} {current['p50_ms']:>9.1f} {current['p95_ms']:>9.1f} "
+                  f"{current['warm_ms']:>9.1f} {current['round_trips']:>6} {current['peak_kb']:>9,.0f}")
+            if name in base_cases and not args.update_baseline:
+                for description in regressions(current, base_cases[name], args.threshold):
+                    regressed += 1
+                    print(f"    ❌ {description}")
+        if run['uncovered_routes']:
+            print(f"⚠️  Routes without a benchmark case: {', '.join(run['uncovered_routes'])}")
+
+    if args.update_baseline:
+        baseline['machine'] = machine()
+        for scale, cases in results.items():
+            # Keep cases that were not selected with --only
+            baseline['scales'].setdefault(scale, {}).update(cases)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\n✅ Baseline written to {args.baseline}")
+    elif regressed:
+        print(f"\n❌ {regressed} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+    else:
+        print(f"\n✅ No regressions above {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
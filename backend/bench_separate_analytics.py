@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark the 'separate' view of /api/analytics against the configured database.
+
+Compares the legacy per-period strategy (a DISTINCT periods query followed by
+one decrypt query per period) with the single-fetch strategy used by
+get_analytics, over a growing number of periods.
+"""
+import argparse
+import time
+
+from aggregation import PayslipColumns
+from app import app, mysql, build_analytics_query, add_total_salary
+
+
+class CountingCursor:
+    """Wraps a DB cursor and counts round trips to the server."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.round_trips = 0
+
+    def execute(self, query, params=None):
+        self.round_trips += 1
+        return self.cursor.execute(query, params)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+
+def summarize(cursor, rows, fields):
+    colnames = [desc[0] for desc in cursor.description]
+    return PayslipColumns(rows, colnames, fields)
+
+
+def legacy_separate(cursor, company_id, period_from, period_to, fields):
+    """Per-period strategy that get_analytics used before the single-fetch rewrite."""
+    cursor.execute("""
+        SELECT DISTINCT period_from, period_to
+        FROM payroll_payslip
+        WHERE company_id = %s
+        AND period_from >= %s AND period_to <= %s
+    """, (company_id, period_from, period_to))
+    periods = sorted(cursor.fetchall(), key=lambda x: x[0])
+    result = []
+    for period_start, period_end in periods:
+        query, params = build_analytics_query(company_id, 'all', period_start, period_end, fields, exact_period=True)
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+        if rows:
+            result.append(((period_start, period_end), add_total_salary(summarize(cursor, rows, fields).totals())))
+    return result
+
+
+def single_fetch_separate(cursor, company_id, period_from, period_to, fields):
+    """Single-fetch strategy: one decrypt query, grouped by period in memory."""
+    query, params = build_analytics_query(company_id, 'all', period_from, period_to, fields)
+    cursor.execute(query, tuple(params))
+    columns = summarize(cursor, cursor.fetchall(), fields)
+    return [(period, add_total_salary(sums)) for period, sums in columns.totals_by_period()]
+
+
+def time_strategy(strategy, company_id, period_from, period_to, fields, repeat):
+    """Returns (best latency in ms, round trips, result) over repeat runs."""
+    best = None
+    for _ in range(repeat):
+        cursor = CountingCursor(mysql.connection.cursor())
+        start = time.perf_counter()
+        result = strategy(cursor, company_id, period_from, period_to, fields)
+        elapsed = (time.perf_counter() - start) * 1000
+        cursor.cursor.close()
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, cursor.round_trips, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('company_id', type=int)
+    parser.add_argument('--fields', default='basic_pay,gross_pay,overtime_pay,night_diff',
+                        help='Comma-separated payslip fields to decrypt')
+    parser.add_argument('--max-periods', type=int, default=25)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    fields = args.fields.split(',')
+
+    with app.app_context():
+        cursor = mysql.connection.cursor()
+        cursor.execute("""
+            SELECT DISTINCT period_from, period_to
+            FROM payroll_payslip
+            WHERE company_id = %s
+            ORDER BY period_from DESC
+            LIMIT %s
+        """, (args.company_id, args.max_periods))
+        periods = sorted(cursor.fetchall())
+        cursor.close()
+        if not periods:
+            print(f"No payslip periods found for company {args.company_id}")
+            return
+
+        print(f"{'periods':>8} {'legacy trips':>13} {'legacy ms':>10} {'single trips':>13} {'single ms':>10} {'speedup':>8}")
+        window_sizes = sorted({n for n in (1, 2, 4, 8, 12, 16, 25, len(periods)) if n <= len(periods)})
+        for n in window_sizes:
+            period_from, period_to = periods[0][0], periods[n - 1][1]
+            legacy_ms, legacy_trips, legacy_result = time_strategy(
+                legacy_separate, args.company_id, period_from, period_to, fields, args.repeat)
+            single_ms, single_trips, single_result = time_strategy(
+                single_fetch_separate, args.company_id, period_from, period_to, fields, args.repeat)
+            if legacy_result != single_result:
+                print(f"⚠️  Results differ for {n} periods")
+            print(f"{n:>8} {legacy_trips:>13} {legacy_ms:>10.1f} {single_trips:>13} {single_ms:>10.1f} {legacy_ms / single_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON serialization and response compression on a synthetic drilldown.
+
+Builds rows shaped like the analytics-prefetch drilldown (emp_id, decrypted
+names, period dates and Decimal amounts), then compares Flask's default JSON
+provider with the orjson provider, and the bytes on the wire uncompressed,
+gzipped and (when brotli is installed) brotli-compressed.
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from compression import ResponseCompression
+from json_provider import OrjsonProvider, orjson
+
+
+def drilldown_rows(row_count, field_count, seed=1):
+    """Drilldown records as analytics_prefetch builds them, one per payslip."""
+    rng = random.Random(seed)
+    fields = [f'field_{i}' for i in range(field_count)]
+    period_from = date(2025, 1, 1)
+    rows = []
+    for i in range(row_count):
+        period_start = period_from + timedelta(days=15 * (i % 24))
+        row = {
+            'emp_id': 1000 + i // 24,
+            'last_name': rng.choice(['Santos', 'Reyes', 'Cruz', 'Bautista', 'Garcia']),
+            'first_name': rng.choice(['Maria', 'Jose', 'Ana', 'Juan', 'Rosa']),
+            'period_from': period_start,
+            'period_to': period_start + timedelta(days=14),
+        }
+        for name in fields:
+            row[name] = Decimal(rng.randint(0, 5_000_000)).scaleb(-2)
+        rows.append(row)
+    return rows
+
+
+def time_response(app, document, repeat):
+    """Returns (best ms, body) for app.json.response(document) over repeat runs."""
+    best = None
+    with app.app_context():
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = app.json.response(document).get_data()
+            elapsed = (time.perf_counter() - start) * 1000
+            if best is None or elapsed < best:
+                best = elapsed
+    return best, body
+
+
+def time_encoding(app, body, encoding, repeat):
+    """Returns (best ms, compressed size) for one Content-Encoding."""
+    compression = ResponseCompression(app)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = compression._compress(body, encoding)
+        elapsed = (time.perf_counter() - start) * 1000
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--fields', type=int, default=10, help='Decimal amount columns per row')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    document = {'employees': drilldown_rows(args.rows, args.fields)}
+    print(f"Drilldown of {args.rows} rows x {args.fields} amount fields")
+
+    default_app = Flask('bench_default')
+    default_app.json = DefaultJSONProvider(default_app)
+    default_ms, default_body = time_response(default_app, document, args.repeat)
+    print(f"{'provider':>10} {'serialize ms':>13} {'bytes':>12}")
+    print(f"{'default':>10} {default_ms:>13.1f} {len(default_body):>12,}")
+
+    body = default_body
+    if orjson is not None:
+        orjson_app = Flask('bench_orjson')
+        orjson_app.json = OrjsonProvider(orjson_app)
+        orjson_ms, body = time_response(orjson_app, document, args.repeat)
+        print(f"{'orjson':>10} {orjson_ms:>13.1f} {len(body):>12,}   {default_ms / orjson_ms:.1f}x faster")
+        if body != default_body:
+            print("⚠️  Bodies differ")
+    else:
+        print("orjson is not installed, skipping")
+
+    print()
+    print(f"{'encoding':>10} {'compress ms':>13} {'bytes':>12} {'ratio':>7}")
+    print(f"{'identity':>10} {0:>13.1f} {len(body):>12,} {1:>7.1f}")
+    encodings = ['gzip']
+    try:
+        import brotli  # noqa: F401
+        encodings.append('br')
+    except ImportError:
+        print("brotli is not installed, skipping br")
+    compress_app = Flask('bench_compress')
+    for encoding in encodings:
+        compress_ms, size = time_encoding(compress_app, body, encoding, args.repeat)
+        print(f"{encoding:>10} {compress_ms:>13.1f} {size:>12,} {len(body) / size:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
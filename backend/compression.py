@@ -0,0 +1,91 @@
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional
+
+from flask import request
+
+# Optional brotli encoder, gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response types worth compressing, zip downloads and Arrow streams are left alone
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/x-msgpack',
+    'text/csv',
+}
+
+
+class ResponseCompression:
+    """
+    gzip/brotli encoding of API responses.
+
+    Buffered responses are compressed once they reach COMPRESS_MIN_SIZE bytes.
+    Streamed responses are always compressed, chunk by chunk with a flush
+    after each chunk so rows still reach the client as they are produced.
+    brotli is preferred when it is installed and the client accepts it.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+        self.app = app
+        app.after_request(self.after_request)
+
+    def after_request(self, response):
+        config = self.app.config
+        if (not config['COMPRESS_ENABLED'] or response.status_code != 200
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self._encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.iter_encoded(), encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            response.set_data(self._compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _encoding(self) -> Optional[str]:
+        offered = (['br'] if brotli is not None else []) + ['gzip']
+        return request.accept_encodings.best_match(offered)
+
+    def _compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.app.config['COMPRESS_BROTLI_QUALITY'])
+        return gzip.compress(data, compresslevel=self.app.config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+    def _compress_stream(self, chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.app.config['COMPRESS_BROTLI_QUALITY'])
+            for chunk in chunks:
+                data = compressor.process(chunk) + compressor.flush()
+                if data:
+                    yield data
+            yield compressor.finish()
+            return
+
+        # wbits 31 writes the gzip header and trailer
+        compressor = zlib.compressobj(self.app.config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
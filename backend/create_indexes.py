@@ -1,189 +1,646 @@
 #!/usr/bin/env python3
 """
-Script to create database indexes for performance optimization
+Index advisor and online index manager for the payroll database.
+
+Runs EXPLAIN on a catalog of the app's query shapes against the target
+database and reports which ones scan a table, or read rows past an index
+where the shape should be answered from the index alone. It then compares
+the indexes in INDEXES with the ones the tables have and applies the
+difference online, one ALTER TABLE per table combining its DROP and ADD
+INDEX clauses, with ALGORITHM=INPLACE, LOCK=NONE so reads and writes carry
+on while the indexes build. Afterwards the plans are explained again and
+the differences printed.
+
+    python create_indexes.py --dry-run                  # report and print the ALTERs only
+    python create_indexes.py --dry-run --save-plans before.json
+    python create_indexes.py                            # apply, with a before/after plan diff
+    python create_indexes.py --dry-run --compare before.json
+
+Connects with the app's DB_* settings, or to the SQLite stand-in with
+DB_BACKEND=sqlite (SQLITE_PATH), where the changes run as CREATE/DROP INDEX.
 """
-from flask import Flask
-from flask_mysqldb import MySQL
-from dotenv import load_dotenv
+import argparse
+import difflib
+import json
 import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from analytics_filters import FILTER_COLUMNS
+from query_cache import CompiledQuery
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
+FILTER_FIELDS = tuple(column for _, column in FILTER_COLUMNS)
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """A secondary index the app's queries rely on."""
+    name: str
+    table: str
+    columns: Tuple[str, ...]
+
+    def definition(self) -> str:
+        return f"INDEX {self.name} ({', '.join(self.columns)})"
+
+    def create_sql(self) -> str:
+        return f"CREATE INDEX {self.name} ON {self.table}({', '.join(self.columns)})"
+
+
+INDEXES = [
+    # Analytics and period pickers by company + period range. created_date makes the data version
+    # (ETag) and snapshot signature queries index-only
+    IndexSpec('idx_company_period_created', 'payroll_payslip', ('company_id', 'period_from', 'period_to', 'created_date')),
+    # Single employee analytics, deep dive payslip join and the payslip employee list
+    IndexSpec('idx_company_emp_period', 'payroll_payslip', ('company_id', 'emp_id', 'period_from', 'period_to')),
+    # Payroll group analytics and period pickers
+    IndexSpec('idx_company_group_period', 'payroll_payslip', ('company_id', 'payroll_group_id', 'period_from', 'period_to')),
+    # Settings filters: the company's employees matching one filter, read from the index alone
+    *[
+        IndexSpec(f'idx_epi_company_{name}_emp', 'employee_payroll_information', ('company_id', column, 'emp_id'))
+        for name, column in [
+            ('department', 'department_id'), ('rank', 'rank_id'), ('employment_type', 'employment_type'),
+            ('position', 'position'), ('cost_center', 'cost_center'), ('project', 'project_id'),
+            ('location', 'location_and_offices_id'),
+        ]
+    ],
+    # The epi EXISTS check of analytics and prefetch and the name index join, filters read from the index
+    IndexSpec('idx_epi_emp_company_filters', 'employee_payroll_information', ('emp_id', 'company_id') + FILTER_FIELDS),
+    # Allocation analytics
+    IndexSpec('idx_ws_company_type_status', 'work_schedule', ('comp_id', 'work_type_name', 'status')),
+    IndexSpec('idx_ess_company_sched_status', 'employee_shifts_schedule', ('company_id', 'work_schedule_id', 'status')),
+    # Deep dive
+    IndexSpec('idx_ws_id_comp_status', 'work_schedule', ('work_schedule_id', 'comp_id', 'status')),
+    IndexSpec('idx_ess_company_emp_valid', 'employee_shifts_schedule', ('company_id', 'emp_id', 'valid_from', 'until')),
+    IndexSpec('idx_pc_company_emp_period', 'payroll_cronjob', ('company_id', 'emp_id', 'period_from', 'period_to')),
+    IndexSpec('idx_eti_comp_emp_date', 'employee_time_in', ('comp_id', 'emp_id', 'date')),
+    # Cronjob side of the data version and snapshot signatures, index-only
+    IndexSpec('idx_pc_company_period', 'payroll_cronjob',
+              ('company_id', 'period_from', 'period_to', 'datetimestamp', 'flag_run_parent')),
+]
+
+# Indexes earlier versions of this script created that INDEXES replaces. Only these are ever
+# dropped, in the same ALTER that adds their replacements when those are missing
+RETIRED = {
+    'payroll_payslip': [
+        'idx_company_period',         # idx_company_period_created
+        'idx_company_emp',            # prefix of idx_company_emp_period
+        'idx_company_payroll_group',  # idx_company_group_period
+    ],
+    'employee_payroll_information': [
+        'idx_epi_company_department', 'idx_epi_company_rank', 'idx_epi_company_employment_type',
+        'idx_epi_company_position', 'idx_epi_company_cost_center', 'idx_epi_company_project',
+        'idx_epi_company_location',
+    ],
+}
+
+
+@dataclass(frozen=True)
+class QueryShape:
+    """
+    One query the app runs, with placeholders named like a CompiledQuery layout.
+
+    covering lists the table aliases that should be read from an index alone.
+    """
+    name: str
+    query: CompiledQuery
+    covering: Tuple[str, ...] = ()
+
+
+def _shape(name: str, sql: str, layout: Sequence[str], covering: Sequence[str] = ()) -> QueryShape:
+    return QueryShape(name, CompiledQuery(' '.join(sql.split()), tuple(layout)), tuple(covering))
 
-# MySQL configurations
-app.config['MYSQL_HOST'] = os.getenv('DB_HOST')
-app.config['MYSQL_PORT'] = int(os.getenv('DB_PORT', 3306))
-app.config['MYSQL_USER'] = os.getenv('DB_USER')
-app.config['MYSQL_PASSWORD'] = os.getenv('DB_PASSWORD')
-app.config['MYSQL_DB'] = os.getenv('DB_NAME')
 
-mysql = MySQL(app)
+_DECRYPT = "CAST(AES_DECRYPT(p.gross_pay, %s) AS DECIMAL(10,2)) AS gross_pay"
+_NAMES = ("CAST(AES_DECRYPT(e.last_name, %s) AS CHAR(150) CHARACTER SET utf8) AS last_name, "
+          "CAST(AES_DECRYPT(e.first_name, %s) AS CHAR(150) CHARACTER SET utf8) AS first_name")
+_EPI_EXISTS = ("EXISTS (SELECT 1 FROM employee_payroll_information epi"
+               " WHERE epi.emp_id = p.emp_id AND epi.company_id = p.company_id AND epi.{} = %s)")
+_VERSION_RANGE = "company_id = %s AND period_from >= %s AND period_to <= %s"
 
-def index_exists(cursor, index_name, table_name):
-    """Check if an index already exists on a given table"""
+# The app's queries, as build_analytics_query, build_prefetch_query and the routes write them
+QUERY_SHAPES = [
+    _shape('analytics', f"""
+        SELECT {_DECRYPT}, p.period_from, p.period_to FROM payroll_payslip p
+        WHERE p.company_id = %s AND p.period_from >= %s AND p.period_to <= %s
+    """, ['encrypt_key', 'company_id', 'range_from', 'period_to']),
+    _shape('analytics_filtered', f"""
+        SELECT {_DECRYPT}, p.period_from, p.period_to FROM payroll_payslip p
+        WHERE p.company_id = %s AND p.period_from >= %s AND p.period_to <= %s
+          AND {_EPI_EXISTS.format('department_id')}
+    """, ['encrypt_key', 'company_id', 'range_from', 'period_to', 'department_id'], covering=['epi']),
+    _shape('analytics_employee', f"""
+        SELECT {_DECRYPT}, p.period_from, p.period_to FROM payroll_payslip p
+        WHERE p.company_id = %s AND p.period_from >= %s AND p.period_to <= %s AND p.emp_id = %s
+    """, ['encrypt_key', 'company_id', 'range_from', 'period_to', 'emp_id']),
+    _shape('analytics_payroll_group', f"""
+        SELECT {_DECRYPT}, p.period_from, p.period_to FROM payroll_payslip p
+        WHERE p.company_id = %s AND p.period_from >= %s AND p.period_to <= %s AND p.payroll_group_id = %s
+    """, ['encrypt_key', 'company_id', 'range_from', 'period_to', 'payroll_group_id']),
+    _shape('analytics_filter_emp_ids', """
+        SELECT epi.emp_id FROM employee_payroll_information epi
+        WHERE epi.company_id = %s AND epi.department_id = %s
+    """, ['company_id', 'department_id'], covering=['epi']),
+    _shape('analytics_prefetch', f"""
+        SELECT p.emp_id, {_NAMES}, p.period_from, p.period_to, {_DECRYPT}
+        FROM payroll_payslip p JOIN employee e ON p.emp_id = e.emp_id
+        WHERE p.company_id = %s AND p.period_from >= %s AND p.period_to <= %s
+          AND {_EPI_EXISTS.format('location_and_offices_id')}
+        ORDER BY p.period_from, p.period_to, last_name, first_name
+    """, ['encrypt_key'] * 3 + ['company_id', 'range_from', 'period_to', 'location_id'], covering=['epi']),
+    _shape('data_version', f"""
+        SELECT
+            (SELECT COUNT(*) FROM payroll_payslip WHERE {_VERSION_RANGE}),
+            (SELECT MAX(created_date) FROM payroll_payslip WHERE {_VERSION_RANGE}),
+            (SELECT MAX(datetimestamp) FROM payroll_cronjob WHERE {_VERSION_RANGE})
+    """, ['company_id', 'range_from', 'period_to'] * 3, covering=['payroll_payslip', 'payroll_cronjob']),
+    _shape('snapshot_payslip_signatures', """
+        SELECT period_from, period_to, COUNT(*), MAX(created_date) FROM payroll_payslip
+        WHERE company_id = %s GROUP BY period_from, period_to
+    """, ['company_id'], covering=['payroll_payslip']),
+    _shape('snapshot_cronjob_signatures', """
+        SELECT period_from, period_to, MAX(datetimestamp), MAX(flag_run_parent) FROM payroll_cronjob
+        WHERE company_id = %s GROUP BY period_from, period_to
+    """, ['company_id'], covering=['payroll_cronjob']),
+    _shape('period_dates', """
+        SELECT DISTINCT period_from, period_to FROM payroll_payslip
+        WHERE company_id = %s AND (period_from IS NOT NULL OR period_to IS NOT NULL)
+        ORDER BY period_from DESC, period_to DESC
+    """, ['company_id'], covering=['payroll_payslip']),
+    _shape('period_dates_payroll_group', """
+        SELECT DISTINCT period_from, period_to FROM payroll_payslip
+        WHERE company_id = %s AND (period_from IS NOT NULL OR period_to IS NOT NULL) AND payroll_group_id = %s
+        ORDER BY period_from DESC, period_to DESC
+    """, ['company_id', 'payroll_group_id'], covering=['payroll_payslip']),
+    _shape('payroll_groups', """
+        SELECT DISTINCT payroll_group_id FROM payroll_payslip WHERE company_id = %s ORDER BY payroll_group_id
+    """, ['company_id'], covering=['payroll_payslip']),
+    _shape('payslip_employees', """
+        SELECT DISTINCT emp_id FROM payroll_payslip WHERE company_id = %s
+    """, ['company_id'], covering=['payroll_payslip']),
+    _shape('name_index', """
+        SELECT e.emp_id, CAST(AES_DECRYPT(e.last_name, %s) AS CHAR(150) CHARACTER SET utf8) AS last_name,
+            CAST(AES_DECRYPT(e.first_name, %s) AS CHAR(150) CHARACTER SET utf8) AS first_name,
+            COALESCE(lao.name, 'N/A') AS location_office, COALESCE(d.department_name, 'N/A') AS department_name,
+            COALESCE(rk.rank_name, 'N/A') AS rank_name
+        FROM employee e
+        LEFT JOIN employee_payroll_information epi ON e.emp_id = epi.emp_id AND epi.company_id = %s
+        LEFT JOIN location_and_offices lao ON epi.location_and_offices_id = lao.location_and_offices_id
+        LEFT JOIN department d ON epi.department_id = d.dept_id AND d.company_id = %s
+        LEFT JOIN `rank` rk ON epi.rank_id = rk.rank_id AND rk.company_id = %s
+        WHERE e.company_id = %s AND e.emp_id > %s
+    """, ['encrypt_key', 'encrypt_key', 'company_id', 'company_id', 'company_id', 'company_id', 'zero'],
+        covering=['epi']),
+    _shape('shifts_changes', f"""
+        SELECT ess.emp_id, {_NAMES}, ws.work_schedule_id, ws.name AS shift_name, ws.work_type_name AS shift_type,
+            ess.valid_from, ess.until, ess.status
+        FROM employee_shifts_schedule ess
+        JOIN employee e ON ess.emp_id = e.emp_id
+        JOIN work_schedule ws ON ess.work_schedule_id = ws.work_schedule_id
+        WHERE ess.company_id = %s AND ws.comp_id = %s AND ess.status = 'Active'
+            AND ((ess.valid_from >= %s AND ess.valid_from <= %s) OR (ess.until >= %s AND ess.until <= %s)
+                 OR (ess.valid_from <= %s AND ess.until >= %s))
+        ORDER BY ess.emp_id ASC, ess.valid_from ASC
+    """, ['encrypt_key', 'encrypt_key', 'company_id', 'company_id'] + ['range_from', 'period_to'] * 3),
+    _shape('schedules_by_type', """
+        SELECT ws.work_schedule_id, ws.name, COUNT(DISTINCT ess.emp_id) AS employee_count
+        FROM work_schedule ws
+        LEFT JOIN employee_shifts_schedule ess ON ws.work_schedule_id = ess.work_schedule_id
+            AND ess.status = 'Active' AND ess.company_id = %s
+        WHERE ws.comp_id = %s AND ws.status = 'Active' AND ws.work_type_name = %s
+        GROUP BY ws.work_schedule_id, ws.name
+        ORDER BY employee_count DESC, ws.name ASC
+    """, ['company_id', 'company_id', 'work_type_name']),
+    _shape('shift_employees', f"""
+        SELECT DISTINCT ess.emp_id, {_NAMES}, COALESCE(lao.name, 'N/A') AS location_office
+        FROM employee_shifts_schedule ess
+        JOIN employee e ON ess.emp_id = e.emp_id
+        LEFT JOIN employee_payroll_information epi ON ess.emp_id = epi.emp_id AND epi.company_id = %s
+        LEFT JOIN location_and_offices lao ON epi.location_and_offices_id = lao.location_and_offices_id
+        WHERE ess.company_id = %s AND ess.work_schedule_id = %s AND ess.status = 'Active'
+        ORDER BY last_name ASC, first_name ASC
+    """, ['encrypt_key', 'encrypt_key', 'company_id', 'company_id', 'work_schedule_id'], covering=['epi']),
+    _shape('deepdive_payroll_cronjob', """
+        SELECT pc.payroll_cronjob_id, pc.datetimestamp, pc.period_from, pc.period_to, pc.hoursworked_details,
+            CAST(AES_DECRYPT(pp.basic_pay, %s) AS DECIMAL(10,2)) AS basic_pay,
+            CAST(AES_DECRYPT(pp.rate, %s) AS DECIMAL(10,2)) AS rate
+        FROM payroll_cronjob pc
+        LEFT JOIN payroll_payslip pp ON pc.emp_id = pp.emp_id AND pc.company_id = pp.company_id
+            AND pc.period_from = pp.period_from AND pc.period_to = pp.period_to
+        WHERE pc.company_id = %s AND pc.emp_id = %s AND pc.period_from <= %s AND pc.period_to >= %s
+        ORDER BY pc.period_from, pc.period_to
+    """, ['encrypt_key', 'encrypt_key', 'company_id', 'emp_id', 'period_to', 'range_from']),
+    _shape('deepdive_timekeeping', """
+        SELECT * FROM employee_time_in WHERE comp_id = %s AND emp_id = %s AND date = %s
+    """, ['company_id', 'emp_id', 'period_from']),
+    _shape('deepdive_shifts', """
+        SELECT ess.*, ws.name AS shift_name, ws.work_type_name, ws.status AS shift_status
+        FROM employee_shifts_schedule ess
+        JOIN work_schedule ws ON ess.work_schedule_id = ws.work_schedule_id
+        WHERE ess.company_id = %s AND ess.emp_id = %s AND %s BETWEEN ess.valid_from AND ess.until
+    """, ['company_id', 'emp_id', 'period_from']),
+]
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    """How a plan reads one table: access type, index used, whether the index alone answers it."""
+    table: str
+    access: str
+    key: Optional[str]
+    covering: bool
+    rows: Optional[int] = None
+
+    def describe(self) -> str:
+        text = f"{self.table}: {self.access} {self.key or '-'}"
+        if self.covering:
+            text += ' (covering)'
+        if self.rows is not None:
+            text += f' rows={self.rows}'
+        return text
+
+
+@dataclass
+class ShapePlan:
+    """EXPLAIN result of one QueryShape with the coverage problems found in it."""
+    shape: str
+    steps: List[PlanStep] = field(default_factory=list)
+    issues: List[str] = field(default_factory=list)
+
+
+# SQLite's EXPLAIN QUERY PLAN table lines, e.g. "SEARCH p USING COVERING INDEX idx (company_id=?)"
+_SQLITE_STEP = re.compile(
+    r'^(SEARCH|SCAN) (?:TABLE )?(\S+)(?: AS (\S+))?'
+    r'(?: USING (?:(AUTOMATIC )?(COVERING )?INDEX (\S+)|(?:INTEGER )?PRIMARY KEY))?'
+)
+
+
+def plan_steps(plan: Any) -> List[PlanStep]:
+    """
+    Table accesses of an EXPLAIN plan.
+
+    Args:
+        plan: MySQL's EXPLAIN FORMAT=JSON document, or the detail lines of
+            the SQLite stand-in's EXPLAIN QUERY PLAN
+
+    Returns:
+        One PlanStep per table read, in plan order. MySQL access types are
+        kept as they are (const, eq_ref, ref, range, index, ALL), SQLite
+        lookups become 'search', index scans 'index' and table scans 'ALL'.
+    """
+    steps: List[PlanStep] = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if 'table_name' in node and 'access_type' in node:
+                rows = node.get('rows_examined_per_scan')
+                steps.append(PlanStep(node['table_name'], node['access_type'], node.get('key'),
+                                      bool(node.get('using_index')), int(rows) if rows is not None else None))
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+        elif isinstance(node, str):
+            match = _SQLITE_STEP.match(node)
+            if match is None or match.group(2) == 'CONSTANT' or match.group(2).startswith('('):
+                return
+            operation, table, alias, automatic, covering, key = match.groups()
+            if key is None and 'PRIMARY KEY' in node:
+                key = 'PRIMARY'
+            if automatic:
+                # SQLite built a throwaway index for this statement, there is no real one
+                key = None
+            access = 'search' if operation == 'SEARCH' else 'index' if key else 'ALL'
+            steps.append(PlanStep(alias or table, access, key, bool(covering)))
+
+    walk(plan)
+    return steps
+
+
+def plan_issues(shape: QueryShape, steps: Sequence[PlanStep]) -> List[str]:
+    """Coverage problems of a shape's plan: table scans, lookups without an index, rows read past a covering index."""
+    issues = []
+    for step in steps:
+        if step.access == 'ALL':
+            issues.append(f"full scan of {step.table}")
+        elif step.access == 'index':
+            issues.append(f"full index scan of {step.table} ({step.key})")
+        elif step.key is None:
+            issues.append(f"no index for {step.table}")
+        elif step.table in shape.covering and not step.covering:
+            issues.append(f"{step.table} reads rows past {step.key}")
+    return issues
+
+
+def explain(cursor, shape: QueryShape, samples: Dict[str, Any]) -> ShapePlan:
+    """EXPLAIN one shape with sample parameter values."""
+    result = ShapePlan(shape.name)
+    try:
+        cursor.execute(f"EXPLAIN FORMAT=JSON {shape.query.sql}", shape.query.params(samples))
+        rows = cursor.fetchall()
+    except Exception as e:
+        result.issues.append(f"EXPLAIN failed: {str(e)}")
+        return result
+    if len(rows) == 1 and len(rows[0]) == 1:
+        plan = json.loads(rows[0][0])
+    else:
+        plan = [str(row[-1]) for row in rows]
+    result.steps = plan_steps(plan)
+    result.issues = plan_issues(shape, result.steps)
+    return result
+
+
+def explain_catalog(cursor, samples: Dict[str, Any]) -> Dict[str, ShapePlan]:
+    return {shape.name: explain(cursor, shape, samples) for shape in QUERY_SHAPES}
+
+
+def sample_values(cursor, company_id=None) -> Dict[str, Any]:
+    """
+    Parameter values to explain the shapes with, taken from the data so the
+    optimizer sees realistic selectivity: the company with the most payslips
+    (or company_id), its latest period, a three month range ending there, and
+    an employee, payroll group, department, location and schedule of it.
+    """
+    if company_id is None:
+        cursor.execute("""
+            SELECT company_id FROM payroll_payslip
+            GROUP BY company_id ORDER BY COUNT(*) DESC LIMIT 1
+        """)
+        row = cursor.fetchone()
+        if row is None:
+            raise ValueError("payroll_payslip is empty, there is nothing to take sample values from")
+        company_id = row[0]
     cursor.execute("""
-        SELECT COUNT(*) 
-        FROM information_schema.statistics 
-        WHERE table_schema = %s 
-        AND table_name = %s 
-        AND index_name = %s
-    """, (os.getenv('DB_NAME'), table_name, index_name))
-    return cursor.fetchone()[0] > 0
-
-def create_indexes():
-    """Create performance indexes for the payroll_payslip and employee_payroll_information tables"""
+        SELECT period_from, period_to, emp_id, payroll_group_id FROM payroll_payslip
+        WHERE company_id = %s ORDER BY period_from DESC LIMIT 1
+    """, (company_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Company {company_id} has no payslips")
+    period_from, period_to, emp_id, payroll_group_id = row
+    cursor.execute("""
+        SELECT department_id, location_and_offices_id FROM employee_payroll_information
+        WHERE company_id = %s AND department_id IS NOT NULL LIMIT 1
+    """, (company_id,))
+    department_id, location_id = cursor.fetchone() or (0, 0)
+    cursor.execute("""
+        SELECT work_schedule_id, work_type_name FROM work_schedule
+        WHERE comp_id = %s AND status = 'Active' LIMIT 1
+    """, (company_id,))
+    work_schedule_id, work_type_name = cursor.fetchone() or (0, '')
+    return {
+        # EXPLAIN does not decrypt anything, the real key is not needed
+        'encrypt_key': 'explain',
+        'company_id': company_id,
+        'emp_id': emp_id,
+        'payroll_group_id': payroll_group_id,
+        'period_from': period_from,
+        'period_to': period_to,
+        'range_from': period_from - timedelta(days=90),
+        'department_id': department_id,
+        'location_id': location_id,
+        'work_schedule_id': work_schedule_id,
+        'work_type_name': work_type_name,
+        'zero': 0,
+    }
+
+
+def existing_indexes(cursor, backend: str) -> Dict[str, Dict[str, Tuple[str, ...]]]:
+    """Secondary and primary indexes of the managed tables: table -> index name -> columns."""
+    tables = sorted({spec.table for spec in INDEXES} | set(RETIRED))
+    found: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+    placeholders = ', '.join(['%s'] * len(tables))
+    if backend == 'sqlite':
+        cursor.execute(f"""
+            SELECT tbl_name, name FROM sqlite_master
+            WHERE type = 'index' AND tbl_name IN ({placeholders})
+        """, tuple(tables))
+        for table, name in cursor.fetchall():
+            cursor.execute(f"PRAGMA index_info({name})")
+            found.setdefault(table, {})[name] = tuple(row[2] for row in cursor.fetchall())
+        # Tables without indexes still exist
+        cursor.execute(f"SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})",
+                       tuple(tables))
+    else:
+        cursor.execute(f"""
+            SELECT table_name, index_name, column_name FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name IN ({placeholders})
+            ORDER BY table_name, index_name, seq_in_index
+        """, tuple(tables))
+        for table, name, column in cursor.fetchall():
+            columns = found.setdefault(table, {}).get(name, ())
+            found[table][name] = columns + (column,)
+        cursor.execute(f"""
+            SELECT table_name FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name IN ({placeholders})
+        """, tuple(tables))
+    for (table,) in cursor.fetchall():
+        found.setdefault(table, {})
+    return found
+
+
+@dataclass
+class TableChange:
+    """Index changes of one table, applied as a single online ALTER TABLE."""
+    table: str
+    drop: List[str] = field(default_factory=list)
+    add: List[IndexSpec] = field(default_factory=list)
+
+    def statements(self, backend: str) -> List[str]:
+        if backend == 'sqlite':
+            # No online ALTER in SQLite, the stand-in takes the same changes one index at a time,
+            # replacements are built before the indexes they replace go
+            rebuilt = {spec.name for spec in self.add}
+            return ([f"DROP INDEX {name}" for name in self.drop if name in rebuilt]
+                    + [spec.create_sql() for spec in self.add]
+                    + [f"DROP INDEX {name}" for name in self.drop if name not in rebuilt])
+        clauses = [f"DROP INDEX {name}" for name in self.drop] + [f"ADD {spec.definition()}" for spec in self.add]
+        return [f"ALTER TABLE {self.table} {', '.join(clauses)}, ALGORITHM=INPLACE, LOCK=NONE"]
+
+
+def plan_changes(existing: Dict[str, Dict[str, Tuple[str, ...]]]) -> Tuple[List[TableChange], List[str]]:
+    """
+    Changes that bring the tables to INDEXES.
+
+    An index is added unless the table already has one on the same columns,
+    one of the same name on other columns is rebuilt. RETIRED indexes are
+    dropped. Nothing else is touched, so primary and unique keys and indexes
+    added by hand stay as they are.
+
+    Returns:
+        Tuple of (changes per table, notes on what was left alone and why)
+    """
+    changes: Dict[str, TableChange] = {}
+    notes = []
+    for spec in INDEXES:
+        indexes = existing.get(spec.table)
+        if indexes is None:
+            notes.append(f"{spec.table} does not exist, skipping {spec.name}")
+            continue
+        if indexes.get(spec.name) == spec.columns:
+            continue
+        same = [name for name, columns in indexes.items() if columns == spec.columns]
+        if same:
+            notes.append(f"{spec.name} is already there as {same[0]}")
+            continue
+        change = changes.setdefault(spec.table, TableChange(spec.table))
+        if spec.name in indexes:
+            change.drop.append(spec.name)
+        change.add.append(spec)
+    for table, names in RETIRED.items():
+        for name in names:
+            if name in existing.get(table, {}):
+                changes.setdefault(table, TableChange(table)).drop.append(name)
+    return list(changes.values()), notes
+
+
+def diff_plans(before: Dict[str, List[str]], after: Dict[str, List[str]]) -> List[str]:
+    """Lines showing the plan steps of each shape that changed between two runs."""
+    lines = []
+    for name in sorted(set(before) | set(after)):
+        old, new = before.get(name, []), after.get(name, [])
+        if old == new:
+            continue
+        lines.append(f"{name}:")
+        lines.extend(f"  {line}" for line in difflib.ndiff(old, new) if line[:1] in '-+')
+    return lines
+
+
+def plan_summary(plans: Dict[str, ShapePlan]) -> Dict[str, List[str]]:
+    """Plans as saved with --save-plans: shape -> described steps."""
+    return {name: [step.describe() for step in plan.steps] for name, plan in plans.items()}
+
+
+def print_report(plans: Dict[str, ShapePlan]) -> None:
+    for plan in plans.values():
+        if plan.issues:
+            print(f"❌ {plan.shape}: {'; '.join(plan.issues)}")
+            for step in plan.steps:
+                print(f"      {step.describe()}")
+        else:
+            print(f"✅ {plan.shape}: {', '.join(step.describe() for step in plan.steps)}")
+    uncovered = sum(1 for plan in plans.values() if plan.issues)
+    print(f"{uncovered} of {len(plans)} query shapes lack index coverage")
+
+
+def connect() -> Tuple[Any, str]:
+    """(connection, backend) from the app's database settings."""
+    backend = os.getenv('DB_BACKEND', 'mysql')
+    if backend == 'sqlite':
+        from local_db import sqlite_connector
+        return sqlite_connector(os.getenv('SQLITE_PATH', 'payroll_local.db'))(), backend
+    from db_pool import mysql_connector
+    return mysql_connector({
+        'MYSQL_HOST': os.getenv('DB_HOST'),
+        'MYSQL_PORT': int(os.getenv('DB_PORT', 3306)),
+        'MYSQL_USER': os.getenv('DB_USER'),
+        'MYSQL_PASSWORD': os.getenv('DB_PASSWORD'),
+        'MYSQL_DB': os.getenv('DB_NAME'),
+    })(), backend
+
+
+def manage_indexes(dry_run: bool = False, company_id=None, save_plans: Optional[str] = None,
+                   compare: Optional[str] = None, lock_wait_timeout: int = 10) -> bool:
+    """
+    Report index coverage of QUERY_SHAPES and bring the indexes to INDEXES.
+
+    Args:
+        dry_run: Only report and print the statements
+        company_id: Company to take sample values from, the busiest one by default
+        save_plans: File to write the plans (before any change) to as JSON
+        compare: File written by an earlier save_plans run to diff the current plans against
+        lock_wait_timeout: Seconds an ALTER waits for the table's metadata lock
+            before giving up, so it never queues the app's queries behind a
+            long-running transaction
+
+    Returns:
+        True when every change was applied (or none was needed)
+    """
+    conn, backend = connect()
     try:
-        with app.app_context():
-            cursor = mysql.connection.cursor()
-            
-            # Index for main analytics queries (company + period)
-            if not index_exists(cursor, 'idx_company_period', 'payroll_payslip'):
-                print("Creating index for company and period queries...")
-                cursor.execute("""
-                    CREATE INDEX idx_company_period 
-                    ON payroll_payslip(company_id, period_from, period_to)
-                """)
-                print("✅ Created idx_company_period")
-            else:
-                print("⏭️  Index idx_company_period already exists")
-            
-            # Index for employee-specific queries
-            if not index_exists(cursor, 'idx_company_emp', 'payroll_payslip'):
-                print("Creating index for employee queries...")
-                cursor.execute("""
-                    CREATE INDEX idx_company_emp 
-                    ON payroll_payslip(company_id, emp_id)
-                """)
-                print("✅ Created idx_company_emp")
-            else:
-                print("⏭️  Index idx_company_emp already exists")
-            
-            # Composite index for both use cases
-            if not index_exists(cursor, 'idx_company_emp_period', 'payroll_payslip'):
-                print("Creating composite index...")
-                cursor.execute("""
-                    CREATE INDEX idx_company_emp_period 
-                    ON payroll_payslip(company_id, emp_id, period_from, period_to)
-                """)
-                print("✅ Created idx_company_emp_period")
-            else:
-                print("⏭️  Index idx_company_emp_period already exists")
-            
-            # New indexes for employee_payroll_information
-            epi_indexes = [
-                ('idx_epi_company_department', 'department_id'),
-                ('idx_epi_company_rank', 'rank_id'),
-                ('idx_epi_company_employment_type', 'employment_type'),
-                ('idx_epi_company_position', 'position'),
-                ('idx_epi_company_cost_center', 'cost_center'),
-                ('idx_epi_company_project', 'project_id'),
-                ('idx_epi_company_location', 'location_and_offices_id'),
-            ]
-            for idx_name, col in epi_indexes:
-                if not index_exists(cursor, idx_name, 'employee_payroll_information'):
-                    print(f"Creating index {idx_name} on employee_payroll_information({col})...")
-                    cursor.execute(f"""
-                        CREATE INDEX {idx_name}
-                        ON employee_payroll_information(company_id, {col})
-                    """)
-                    print(f"✅ Created {idx_name}")
-                else:
-                    print(f"⏭️  Index {idx_name} already exists")
-            
-            # New index for work_schedule (for allocation analytics)
-            if not index_exists(cursor, 'idx_ws_company_type_status', 'work_schedule'):
-                print("Creating index idx_ws_company_type_status on work_schedule(company_id, work_type_name, status)...")
-                cursor.execute("""
-                    CREATE INDEX idx_ws_company_type_status
-                    ON work_schedule(comp_id, work_type_name, status)
-                """)
-                print("✅ Created idx_ws_company_type_status")
-            else:
-                print("⏭️  Index idx_ws_company_type_status already exists")
-
-            # New index for employee_shifts_schedule (for allocation analytics)
-            if not index_exists(cursor, 'idx_ess_company_sched_status', 'employee_shifts_schedule'):
-                print("Creating index idx_ess_company_sched_status on employee_shifts_schedule(company_id, work_schedule_id, status)...")
-                cursor.execute("""
-                    CREATE INDEX idx_ess_company_sched_status
-                    ON employee_shifts_schedule(company_id, work_schedule_id, status)
-                """)
-                print("✅ Created idx_ess_company_sched_status")
-            else:
-                print("⏭️  Index idx_ess_company_sched_status already exists")
-            
-            # Index for payroll group queries
-            if not index_exists(cursor, 'idx_company_payroll_group', 'payroll_payslip'):
-                print("Creating index for payroll group queries...")
-                cursor.execute("""
-                    CREATE INDEX idx_company_payroll_group 
-                    ON payroll_payslip(company_id, payroll_group_id)
-                """)
-                print("✅ Created idx_company_payroll_group")
-            else:
-                print("⏭️  Index idx_company_payroll_group already exists")
-            
-            # Index for payroll_cronjob (deep dive)
-            if not index_exists(cursor, 'idx_pc_company_emp_period', 'payroll_cronjob'):
-                print("Creating index idx_pc_company_emp_period on payroll_cronjob(company_id, emp_id, period_from, period_to)...")
-                cursor.execute("""
-                    CREATE INDEX idx_pc_company_emp_period
-                    ON payroll_cronjob(company_id, emp_id, period_from, period_to)
-                """)
-                print("✅ Created idx_pc_company_emp_period")
-            else:
-                print("⏭️  Index idx_pc_company_emp_period already exists")
-
-            # Index for employee_time_in (deep dive)
-            if not index_exists(cursor, 'idx_eti_comp_emp_date', 'employee_time_in'):
-                print("Creating index idx_eti_comp_emp_date on employee_time_in(comp_id, emp_id, date)...")
-                cursor.execute("""
-                    CREATE INDEX idx_eti_comp_emp_date
-                    ON employee_time_in(comp_id, emp_id, date)
-                """)
-                print("✅ Created idx_eti_comp_emp_date")
-            else:
-                print("⏭️  Index idx_eti_comp_emp_date already exists")
-
-            # Index for employee_shifts_schedule (deep dive)
-            if not index_exists(cursor, 'idx_ess_company_emp_valid', 'employee_shifts_schedule'):
-                print("Creating index idx_ess_company_emp_valid on employee_shifts_schedule(company_id, emp_id, valid_from, until)...")
-                cursor.execute("""
-                    CREATE INDEX idx_ess_company_emp_valid
-                    ON employee_shifts_schedule(company_id, emp_id, valid_from, until)
-                """)
-                print("✅ Created idx_ess_company_emp_valid")
-            else:
-                print("⏭️  Index idx_ess_company_emp_valid already exists")
-
-            # Index for work_schedule (deep dive)
-            if not index_exists(cursor, 'idx_ws_id_comp_status', 'work_schedule'):
-                print("Creating index idx_ws_id_comp_status on work_schedule(work_schedule_id, comp_id, status)...")
-                cursor.execute("""
-                    CREATE INDEX idx_ws_id_comp_status
-                    ON work_schedule(work_schedule_id, comp_id, status)
-                """)
-                print("✅ Created idx_ws_id_comp_status")
-            else:
-                print("⏭️  Index idx_ws_id_comp_status already exists")
-            
-            mysql.connection.commit()
-            cursor.close()
-            
-            print("✅ All indexes created successfully!")
-            
+        cursor = conn.cursor()
+        samples = sample_values(cursor, company_id)
+        print(f"Explaining {len(QUERY_SHAPES)} query shapes for company {samples['company_id']}, "
+              f"{samples['range_from']}..{samples['period_to']}")
+        before = explain_catalog(cursor, samples)
+        print_report(before)
+
+        if save_plans:
+            with open(save_plans, 'w') as f:
+                json.dump(plan_summary(before), f, indent=2)
+            print(f"Saved plans to {save_plans}")
+        if compare:
+            with open(compare) as f:
+                saved = json.load(f)
+            print(f"\nPlan changes since {compare}:")
+            print('\n'.join(diff_plans(saved, plan_summary(before))) or '  none')
+
+        changes, notes = plan_changes(existing_indexes(cursor, backend))
+        for note in notes:
+            print(f"⏭️  {note}")
+        if not changes:
+            print("\n✅ Indexes are up to date")
+            return True
+        print(f"\n{'Would run' if dry_run else 'Running'}:")
+        for change in changes:
+            for statement in change.statements(backend):
+                print(f"  {statement};")
+        if dry_run:
+            return True
+
+        if backend != 'sqlite':
+            cursor.execute("SET SESSION lock_wait_timeout = %s", (lock_wait_timeout,))
+        for change in changes:
+            start = time.perf_counter()
+            for statement in change.statements(backend):
+                cursor.execute(statement)
+            print(f"✅ {change.table}: {len(change.add)} added, {len(change.drop)} dropped "
+                  f"in {time.perf_counter() - start:.1f}s")
+        # Fresh statistics, so the optimizer weighs the new indexes
+        if backend == 'sqlite':
+            cursor.execute("ANALYZE")
+        else:
+            for change in changes:
+                cursor.execute(f"ANALYZE TABLE {change.table}")
+                cursor.fetchall()
+        conn.commit()
+
+        after = explain_catalog(cursor, samples)
+        print("\nAfter:")
+        print_report(after)
+        print("\nPlan changes:")
+        print('\n'.join(diff_plans(plan_summary(before), plan_summary(after))) or '  none')
+        cursor.close()
     except Exception as e:
-        print(f"❌ Error creating indexes: {str(e)}")
+        print(f"❌ Error managing indexes: {str(e)}")
         return False
-    
+    finally:
+        conn.close()
     return True
 
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='report coverage and print the ALTERs without running them')
+    parser.add_argument('--company', type=int, help='company to take sample values from (default: most payslips)')
+    parser.add_argument('--save-plans', metavar='FILE', help='write the current plans to FILE as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='diff the current plans against a --save-plans FILE')
+    parser.add_argument('--lock-wait-timeout', type=int, default=10,
+                        help='seconds an ALTER waits for its metadata lock (default: 10)')
+    args = parser.parse_args(argv)
+    success = manage_indexes(dry_run=args.dry_run, company_id=args.company, save_plans=args.save_plans,
+                             compare=args.compare, lock_wait_timeout=args.lock_wait_timeout)
+    return 0 if success else 1
+
+
 if __name__ == "__main__":
-    print("Creating database indexes for performance optimization...")
-    success = create_indexes()
-    if success:
-        print("Index creation completed successfully!")
-    else:
-        print("Index creation failed!") 
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Details column with "label-Month DD, YYYY-hours" entries
+HOURS_FIELD = 'hoursworked_details'
+
+# Details columns with "label-hours-amount-YYYY/MM/DD" entries
+DETAIL_FIELDS = [
+    'absences_details', 'tardiness_details', 'undertime_details',
+    'paid_leave_details', 'overtime_details', 'rest_day_details',
+    'holiday_premium_details', 'night_differential_details'
+]
+
+
+def date_label(day) -> str:
+    """The "May 01, 2025" form the details entries are matched on."""
+    return day.strftime('%B %d, %Y')
+
+
+@dataclass
+class ParsedDetails:
+    """
+    The *_details columns of one payroll_cronjob row, indexed by date label.
+
+    hours is None when hoursworked_details is empty. Empty or unparseable
+    amount columns have an empty index, they show as "~" for every day.
+    """
+    hours: Optional[Dict[str, str]] = None
+    hours_error: bool = False
+    amounts: Dict[str, Dict[str, Tuple[str, str]]] = field(default_factory=dict)
+
+    def day(self, day) -> Dict[str, str]:
+        """hours_worked and one value per details field for a day, formatted for the deep dive."""
+        label = date_label(day)
+        short_date = day.strftime('%d-%b-%y')
+        if self.hours_error:
+            values = {'hours_worked': "Error parsing hours data"}
+        elif self.hours is None:
+            values = {'hours_worked': "No hours data available"}
+        else:
+            hours_worked = self.hours.get(label)
+            if hours_worked:
+                values = {'hours_worked': f"{short_date} | {hours_worked} hrs"}
+            else:
+                values = {'hours_worked': "No hours data for this date"}
+
+        for field_name in DETAIL_FIELDS:
+            hours, amount = self.amounts.get(field_name, {}).get(label, (None, None))
+            processed_field = field_name.replace('_details', '')
+            values[processed_field] = f"{short_date} | {hours} hrs | {amount}" if hours and amount else "~"
+        return values
+
+
+def parse_details(record: Dict[str, Any]) -> ParsedDetails:
+    """
+    Parse the *_details JSON columns of a payroll_cronjob row once into per-date indexes.
+
+    The first entry for a date wins, like the original per-date scan.
+    """
+    parsed = ParsedDetails()
+    if record[HOURS_FIELD]:
+        try:
+            hours: Dict[str, str] = {}
+            for entry in json.loads(record[HOURS_FIELD]):
+                parts = entry.split('-')
+                if len(parts) >= 3:
+                    hours.setdefault(parts[1].strip(), parts[2].strip())
+            parsed.hours = hours
+        except ValueError:
+            parsed.hours_error = True
+
+    for field_name in DETAIL_FIELDS:
+        index: Dict[str, Tuple[str, str]] = {}
+        if record[field_name]:
+            try:
+                entries = json.loads(record[field_name])
+            except ValueError:
+                entries = []
+            for entry in entries:
+                parts = entry.split('-')
+                if len(parts) < 4:
+                    continue
+                label = parts[3].strip()
+                # Convert date format from "2025/05/01" to "May 01, 2025"
+                if '/' in label:
+                    try:
+                        label = date_label(datetime.strptime(label, '%Y/%m/%d'))
+                    except ValueError:
+                        continue
+                index.setdefault(label, (parts[1].strip(), parts[2].strip()))
+        parsed.amounts[field_name] = index
+    return parsed
+
+
+def record_days(record: Dict[str, Any], date_from: date, date_to: date) -> Iterator[date]:
+    """Days of the record's payroll period that fall inside date_from..date_to."""
+    day = max(_as_date(record['period_from']), date_from)
+    last = min(_as_date(record['period_to']), date_to)
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+class ParsedDetailsCache:
+    """
+    LRU cache of ParsedDetails keyed by (payroll_cronjob_id, datetimestamp).
+
+    A payroll rerun updates datetimestamp, so a changed row gets a new key and
+    its stale entry ages out.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, ParsedDetails]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, record: Dict[str, Any]) -> ParsedDetails:
+        """Parsed details of a payroll_cronjob row, parsing it on a miss."""
+        key = (record.get('payroll_cronjob_id'), record.get('datetimestamp'))
+        if key[0] is None:
+            return parse_details(record)
+        with self._lock:
+            parsed = self._entries.get(key)
+            if parsed is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return parsed
+            self.misses += 1
+
+        parsed = parse_details(record)
+        with self._lock:
+            self._entries[key] = parsed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return parsed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
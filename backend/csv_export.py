@@ -0,0 +1,128 @@
+import csv
+import io
+import zipfile
+from itertools import chain, groupby
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+# Rows buffered before a chunk of the CSV body is handed to the client
+CSV_FLUSH_ROWS = 500
+
+
+class _LineBuffer:
+    """Write target for csv.writer that is emptied every time a chunk is yielded."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+
+    def write(self, text: str) -> int:
+        self.parts.append(text)
+        return len(text)
+
+    def drain(self) -> str:
+        text = ''.join(self.parts)
+        self.parts.clear()
+        return text
+
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable write target, zipfile then streams entries with data descriptors."""
+
+    def __init__(self):
+        super().__init__()
+        self.parts: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def export_header(fields: Sequence[str], labels: Dict[str, str], with_period: bool = False) -> List[str]:
+    header = ['Period From', 'Period To'] if with_period else []
+    header += ['Last Name', 'First Name', 'Employee ID']
+    return header + [labels.get(field, field) for field in fields]
+
+
+def collapse_employees(records: Iterable[Dict[str, Any]], fields: Sequence[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Sum consecutive records of the same employee into one record.
+
+    Records must arrive grouped by emp_id. NULL amounts count as 0, an amount
+    that is NULL in every record stays NULL.
+    """
+    for emp_id, group in groupby(records, key=lambda record: record['emp_id']):
+        # groupby never yields an empty group
+        collapsed = dict(next(group))
+        for record in group:
+            for field in fields:
+                if record[field] is not None:
+                    collapsed[field] = (collapsed[field] or 0) + record[field]
+        yield collapsed
+
+
+def _records(rows) -> Iterator[Dict[str, Any]]:
+    colnames = rows.colnames
+    return (dict(zip(colnames, row)) for row in chain.from_iterable(rows))
+
+
+def _csv_row(record: Dict[str, Any], fields: Sequence[str], with_period: bool) -> List[Any]:
+    values = [record['period_from'], record['period_to']] if with_period else []
+    values += [record['last_name'], record['first_name'], record['emp_id']]
+    return values + ['' if record[field] is None else record[field] for field in fields]
+
+
+def _write_csv(records: Iterable[Dict[str, Any]], fields: Sequence[str], labels: Dict[str, str],
+               with_period: bool, out: _LineBuffer) -> Iterator[str]:
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(export_header(fields, labels, with_period))
+    for count, record in enumerate(records, 1):
+        writer.writerow(_csv_row(record, fields, with_period))
+        if count % CSV_FLUSH_ROWS == 0:
+            yield out.drain()
+    yield out.drain()
+
+
+def csv_body(rows, fields: Sequence[str], labels: Dict[str, str], collapse: bool = False) -> Iterator[str]:
+    """
+    One CSV document over rows.
+
+    Args:
+        rows: ServerSideRows or CachedRows
+        fields: Payslip fields to export, in column order
+        labels: Display name per field for the header
+        collapse: One row per employee (rows must be grouped by emp_id), otherwise
+            one row per payslip with its period
+    """
+    records = _records(rows)
+    if collapse:
+        return _write_csv(collapse_employees(records, fields), fields, labels, False, _LineBuffer())
+    return _write_csv(records, fields, labels, True, _LineBuffer())
+
+
+def zip_body(rows, fields: Sequence[str], labels: Dict[str, str], name_prefix: str) -> Iterator[bytes]:
+    """
+    A zip archive with one CSV per period, streamed as it is compressed.
+
+    Rows must arrive ordered by period. Each entry is named
+    `{name_prefix}_{period_from}_{period_to}.csv`.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for (period_from, period_to), records in groupby(
+                _records(rows), key=lambda record: (record['period_from'], record['period_to'])):
+            with archive.open(f'{name_prefix}_{period_from}_{period_to}.csv', 'w') as entry:
+                for text in _write_csv(records, fields, labels, False, _LineBuffer()):
+                    entry.write(text.encode('utf-8'))
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    # The central directory is written when the archive closes
+    yield sink.drain()
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import g, make_response, request
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_data_version(cursor, company_id, period_from=None, period_to=None) -> Tuple[Any, ...]:
+    """
+    Cheap fingerprint of the payroll data behind a company's responses.
+
+    Payslip count and latest created_date plus the latest payroll_cronjob
+    datetimestamp, over the periods inside period_from..period_to or over
+    every period when no range is given. One round trip on the
+    (company_id, period_from, period_to) indexes, no decryption.
+    """
+    period_sql = ''
+    params: Tuple[Any, ...] = (company_id,)
+    if period_from and period_to:
+        period_sql = ' AND period_from >= %s AND period_to <= %s'
+        params += (period_from, period_to)
+    cursor.execute(f"""
+        SELECT
+            (SELECT COUNT(*) FROM payroll_payslip WHERE company_id = %s{period_sql}),
+            (SELECT MAX(created_date) FROM payroll_payslip WHERE company_id = %s{period_sql}),
+            (SELECT MAX(datetimestamp) FROM payroll_cronjob WHERE company_id = %s{period_sql})
+    """, params * 3)
+    return tuple(cursor.fetchone())
+
+
+class DataVersionCache:
+    """
+    Process-wide cache of fetch_data_version results, kept for ttl_seconds.
+
+    Saves the fingerprint round trip on repeated requests for the same scope;
+    a data change is noticed at most ttl_seconds late. The least recently used
+    scopes are dropped past max_entries.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 4096):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Any, ...], Tuple[float, Tuple[Any, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cursor, company_id, period_from=None, period_to=None) -> Tuple[Any, ...]:
+        """fetch_data_version for the scope, from the cache while it is fresh."""
+        scope = (str(company_id), period_from, period_to)
+        with self._lock:
+            entry = self._entries.get(scope)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(scope)
+                return entry[1]
+        version = fetch_data_version(cursor, company_id, period_from, period_to)
+        with self._lock:
+            self._entries[scope] = (time.monotonic(), version)
+            self._entries.move_to_end(scope)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return version
+
+
+def request_data_version(cursor, company_id, period_from=None, period_to=None,
+                         cache: Optional[DataVersionCache] = None) -> Tuple[Any, ...]:
+    """
+    fetch_data_version for the current request, fetched once per scope.
+
+    Reuses the version conditional_on_data_version built the ETag from, so
+    anything keyed on it matches the tag the response is sent with. With a
+    cache, the version may also come from an earlier request.
+    """
+    scope = (company_id, period_from, period_to)
+    fetched = g.get('data_version')
+    if fetched is not None and fetched[0] == scope:
+        return fetched[1]
+    if cache is not None:
+        version = cache.get(cursor, *scope)
+    else:
+        version = fetch_data_version(cursor, *scope)
+    g.data_version = (scope, version)
+    return version
+
+
+def data_version_etag(version: Tuple[Any, ...], max_age_seconds: float = 0) -> str:
+    """
+    ETag for the current request at a data version.
+
+    The full path and Accept header are part of the tag, so every URL, filter
+    set and negotiated format gets its own. With max_age_seconds the tag also
+    changes once per window, so changes the fingerprint does not see (employee
+    names, settings labels) are picked up within that time.
+    """
+    window = int(time.time() // max_age_seconds) if max_age_seconds else 0
+    key = repr((version, request.full_path, request.headers.get('Accept', ''), window))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def conditional_on_data_version(connection: Callable[[], Any],
+                                scope: Callable[[Dict[str, Any]], Tuple[Any, Optional[str], Optional[str]]],
+                                max_age_seconds: float = 0, cache: Optional[DataVersionCache] = None):
+    """
+    Decorator answering If-None-Match with 304 before the view runs.
+
+    When the data version cannot be read, the view runs as if the decorator
+    were not there and the response goes out without an ETag, so database
+    errors are reported by the view's own error handling.
+
+    Args:
+        connection: Returns the request's database connection, e.g. lambda: mysql.connection
+        scope: Maps the view's URL arguments to (company_id, period_from, period_to),
+            with None dates for company-wide data
+        max_age_seconds: See data_version_etag
+        cache: Optional DataVersionCache shared with the views' request_data_version calls
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                cursor = connection().cursor()
+                try:
+                    version = request_data_version(cursor, *scope(kwargs), cache=cache)
+                finally:
+                    cursor.close()
+            except Exception as e:
+                logger.error(f"Data version check failed, answering without an ETag: {str(e)}")
+                return view(*args, **kwargs)
+            etag = data_version_etag(version, max_age_seconds)
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.vary.add('Accept')
+            # Let browsers keep the body but always revalidate it
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
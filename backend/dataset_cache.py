@@ -0,0 +1,124 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+@dataclass
+class CachedDataset:
+    """Decrypted rows for one (company, period range, fields, filters) slice."""
+    colnames: List[str]
+    rows: Sequence[Tuple[Any, ...]]
+    size_bytes: int
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    def column_index(self) -> Dict[str, int]:
+        """Returns a mapping of column name to its position in each row."""
+        return {name: i for i, name in enumerate(self.colnames)}
+
+
+def make_key(company_id, period_from, period_to, fields, filters, data_version) -> Tuple:
+    """
+    Build the cache key for a prefetch slice.
+
+    Field order does not matter to the decrypted data, so fields are sorted.
+    Filters are reduced to the ones that are actually set. data_version is
+    the slice's fetch_data_version fingerprint, so rows cached before the
+    payroll data changed are never served under the new version's ETag.
+    """
+    active_filters = tuple(sorted((k, str(v)) for k, v in filters.items() if v))
+    return (int(company_id), str(period_from), str(period_to), tuple(sorted(fields)), active_filters,
+            tuple(data_version))
+
+
+def estimate_size(rows: Sequence[Tuple[Any, ...]], sample_size: int = 100) -> int:
+    """Estimate the in-memory size of a list of row tuples from an evenly spaced sample."""
+    if not rows:
+        return sys.getsizeof(rows)
+    step = max(1, len(rows) // sample_size)
+    sample = rows[::step]
+    sampled_bytes = sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+        for row in sample
+    )
+    return int(sampled_bytes / len(sample) * len(rows)) + sys.getsizeof(rows)
+
+
+class DatasetCache:
+    """
+    Process-local LRU cache of decrypted payslip rows.
+
+    Entries expire after ttl_seconds and the least recently used entries are
+    evicted once the estimated size of all entries exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, CachedDataset]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple) -> Optional[CachedDataset]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry.loaded_at > self.ttl_seconds:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Tuple, colnames: List[str], rows: Sequence[Tuple[Any, ...]]) -> CachedDataset:
+        entry = CachedDataset(list(colnames), rows, estimate_size(rows))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            # A slice larger than the whole budget is served but never cached
+            if entry.size_bytes > self.max_bytes:
+                return entry
+            self._entries[key] = entry
+            self._total_bytes += entry.size_bytes
+            while self._total_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+        return entry
+
+    def get_or_load(self, key: Tuple, loader: Callable[[], Tuple[List[str], Sequence[Tuple[Any, ...]]]]) -> CachedDataset:
+        """Return the cached slice for key, calling loader() to fetch (colnames, rows) on a miss."""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        colnames, rows = loader()
+        return self.put(key, colnames, rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _remove(self, key: Tuple) -> None:
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry.size_bytes
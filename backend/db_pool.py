@@ -0,0 +1,346 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from flask import g
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections.
+
+    Holds between min_size and max_size connections. Idle connections are
+    health-checked with ping() on checkout, and a checkout waits at most
+    checkout_timeout seconds for a connection to be returned when the pool is
+    exhausted. wrap, when given, is applied by wrapped() to connections handed
+    to request code, e.g. to instrument their cursors.
+    """
+
+    def __init__(self, connect: Callable[[], Any], min_size: int = 2, max_size: int = 10,
+                 checkout_timeout: float = 10.0, ping_interval: float = 0.0,
+                 wrap: Optional[Callable[[Any], Any]] = None):
+        if min_size > max_size:
+            raise ValueError('min_size cannot exceed max_size')
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self._wrap = wrap
+        # Idle (connection, last used) pairs, most recently returned last
+        self._idle: List[Tuple[Any, float]] = []
+        self._lock = threading.Lock()
+        # Signalled whenever a connection is returned or closed, i.e. capacity frees up
+        self._available = threading.Condition(self._lock)
+        self._size = 0
+        self._in_use = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_ms': 0.0,
+            'max_wait_time_ms': 0.0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'connections_created': 0,
+            'connections_closed': 0,
+        }
+
+    def prewarm(self) -> int:
+        """Open connections until min_size is reached. Returns the number opened."""
+        opened = 0
+        while self.stats()['size'] < self.min_size:
+            conn = self._grow()
+            if conn is None:
+                break
+            self._put_idle(conn)
+            opened += 1
+        return opened
+
+    def acquire(self, block: bool = True):
+        """
+        Check out a connection: an idle one if available, a new one while the
+        pool is below max_size, otherwise wait up to checkout_timeout.
+
+        Args:
+            block: Wait for a connection to be returned when the pool is exhausted,
+                otherwise return None right away
+
+        Raises:
+            PoolTimeout: If the pool stays exhausted for checkout_timeout seconds
+        """
+        start = time.monotonic()
+        waited = False
+        while True:
+            with self._available:
+                # Wait until a connection is idle or closing one has made room for a new one
+                while not self._idle and self._size >= self.max_size:
+                    if not block:
+                        return None
+                    remaining = self.checkout_timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No database connection available within {self.checkout_timeout}s '
+                            f'(pool size {self.max_size})'
+                        )
+                    waited = True
+                    self._available.wait(remaining)
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    # Claim the slot before connecting outside the lock
+                    self._size += 1
+                    conn = None
+            if conn is None:
+                conn = self._create_claimed()
+                break
+            if self._healthy(conn, last_used):
+                break
+
+        wait_ms = (time.monotonic() - start) * 1000
+        with self._lock:
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time_ms'] += wait_ms
+                self._stats['max_wait_time_ms'] = max(self._stats['max_wait_time_ms'], wait_ms)
+        return conn
+
+    def wrapped(self, conn):
+        """conn as request code should use it, checked-out connections are always released unwrapped."""
+        return self._wrap(conn) if self._wrap is not None else conn
+
+    def release(self, conn, discard: bool = False) -> None:
+        with self._lock:
+            self._in_use -= 1
+        if not discard:
+            try:
+                # End any open transaction so the next borrower gets a fresh snapshot
+                conn.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self._close(conn)
+        else:
+            self._put_idle(conn)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of a with-block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': self._size - self._in_use,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'checkout_timeout': self.checkout_timeout,
+            })
+        stats['wait_time_ms'] = round(stats['wait_time_ms'], 2)
+        stats['max_wait_time_ms'] = round(stats['max_wait_time_ms'], 2)
+        return stats
+
+    def _grow(self):
+        """Open a new connection if the pool is below max_size, else return None."""
+        with self._lock:
+            if self._size >= self.max_size:
+                return None
+            self._size += 1
+        return self._create_claimed()
+
+    def _create_claimed(self):
+        """Open a connection for a slot already counted in _size, giving the slot back on failure."""
+        try:
+            return self._create()
+        except Exception:
+            with self._available:
+                self._size -= 1
+                self._available.notify()
+            raise
+
+    def _put_idle(self, conn) -> None:
+        with self._available:
+            self._idle.append((conn, time.monotonic()))
+            self._available.notify()
+
+    def _create(self):
+        conn = self._connect()
+        with self._lock:
+            self._stats['connections_created'] += 1
+        return conn
+
+    def _healthy(self, conn, last_used) -> bool:
+        """Ping a connection coming out of the idle queue, replacing it if it is dead."""
+        if time.monotonic() - last_used < self.ping_interval:
+            return True
+        try:
+            conn.ping()
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding dead pooled connection: {str(e)}")
+            with self._lock:
+                self._stats['health_check_failures'] += 1
+            self._close(conn)
+            return False
+
+    def _close(self, conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._available:
+            self._size -= 1
+            self._stats['connections_closed'] += 1
+            # A waiter can open a replacement now
+            self._available.notify()
+
+
+def mysql_connector(config) -> Callable[[], Any]:
+    """Connection factory using the same MYSQL_* settings flask_mysqldb reads."""
+    def connect():
+        import MySQLdb
+        return MySQLdb.connect(
+            host=config.get('MYSQL_HOST') or 'localhost',
+            port=config.get('MYSQL_PORT', 3306),
+            user=config.get('MYSQL_USER'),
+            passwd=config.get('MYSQL_PASSWORD') or '',
+            db=config.get('MYSQL_DB'),
+            charset=config.get('MYSQL_CHARSET', 'utf8'),
+            use_unicode=True,
+        )
+    return connect
+
+
+class PooledMySQL:
+    """
+    Drop-in replacement for flask_mysqldb.MySQL backed by a ConnectionPool.
+
+    `mysql.connection` checks a connection out of the pool the first time it
+    is used in an app context and returns it when the context is torn down.
+    DB_CONNECTION_WRAPPER, when set, is applied to every connection handed to
+    request code, e.g. to instrument its cursors.
+    """
+
+    def __init__(self, app=None):
+        self.pool = None
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        app.config.setdefault('DB_POOL_MIN_SIZE', 2)
+        app.config.setdefault('DB_POOL_MAX_SIZE', 10)
+        app.config.setdefault('DB_POOL_CHECKOUT_TIMEOUT', 10.0)
+        app.config.setdefault('DB_POOL_PING_INTERVAL', 0.0)
+        app.config.setdefault('DB_POOL_PREWARM', True)
+        self.pool = ConnectionPool(
+            app.config.get('DB_POOL_CONNECT') or mysql_connector(app.config),
+            min_size=app.config['DB_POOL_MIN_SIZE'],
+            max_size=app.config['DB_POOL_MAX_SIZE'],
+            checkout_timeout=app.config['DB_POOL_CHECKOUT_TIMEOUT'],
+            ping_interval=app.config['DB_POOL_PING_INTERVAL'],
+            wrap=app.config.get('DB_CONNECTION_WRAPPER'),
+        )
+        app.config.setdefault('DB_QUERY_WORKERS', app.config['DB_POOL_MAX_SIZE'])
+        self.executor = ThreadPoolExecutor(max_workers=app.config['DB_QUERY_WORKERS'],
+                                           thread_name_prefix='db-query')
+        app.teardown_appcontext(self.teardown)
+        if app.config['DB_POOL_PREWARM']:
+            try:
+                self.pool.prewarm()
+            except Exception as e:
+                # The app still starts, connections are then opened on demand
+                logger.error(f"Failed to pre-warm database pool: {str(e)}")
+
+    @property
+    def connection(self):
+        if 'pooled_mysql_connection' not in g:
+            g.pooled_mysql_connection = self.pool.acquire()
+        return self.pool.wrapped(g.pooled_mysql_connection)
+
+    def fetch_concurrently(self, queries: Dict[Any, Tuple[str, Sequence[Any], str]]) -> Dict[Any, Any]:
+        """
+        Run independent read queries in parallel, each on its own pooled connection.
+
+        Queries that cannot get an idle or new connection without waiting run
+        on the request's own connection instead, so a busy pool degrades to
+        sequential execution rather than blocking on itself.
+
+        Args:
+            queries: Dict of name -> (query, params, fetch), see fetch_query
+
+        Returns:
+            Dict of name -> query result
+        """
+        futures = {}
+        for name, spec in queries.items():
+            conn = self.pool.acquire(block=False)
+            if conn is None:
+                break
+            futures[name] = self.executor.submit(self._fetch_on, conn, self.pool.wrapped(conn), spec)
+        results = {}
+        try:
+            remaining = [name for name in queries if name not in futures]
+            if remaining:
+                cursor = self.connection.cursor()
+                for name in remaining:
+                    results[name] = fetch_query(cursor, queries[name])
+                cursor.close()
+        finally:
+            # Always join the workers so their connections are back in the pool
+            for name, future in futures.items():
+                results[name] = future.result()
+        return results
+
+    def _fetch_on(self, conn, wrapped, spec):
+        try:
+            cursor = wrapped.cursor()
+            result = fetch_query(cursor, spec)
+            cursor.close()
+            return result
+        finally:
+            self.pool.release(conn)
+
+    def teardown(self, exception) -> None:
+        conn = g.pop('pooled_mysql_connection', None)
+        if conn is not None:
+            self.pool.release(conn)
+
+
+def fetch_query(cursor, spec):
+    """
+    Execute a (query, params, fetch) spec on cursor.
+
+    fetch is 'one' for fetchone(), 'all' for fetchall() or 'dicts' for a list
+    of row dicts keyed by column name.
+    """
+    query, params, fetch = spec
+    cursor.execute(query, params)
+    if fetch == 'one':
+        return cursor.fetchone()
+    rows = cursor.fetchall()
+    if fetch == 'dicts':
+        colnames = [desc[0] for desc in cursor.description]
+        return [dict(zip(colnames, row)) for row in rows]
+    return rows
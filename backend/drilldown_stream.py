@@ -0,0 +1,185 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from flask import Response
+
+from dataset_cache import CachedDataset
+
+# Streaming formats and their response content types
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def requested_stream_format(request) -> Optional[str]:
+    """
+    Streaming format asked for by the client, or None for a buffered response.
+
+    `?stream=ndjson` (or `?stream=true`) selects newline-delimited JSON rows,
+    `?stream=json` a chunked JSON document shaped like the buffered response.
+    Without the parameter, an Accept header preferring application/x-ndjson
+    selects NDJSON.
+    """
+    stream = request.args.get('stream', '').lower()
+    if stream in ('ndjson', 'true', '1'):
+        return 'ndjson'
+    if stream == 'json':
+        return 'json'
+    if not stream and request.accept_mimetypes.best_match(
+            ['application/json', STREAM_FORMATS['ndjson']]) == STREAM_FORMATS['ndjson']:
+        return 'ndjson'
+    return None
+
+
+class ServerSideRows:
+    """
+    Unbuffered result set read in chunks from a pooled connection.
+
+    The statement is executed up front so SQL errors surface before the
+    response starts; rows are then pulled from the server with fetchmany() as
+    the client consumes the stream. The connection is held until the last row
+    is read or close() is called.
+    """
+
+    def __init__(self, pool, query: str, params: Sequence[Any], chunk_size: int):
+        self.chunk_size = chunk_size
+        self._pool = pool
+        self._conn = pool.acquire()
+        self._exhausted = False
+        try:
+            # Instrumented like request cursors, the fetches while streaming come after the request
+            self._cursor = pool.wrapped(self._conn).cursor(_server_side_cursor_class())
+            self._cursor.execute(query, tuple(params))
+        except Exception:
+            self._pool.release(self._conn, discard=True)
+            self._conn = None
+            raise
+        self.colnames: List[str] = [desc[0] for desc in self._cursor.description]
+
+    def __iter__(self) -> Iterator[Sequence[Tuple[Any, ...]]]:
+        while True:
+            rows = self._cursor.fetchmany(self.chunk_size)
+            if not rows:
+                # Hand the connection back as soon as the last row is read
+                self._exhausted = True
+                self.close()
+                return
+            yield rows
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        if self._exhausted:
+            self._cursor.close()
+            self._pool.release(conn)
+        else:
+            # The client went away mid-stream, unread rows would have to be drained first
+            self._pool.release(conn, discard=True)
+
+
+class CachedRows:
+    """Rows of a slice already held in the dataset cache, served in the same chunks."""
+
+    def __init__(self, dataset: CachedDataset, chunk_size: int):
+        self.colnames = dataset.colnames
+        self.chunk_size = chunk_size
+        self._rows = dataset.rows
+
+    def __iter__(self) -> Iterator[Sequence[Tuple[Any, ...]]]:
+        for start in range(0, len(self._rows), self.chunk_size):
+            yield self._rows[start:start + self.chunk_size]
+
+    def close(self) -> None:
+        pass
+
+
+def ndjson_body(rows, dumps: Callable[[Any], str]) -> Iterator[str]:
+    """One JSON object per row, one line per object."""
+    colnames = rows.colnames
+    for chunk in rows:
+        yield ''.join([dumps(dict(zip(colnames, row))) + '\n' for row in chunk])
+
+
+def json_body(rows, dumps: Callable[[Any], str], separate: bool,
+              filters: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """
+    The buffered drilldown document, written out chunk by chunk.
+
+    Keys are emitted in sorted order like jsonify does. For the separate view
+    rows must arrive ordered by period, which both drilldown queries guarantee.
+    """
+    colnames = rows.colnames
+    if not separate:
+        yield '{"employees":['
+        sep = ''
+        for chunk in rows:
+            yield sep + ','.join([dumps(dict(zip(colnames, row))) for row in chunk])
+            sep = ','
+        yield ']}\n'
+        return
+
+    from_index, to_index = colnames.index('period_from'), colnames.index('period_to')
+    yield '{"filters":' + dumps(filters or {}) + ',"periods":['
+    current = None
+    for chunk in rows:
+        parts = []
+        for row in chunk:
+            period_key = (row[from_index], row[to_index])
+            if period_key != current:
+                if current is not None:
+                    parts.append(_close_period(current, dumps) + ',')
+                parts.append('{"employees":[')
+                current = period_key
+            else:
+                parts.append(',')
+            parts.append(dumps(dict(zip(colnames, row))))
+        yield ''.join(parts)
+    if current is not None:
+        yield _close_period(current, dumps)
+    yield ']}\n'
+
+
+def drilldown_response(rows, stream_format: str, dumps: Callable[[Any], str], separate: bool,
+                       filters: Optional[Dict[str, Any]] = None) -> Response:
+    """
+    Build a streamed drilldown response over rows.
+
+    Args:
+        rows: ServerSideRows or CachedRows
+        stream_format: 'ndjson' or 'json', see requested_stream_format
+        dumps: Serializer for a single value, e.g. the app's JSON provider
+        separate: Group rows per period like the buffered separate view
+        filters: Filter display names, only used by the separate JSON document
+
+    Returns:
+        Response whose body is generated while rows are read
+    """
+    if stream_format == 'ndjson':
+        body = ndjson_body(rows, dumps)
+    else:
+        body = json_body(rows, dumps, separate, filters)
+    return streamed_response(rows, body, STREAM_FORMATS[stream_format])
+
+
+def streamed_response(rows, body, mimetype: str) -> Response:
+    """Wrap a body generated from rows so the rows are closed with the response."""
+    response = Response(body, mimetype=mimetype)
+    # Release the connection even if the client disconnects before the body is consumed
+    response.call_on_close(rows.close)
+    # Ask reverse proxies to pass chunks through instead of buffering the whole body
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _close_period(period_key, dumps) -> str:
+    return '],"period":' + dumps({'from': str(period_key[0]), 'to': str(period_key[1])}) + '}'
+
+
+def _server_side_cursor_class():
+    try:
+        import MySQLdb.cursors
+    except ImportError:
+        # Local stand-in connections stream with their default cursor
+        return None
+    return MySQLdb.cursors.SSCursor
@@ -0,0 +1,82 @@
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+# Optional native encoder, the default provider is used when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    DefaultJSONProvider with the encoding done by orjson.
+
+    Output has the same values as the default provider: keys sorted, Decimal
+    and UUID as strings, dates as HTTP dates through the same default(), and
+    compact unless the app is in debug mode. Non-ASCII text is written as
+    UTF-8 instead of \\u escapes. Calls with json.dumps options orjson has no
+    equivalent for, and values orjson cannot encode (e.g. integers beyond 64
+    bits), fall back to the default provider.
+    """
+
+    @staticmethod
+    def default(o: Any) -> Any:
+        if type(o) is Decimal:
+            return str(o)
+        if isinstance(o, date):
+            # Drilldowns repeat the same few period dates on every row
+            return _http_date(o)
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        option = self._option(kwargs)
+        if option is not None:
+            try:
+                return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+            except orjson.JSONEncodeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            dump_args: Dict[str, Any] = {'indent': 2}
+        else:
+            dump_args = {'separators': (',', ':')}
+        try:
+            body = orjson.dumps(obj, default=self.default, option=self._option(dump_args)) + b'\n'
+        except orjson.JSONEncodeError:
+            body = f"{super().dumps(obj, **dump_args)}\n".encode('utf-8')
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+    def _option(self, kwargs: Dict[str, Any]) -> Optional[int]:
+        """orjson options matching json.dumps kwargs, or None if they cannot be matched."""
+        # Dates go through default() so they are formatted like the default provider does
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs == {'separators': (',', ':')}:
+            return option
+        if kwargs == {'indent': 2}:
+            return option | orjson.OPT_INDENT_2
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _http_date(value: date) -> str:
+    return http_date(value)
+
+
+def make_json_provider(app, name: str = 'orjson') -> DefaultJSONProvider:
+    """
+    JSON provider for app by name: 'orjson' when it is installed, otherwise 'default'.
+    """
+    if name == 'orjson' and orjson is not None:
+        return OrjsonProvider(app)
+    return DefaultJSONProvider(app)
@@ -0,0 +1,347 @@
+"""
+SQLite stand-in for the production MySQL database.
+
+Connections behave like MySQLdb connections as far as the backend uses them:
+queries are written in MySQL dialect with %s placeholders and are translated
+on the fly, and AES_ENCRYPT/AES_DECRYPT follow MySQL's default
+block_encryption_mode (aes-128-ecb, key folded to 16 bytes, PKCS7 padding),
+so data encrypted here decrypts on MySQL with the same key and vice versa.
+
+Build a database with synthetic_data.py, then start the app with
+DB_BACKEND=sqlite and SQLITE_PATH pointing at it.
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from functools import lru_cache
+from typing import Any, Callable, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+# AES for the stand-in only, production decrypts inside MySQL
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None  # type: ignore[misc, assignment]
+
+# Leading number MySQL reads when casting a string to DECIMAL
+_NUMBER_PREFIX = re.compile(r'\s*[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?')
+_CAST = re.compile(r'\bCAST\s*\(', re.IGNORECASE)
+_AS = re.compile(r'\s+AS\s+', re.IGNORECASE)
+_ALIAS = re.compile(r'\s+AS\s+`?(\w+)`?', re.IGNORECASE)
+_EXPLAIN_JSON = re.compile(r'^\s*EXPLAIN\s+FORMAT\s*=\s*JSON\s+', re.IGNORECASE)
+
+# Statements executed on all local connections, read by the benchmarks
+_statements = 0
+_statements_lock = threading.Lock()
+
+
+def mysql_aes_key(key) -> bytes:
+    """Fold a key of any length into 16 bytes the way MySQL's AES functions do."""
+    key_bytes = key if isinstance(key, bytes) else str(key).encode('utf-8')
+    folded = bytearray(16)
+    for i, byte in enumerate(key_bytes):
+        folded[i % 16] ^= byte
+    return bytes(folded)
+
+
+@lru_cache(maxsize=16)
+def _cipher(key) -> 'Cipher':
+    if Cipher is None:
+        raise RuntimeError('The local database needs the cryptography package: pip install cryptography')
+    return Cipher(algorithms.AES(mysql_aes_key(key)), modes.ECB())
+
+
+def _as_bytes(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    return str(value).encode('utf-8')
+
+
+def aes_encrypt(value, key) -> Optional[bytes]:
+    """MySQL AES_ENCRYPT(value, key)."""
+    if value is None or key is None:
+        return None
+    data = _as_bytes(value)
+    pad = 16 - len(data) % 16
+    encryptor = _cipher(key).encryptor()
+    return encryptor.update(data + bytes([pad]) * pad) + encryptor.finalize()
+
+
+def aes_decrypt(value, key) -> Optional[bytes]:
+    """MySQL AES_DECRYPT(value, key), NULL for input that is not valid ciphertext for key."""
+    if value is None or key is None:
+        return None
+    data = _as_bytes(value)
+    if not data or len(data) % 16:
+        return None
+    decryptor = _cipher(key).decryptor()
+    plain = decryptor.update(data) + decryptor.finalize()
+    pad = plain[-1]
+    if not 1 <= pad <= 16 or plain[-pad:] != bytes([pad]) * pad:
+        return None
+    return plain[:-pad]
+
+
+def mysql_decimal(value, scale: int) -> Optional[str]:
+    """CAST(value AS DECIMAL(p, scale)), as text so the cursor can hand out Decimal."""
+    if value is None:
+        return None
+    if isinstance(value, (bytes, memoryview)):
+        value = _as_bytes(value).decode('utf-8', 'replace')
+    match = _NUMBER_PREFIX.match(str(value))
+    try:
+        number = Decimal(match.group(0).strip()) if match else Decimal(0)
+    except InvalidOperation:
+        number = Decimal(0)
+    return str(number.quantize(Decimal(1).scaleb(-scale), rounding=ROUND_HALF_UP))
+
+
+def mysql_char(value) -> Optional[str]:
+    """CAST(value AS CHAR ...)."""
+    if value is None:
+        return None
+    if isinstance(value, (bytes, memoryview)):
+        return _as_bytes(value).decode('utf-8', 'replace')
+    return str(value)
+
+
+@lru_cache(maxsize=1024)
+def translate(query: str, has_params: bool = True) -> Tuple[str, FrozenSet[str]]:
+    """
+    Translate a MySQL query as the backend writes it to SQLite.
+
+    %s placeholders become ?, CAST(... AS DECIMAL(p,s)) and CAST(... AS CHAR ...)
+    become calls to the registered MYSQL_DECIMAL and MYSQL_CHAR functions.
+    EXPLAIN FORMAT=JSON becomes EXPLAIN QUERY PLAN, one row per plan step.
+
+    Returns:
+        Tuple of (SQLite query, names of result columns holding decimals)
+    """
+    decimal_columns: Set[str] = set()
+    sql = _EXPLAIN_JSON.sub('EXPLAIN QUERY PLAN ', query)
+    sql = _rewrite_casts(sql, decimal_columns)
+    if has_params:
+        sql = _placeholders(sql)
+    return sql, frozenset(decimal_columns)
+
+
+def _skip_string(sql: str, i: int) -> int:
+    """Index just past the quoted string starting at sql[i]."""
+    quote = sql[i]
+    i += 1
+    while i < len(sql):
+        if sql[i] == '\\':
+            i += 2
+            continue
+        if sql[i] == quote:
+            if i + 1 < len(sql) and sql[i + 1] == quote:
+                i += 2
+                continue
+            return i + 1
+        i += 1
+    return i
+
+
+def _closing_paren(sql: str, i: int) -> int:
+    """Index of the parenthesis closing the one at sql[i]."""
+    depth = 0
+    while i < len(sql):
+        char = sql[i]
+        if char in '\'"':
+            i = _skip_string(sql, i)
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    raise ValueError('Unbalanced parentheses in query')
+
+
+def _split_cast(inner: str) -> Tuple[str, str]:
+    """Split the inside of CAST(...) into (expression, type) at the last top-level AS."""
+    depth = 0
+    split = None
+    i = 0
+    while i < len(inner):
+        char = inner[i]
+        if char in '\'"':
+            i = _skip_string(inner, i)
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0:
+            match = _AS.match(inner, i)
+            if match:
+                split = match
+        i += 1
+    if split is None:
+        raise ValueError(f'Cannot parse CAST({inner})')
+    return inner[:split.start()], inner[split.end():]
+
+
+def _rewrite_casts(sql: str, decimal_columns: Set[str]) -> str:
+    parts: List[str] = []
+    pos = 0
+    while True:
+        match = _CAST.search(sql, pos)
+        if match is None:
+            break
+        open_paren = match.end() - 1
+        close_paren = _closing_paren(sql, open_paren)
+        expression, type_name = _split_cast(sql[open_paren + 1:close_paren])
+        expression = _rewrite_casts(expression, decimal_columns)
+        upper_type = type_name.strip().upper()
+        if upper_type.startswith('DECIMAL'):
+            digits = re.findall(r'\d+', upper_type)
+            scale = int(digits[1]) if len(digits) > 1 else 0
+            replacement = f'MYSQL_DECIMAL({expression}, {scale})'
+            alias = _ALIAS.match(sql, close_paren + 1)
+            decimal_columns.add(alias.group(1) if alias else replacement)
+        elif upper_type.startswith('CHAR'):
+            replacement = f'MYSQL_CHAR({expression})'
+        else:
+            replacement = f'CAST({expression} AS {type_name})'
+        parts.append(sql[pos:match.start()])
+        parts.append(replacement)
+        pos = close_paren + 1
+    parts.append(sql[pos:])
+    return ''.join(parts)
+
+
+def _placeholders(sql: str) -> str:
+    """MySQLdb format placeholders to qmark, outside string literals."""
+    parts: List[str] = []
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+        if char in '\'"':
+            end = _skip_string(sql, i)
+            parts.append(sql[i:end])
+            i = end
+            continue
+        if char == '%' and sql[i + 1:i + 2] in ('s', '%'):
+            parts.append('?' if sql[i + 1] == 's' else '%')
+            i += 2
+            continue
+        parts.append(char)
+        i += 1
+    return ''.join(parts)
+
+
+def register_types() -> None:
+    """sqlite3 adapters and converters for the types MySQLdb sends and returns."""
+    # Parameters are passed the way MySQLdb formats them
+    sqlite3.register_adapter(Decimal, str)
+    sqlite3.register_adapter(date, date.isoformat)
+    sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+    # Declared column types come back as the Python types MySQLdb returns
+    sqlite3.register_converter('DATE', lambda raw: date.fromisoformat(raw.decode()))
+    sqlite3.register_converter('DATETIME', lambda raw: datetime.fromisoformat(raw.decode()))
+    sqlite3.register_converter('TIMESTAMP', lambda raw: datetime.fromisoformat(raw.decode()))
+    sqlite3.register_converter('DECIMAL', lambda raw: Decimal(raw.decode()))
+
+
+class LocalCursor:
+    """MySQLdb-style cursor over a sqlite3 cursor."""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+        self._decimal_positions: List[int] = []
+
+    def execute(self, query: str, params: Optional[Sequence[Any]] = None) -> int:
+        global _statements
+        sql, decimal_columns = translate(query, params is not None)
+        with _statements_lock:
+            _statements += 1
+        self._cursor.execute(sql, tuple(params) if params is not None else ())
+        description = self._cursor.description or ()
+        self._decimal_positions = [i for i, desc in enumerate(description) if desc[0] in decimal_columns]
+        return self._cursor.rowcount
+
+    def fetchone(self) -> Optional[Tuple[Any, ...]]:
+        row = self._cursor.fetchone()
+        return None if row is None else self._convert(row)
+
+    def fetchmany(self, size: int) -> List[Tuple[Any, ...]]:
+        return [self._convert(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self) -> List[Tuple[Any, ...]]:
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self) -> None:
+        self._cursor.close()
+
+    def _convert(self, row) -> Tuple[Any, ...]:
+        if not self._decimal_positions:
+            return row
+        row = list(row)
+        for i in self._decimal_positions:
+            if isinstance(row[i], str):
+                row[i] = Decimal(row[i])
+        return tuple(row)
+
+
+class LocalConnection:
+    """MySQLdb-style connection to a SQLite database file."""
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        self._db.create_function('AES_ENCRYPT', 2, aes_encrypt, deterministic=True)
+        self._db.create_function('AES_DECRYPT', 2, aes_decrypt, deterministic=True)
+        self._db.create_function('MYSQL_DECIMAL', 2, mysql_decimal, deterministic=True)
+        self._db.create_function('MYSQL_CHAR', 1, mysql_char, deterministic=True)
+        self._db.execute('PRAGMA cache_size = -65536')
+
+    def cursor(self, cursor_class=None) -> LocalCursor:
+        # Every SQLite cursor steps through its result lazily, like an SSCursor
+        return LocalCursor(self._db.cursor())
+
+    def ping(self) -> None:
+        self._db.execute('SELECT 1')
+
+    def commit(self) -> None:
+        self._db.commit()
+
+    def rollback(self) -> None:
+        self._db.rollback()
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def statements_executed() -> int:
+    """Number of statements executed on local connections since the process started."""
+    with _statements_lock:
+        return _statements
+
+
+def sqlite_connector(path: str) -> Callable[[], LocalConnection]:
+    """Connection factory for PooledMySQL's DB_POOL_CONNECT."""
+    register_types()
+
+    def connect():
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'{path} does not exist, create it with synthetic_data.py')
+        return LocalConnection(path)
+    return connect
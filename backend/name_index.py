@@ -0,0 +1,215 @@
+import threading
+from bisect import bisect_left
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+
+@dataclass
+class EmployeeName:
+    """Decrypted name and settings labels for one employee. NULL names are kept as ''."""
+    emp_id: int
+    last_name: str
+    first_name: str
+    location_office: str
+    department_name: str
+    rank_name: str
+
+    def sort_key(self):
+        # Mirrors ORDER BY last_name, first_name under a case-insensitive collation
+        return (self.last_name.casefold(), self.first_name.casefold())
+
+    def to_dict(self) -> Dict:
+        return {
+            'emp_id': self.emp_id,
+            'last_name': self.last_name if self.last_name else 'N/A',
+            'first_name': self.first_name if self.first_name else 'N/A',
+            'location_office': self.location_office,
+            'department_name': self.department_name,
+            'rank_name': self.rank_name,
+        }
+
+
+def name_grams(text: str) -> Set[str]:
+    """Bigrams and trigrams of a casefolded name - any search term of 2+ characters contains one."""
+    grams = set()
+    for size in (2, 3):
+        for i in range(len(text) - size + 1):
+            grams.add(text[i:i + size])
+    return grams
+
+
+class CompanyNameIndex:
+    """
+    Substring index over the decrypted first and last names of one company.
+
+    Records are kept in name order and every bigram/trigram maps to a sorted
+    posting list of record positions, so a lookup scans the shortest posting
+    list in order and can stop as soon as it has enough matches. Records added
+    incrementally are appended after the sorted block and merged at query time.
+    """
+
+    def __init__(self, records: Iterable[EmployeeName], contexts: Dict[str, Set[int]]):
+        self.records: List[EmployeeName] = []
+        self.search_keys: List[tuple] = []
+        self.postings: Dict[str, List[int]] = {}
+        self.emp_ids: Set[int] = set()
+        self.contexts = contexts
+        self.high_water_emp_id = 0
+        self.add(sorted(records, key=EmployeeName.sort_key))
+        self.sorted_count = len(self.records)
+        self.built_at = self.refreshed_at = time.monotonic()
+
+    def add(self, records: Iterable[EmployeeName]) -> None:
+        for record in records:
+            if record.emp_id in self.emp_ids:
+                continue
+            position = len(self.records)
+            last_key, first_key = record.last_name.casefold(), record.first_name.casefold()
+            self.records.append(record)
+            self.search_keys.append((last_key, first_key))
+            self.emp_ids.add(record.emp_id)
+            self.high_water_emp_id = max(self.high_water_emp_id, record.emp_id)
+            for gram in name_grams(last_key) | name_grams(first_key):
+                self.postings.setdefault(gram, []).append(position)
+
+    def search(self, term: str, context: str = 'all', limit: Optional[int] = None) -> List[EmployeeName]:
+        """
+        Employees whose first or last name contains term, in name order.
+
+        Args:
+            term: Search term, matched case-insensitively as a substring
+            context: 'shifts', 'payslip', or 'all' - restricts to employees with rows in that module
+            limit: Maximum number of results, or None for every match
+        """
+        needle = term.casefold()
+        candidates: Sequence[int]
+        if len(needle) < 2:
+            # Too short for the gram index, scan every record like LIKE '%x%' would
+            candidates = range(len(self.records))
+        elif len(needle) == 2:
+            candidates = self.postings.get(needle, [])
+        else:
+            trigrams = {needle[i:i + 3] for i in range(len(needle) - 2)}
+            candidates = min((self.postings.get(gram, []) for gram in trigrams), key=len)
+        allowed = self.contexts.get(context)
+
+        # Posting lists are in position order, so the sorted block comes before the tail
+        tail_start = bisect_left(candidates, self.sorted_count)
+        matches = self._scan(candidates[:tail_start], needle, allowed, limit)
+        tail_matches = self._scan(candidates[tail_start:], needle, allowed, None)
+        if tail_matches:
+            matches = sorted(matches + tail_matches, key=EmployeeName.sort_key)
+        return matches if limit is None else matches[:limit]
+
+    def _scan(self, positions, needle, allowed, limit) -> List[EmployeeName]:
+        matches: List[EmployeeName] = []
+        for position in positions:
+            if limit is not None and len(matches) >= limit:
+                break
+            last_key, first_key = self.search_keys[position]
+            if needle not in last_key and needle not in first_key:
+                continue
+            record = self.records[position]
+            if allowed is not None and record.emp_id not in allowed:
+                continue
+            matches.append(record)
+        return matches
+
+
+class NameIndex:
+    """
+    Per-company name indexes built from one decrypt pass over the employee table.
+
+    Every refresh_seconds only employees with an emp_id above the indexed
+    high-water mark are decrypted and added, and the shifts/payslip context
+    sets are reloaded. Every rebuild_seconds the index is rebuilt from scratch
+    so renamed employees and changed settings labels are picked up.
+
+    At most max_companies indexes are kept, the least recently searched
+    company's is dropped first. Memory is roughly max_companies times the
+    largest company's names, about 1 KB per employee.
+    """
+
+    def __init__(self, encrypt_key, refresh_seconds: float, rebuild_seconds: float, max_companies: int = 64):
+        self.encrypt_key = encrypt_key
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.max_companies = max_companies
+        self._indexes: "OrderedDict[int, CompanyNameIndex]" = OrderedDict()
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def search(self, cursor, company_id, term, context='all', limit=None) -> List[EmployeeName]:
+        company_id = int(company_id)
+        with self._company_lock(company_id):
+            index = self._get(cursor, company_id)
+            return index.search(term, context, limit)
+
+    def invalidate(self, company_id=None) -> None:
+        with self._locks_guard:
+            if company_id is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(int(company_id), None)
+
+    def _company_lock(self, company_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(company_id, threading.Lock())
+
+    def _get(self, cursor, company_id: int) -> CompanyNameIndex:
+        with self._locks_guard:
+            index = self._indexes.get(company_id)
+            if index is not None:
+                self._indexes.move_to_end(company_id)
+        now = time.monotonic()
+        if index is None or now - index.built_at > self.rebuild_seconds:
+            index = CompanyNameIndex(self._fetch_names(cursor, company_id), self._fetch_contexts(cursor, company_id))
+            with self._locks_guard:
+                self._indexes[company_id] = index
+                self._indexes.move_to_end(company_id)
+                while len(self._indexes) > self.max_companies:
+                    self._indexes.popitem(last=False)
+        elif now - index.refreshed_at > self.refresh_seconds:
+            index.add(sorted(self._fetch_names(cursor, company_id, index.high_water_emp_id), key=EmployeeName.sort_key))
+            index.contexts = self._fetch_contexts(cursor, company_id)
+            index.refreshed_at = now
+        return index
+
+    def _fetch_names(self, cursor, company_id: int, after_emp_id: int = 0) -> List[EmployeeName]:
+        query = """
+            SELECT
+                e.emp_id,
+                CAST(AES_DECRYPT(e.last_name, %s) AS CHAR(150) CHARACTER SET utf8) AS last_name,
+                CAST(AES_DECRYPT(e.first_name, %s) AS CHAR(150) CHARACTER SET utf8) AS first_name,
+                COALESCE(lao.name, 'N/A') AS location_office,
+                COALESCE(d.department_name, 'N/A') AS department_name,
+                COALESCE(rk.rank_name, 'N/A') AS rank_name
+            FROM employee e
+            LEFT JOIN employee_payroll_information epi ON e.emp_id = epi.emp_id AND epi.company_id = %s
+            LEFT JOIN location_and_offices lao ON epi.location_and_offices_id = lao.location_and_offices_id
+            LEFT JOIN department d ON epi.department_id = d.dept_id AND d.company_id = %s
+            LEFT JOIN `rank` rk ON epi.rank_id = rk.rank_id AND rk.company_id = %s
+            WHERE e.company_id = %s AND e.emp_id > %s
+        """
+        cursor.execute(query, (self.encrypt_key, self.encrypt_key, company_id, company_id, company_id,
+                               company_id, after_emp_id))
+        return [
+            EmployeeName(
+                emp_id=row[0],
+                last_name=row[1] or '',
+                first_name=row[2] or '',
+                location_office=row[3] if row[3] else 'N/A',
+                department_name=row[4] if row[4] else 'N/A',
+                rank_name=row[5] if row[5] else 'N/A',
+            )
+            for row in cursor.fetchall()
+        ]
+
+    def _fetch_contexts(self, cursor, company_id: int) -> Dict[str, Set[int]]:
+        cursor.execute("SELECT DISTINCT emp_id FROM employee_shifts_schedule WHERE company_id = %s", (company_id,))
+        shifts = {row[0] for row in cursor.fetchall()}
+        cursor.execute("SELECT DISTINCT emp_id FROM payroll_payslip WHERE company_id = %s", (company_id,))
+        payslip = {row[0] for row in cursor.fetchall()}
+        return {'shifts': shifts, 'payslip': payslip}
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Monthly RANGE COLUMNS partitioning of payroll_payslip and employee_time_in.
+
+Every analytics and deep dive query filters by company and a period or
+date range. With the tables partitioned by month on period_from / date,
+MySQL prunes the months outside the range, so a date-bounded scan reads
+the same few partitions however much history piles up.
+
+    python partition_manager.py plan                 # key check and the ALTER, runs nothing
+    python partition_manager.py apply                # partition the tables, then verify
+    python partition_manager.py roll                 # add the coming months' partitions
+    python partition_manager.py roll --dry-run
+    python partition_manager.py verify               # EXPLAIN every query shape, partitions read
+
+apply rebuilds each table (a copying ALTER, writes wait until it is done),
+so run it in a maintenance window or hand the printed definition to an
+online schema change tool. Partitions are named pYYYYMM, with pmax
+catching anything later. roll keeps --months-ahead months (default 3)
+past the current one and is meant to run daily from cron:
+
+    15 3 * * * cd /path/to/backend && python partition_manager.py roll
+
+MySQL only: partitioned tables cannot have foreign keys, and every primary
+or unique key must include the partition column. plan reports both; a
+primary key is extended with the column, any other unique key blocks the
+table. Queries only prune on their lower bound (period_from >= ...), the
+upper bound is on period_to, so newer partitions are still opened.
+"""
+import argparse
+import json
+import sys
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from create_indexes import QUERY_SHAPES, connect, sample_values
+
+# Column types RANGE COLUMNS accepts that hold a date
+DATE_TYPES = ('date', 'datetime', 'char', 'varchar')
+
+
+@dataclass(frozen=True)
+class PartitionScheme:
+    """
+    Monthly partitioning of one table.
+
+    pruned_shapes names the create_indexes.QUERY_SHAPES bounded on column,
+    which verify expects to read only some of the partitions.
+    """
+    table: str
+    column: str
+    pruned_shapes: Tuple[str, ...]
+
+
+SCHEMES = [
+    PartitionScheme('payroll_payslip', 'period_from', (
+        'analytics', 'analytics_filtered', 'analytics_employee', 'analytics_payroll_group',
+        'analytics_prefetch', 'data_version',
+    )),
+    PartitionScheme('employee_time_in', 'date', ('deepdive_timekeeping',)),
+]
+
+
+def month_start(value) -> date:
+    if isinstance(value, str):
+        value = datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months_between(first: date, last: date) -> List[date]:
+    """Month starts from first's month to last's month, both included."""
+    months, month = [], month_start(first)
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_definition(month: date) -> str:
+    """The partition holding month (and, for the first one, everything before it)."""
+    return f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d}')"
+
+
+MAX_PARTITION = "PARTITION pmax VALUES LESS THAN (MAXVALUE)"
+
+
+@dataclass
+class TableState:
+    """A table's current partitions: (name, upper bound or None for MAXVALUE, approximate rows)."""
+    table: str
+    expression: Optional[str] = None
+    partitions: List[Tuple[str, Optional[date], int]] = field(default_factory=list)
+
+    @property
+    def partitioned(self) -> bool:
+        return bool(self.partitions)
+
+    def last_bound(self) -> Optional[date]:
+        bounds = [bound for _, bound, _ in self.partitions if bound is not None]
+        return max(bounds) if bounds else None
+
+
+def read_state(cursor, table: str) -> TableState:
+    cursor.execute("""
+        SELECT partition_name, partition_method, partition_expression, partition_description, table_rows
+        FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = %s
+        ORDER BY partition_ordinal_position
+    """, (table,))
+    state = TableState(table)
+    for name, method, expression, description, rows in cursor.fetchall():
+        if name is None:
+            # An unpartitioned table has one row without a partition
+            continue
+        if method != 'RANGE COLUMNS':
+            raise ValueError(f"{table} is already partitioned by {method}({expression}), not managed here")
+        state.expression = expression
+        bound = None if description == 'MAXVALUE' else month_start(description.strip("'"))
+        state.partitions.append((name, bound, int(rows or 0)))
+    return state
+
+
+@dataclass
+class KeyCheck:
+    """What partitioning a table needs done to its keys, and what rules it out."""
+    clauses: List[str] = field(default_factory=list)
+    notes: List[str] = field(default_factory=list)
+    blockers: List[str] = field(default_factory=list)
+
+
+def check_keys(cursor, scheme: PartitionScheme) -> KeyCheck:
+    """
+    Check the rules MySQL puts on partitioned tables.
+
+    The partition column has to be part of every primary and unique key.
+    The primary key is extended with it (the id alone stays unique, so this
+    changes nothing it enforces), other unique keys are blockers since
+    extending them would. Foreign keys in either direction and a column
+    type RANGE COLUMNS cannot compare as a date are blockers too.
+    """
+    check = KeyCheck()
+    cursor.execute("""
+        SELECT data_type, is_nullable FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (scheme.table, scheme.column))
+    row = cursor.fetchone()
+    if row is None:
+        check.blockers.append(f"{scheme.table}.{scheme.column} does not exist")
+        return check
+    data_type, nullable = row
+    if data_type.lower() not in DATE_TYPES:
+        check.blockers.append(f"{scheme.table}.{scheme.column} is {data_type}, RANGE COLUMNS needs a date or string")
+
+    cursor.execute("""
+        SELECT index_name, column_name FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND non_unique = 0
+        ORDER BY index_name, seq_in_index
+    """, (scheme.table,))
+    unique: Dict[str, List[str]] = {}
+    for name, column in cursor.fetchall():
+        unique.setdefault(name, []).append(column)
+    for name, columns in unique.items():
+        if scheme.column in columns:
+            continue
+        if name == 'PRIMARY':
+            check.clauses.append(f"DROP PRIMARY KEY, ADD PRIMARY KEY ({', '.join(columns + [scheme.column])})")
+            if nullable == 'YES':
+                cursor.execute(f"SELECT COUNT(*) FROM {scheme.table} WHERE {scheme.column} IS NULL")
+                nulls = cursor.fetchone()[0]
+                if nulls:
+                    check.blockers.append(f"{nulls} rows have no {scheme.column}, a primary key column cannot be NULL")
+                else:
+                    check.notes.append(f"{scheme.column} becomes NOT NULL as part of the primary key")
+        else:
+            check.blockers.append(f"unique key {name} ({', '.join(columns)}) does not include {scheme.column}")
+
+    cursor.execute("""
+        SELECT constraint_name, table_name, referenced_table_name FROM information_schema.referential_constraints
+        WHERE constraint_schema = DATABASE() AND (table_name = %s OR referenced_table_name = %s)
+    """, (scheme.table, scheme.table))
+    for name, table, referenced in cursor.fetchall():
+        check.blockers.append(f"foreign key {name} ({table} -> {referenced}), partitioned tables cannot have any")
+    return check
+
+
+def plan_partitioning(cursor, scheme: PartitionScheme, months_ahead: int, start: Optional[date] = None,
+                      today: Optional[date] = None) -> Tuple[Optional[str], KeyCheck]:
+    """
+    The ALTER partitioning an unpartitioned table, one partition per month.
+
+    Args:
+        start: First month to give its own partition, the month of the
+            oldest row by default. Older rows share the first partition.
+        today: Reference date for months_ahead, today by default
+
+    Returns:
+        Tuple of (statement or None when the table is empty, key check)
+    """
+    check = check_keys(cursor, scheme)
+    if start is None:
+        cursor.execute(f"SELECT MIN({scheme.column}), MAX({scheme.column}) FROM {scheme.table}")
+        oldest, newest = cursor.fetchone()
+        if oldest is None:
+            return None, check
+        start = month_start(oldest)
+        last = max(month_start(newest), month_start(today or date.today()))
+    else:
+        last = month_start(today or date.today())
+    months = months_between(start, add_months(last, months_ahead))
+    partitions = ',\n    '.join([partition_definition(month) for month in months] + [MAX_PARTITION])
+    statement = f"ALTER TABLE {scheme.table}"
+    if check.clauses:
+        statement += ' ' + ', '.join(check.clauses)
+    statement += f"\nPARTITION BY RANGE COLUMNS({scheme.column}) (\n    {partitions}\n)"
+    return statement, check
+
+
+def plan_roll(state: TableState, months_ahead: int, today: Optional[date] = None) -> Tuple[Optional[str], List[str]]:
+    """
+    The ALTER adding the partitions a partitioned table lacks up to months_ahead past today.
+
+    New months are split off pmax with REORGANIZE PARTITION, which only has
+    rows to move when something was written past the last month boundary.
+
+    Returns:
+        Tuple of (statement or None when nothing is missing, notes)
+    """
+    last_bound = state.last_bound()
+    target = add_months(month_start(today or date.today()), months_ahead)
+    if last_bound is None or last_bound > target:
+        return None, []
+    months = months_between(last_bound, target)
+    definitions = [partition_definition(month) for month in months]
+    notes = []
+    max_partitions = [(name, rows) for name, bound, rows in state.partitions if bound is None]
+    if max_partitions:
+        name, rows = max_partitions[0]
+        if rows:
+            notes.append(f"{name} holds about {rows} rows, they are moved into the new partitions")
+        definitions.append(MAX_PARTITION.replace('pmax', name))
+        statement = f"ALTER TABLE {state.table} REORGANIZE PARTITION {name} INTO"
+    else:
+        statement = f"ALTER TABLE {state.table} ADD PARTITION"
+    return statement + " (\n    " + ',\n    '.join(definitions) + "\n)", notes
+
+
+def partition_accesses(plan: Any) -> List[Tuple[str, List[str]]]:
+    """(table alias, partitions read) of every partitioned table in an EXPLAIN FORMAT=JSON plan."""
+    found: List[Tuple[str, List[str]]] = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if 'table_name' in node and 'partitions' in node:
+                found.append((node['table_name'], list(node['partitions'])))
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return found
+
+
+def verify_pruning(cursor, states: Dict[str, TableState], samples: Dict[str, Any]) -> bool:
+    """
+    EXPLAIN every query shape and report the partitions it reads.
+
+    Returns:
+        True when every shape bounded on a partition column reads fewer than all partitions
+    """
+    expected = {name: scheme for scheme in SCHEMES for name in scheme.pruned_shapes}
+    if not any(state.partitioned for state in states.values()):
+        print("No table is partitioned yet")
+        return True
+    ok = True
+    for shape in QUERY_SHAPES:
+        cursor.execute(f"EXPLAIN FORMAT=JSON {shape.query.sql}", shape.query.params(samples))
+        accesses = partition_accesses(json.loads(cursor.fetchone()[0]))
+        if not accesses:
+            continue
+        for table, partitions in accesses:
+            read = f"{table} reads {len(partitions)} partitions ({', '.join(partitions[:3])}{', ...' if len(partitions) > 3 else ''})"
+            scheme = expected.get(shape.name)
+            if scheme is None:
+                print(f"⏭️  {shape.name}: {read}, not bounded on a partition column")
+            elif states[scheme.table].partitioned and len(partitions) >= len(states[scheme.table].partitions):
+                print(f"❌ {shape.name}: {table} reads all {len(partitions)} partitions, no pruning")
+                ok = False
+            else:
+                print(f"✅ {shape.name}: {read}")
+    return ok
+
+
+def manage_partitions(command: str, tables: List[str], dry_run: bool = False, months_ahead: int = 3,
+                      start: Optional[date] = None, company_id=None) -> bool:
+    """
+    Run one command (plan, apply, roll or verify) on the given tables.
+
+    Returns:
+        True when nothing failed and no blocker or missing pruning was found
+    """
+    conn, backend = connect()
+    if backend != 'mysql':
+        print("❌ Partitioning needs MySQL, the SQLite stand-in has no partitions")
+        conn.close()
+        return False
+    schemes = [scheme for scheme in SCHEMES if scheme.table in tables]
+    ok = True
+    try:
+        cursor = conn.cursor()
+        states = {scheme.table: read_state(cursor, scheme.table) for scheme in schemes}
+
+        if command in ('plan', 'apply'):
+            for scheme in schemes:
+                state = states[scheme.table]
+                if state.partitioned:
+                    print(f"⏭️  {scheme.table} is already partitioned by {state.expression} "
+                          f"({len(state.partitions)} partitions), use roll")
+                    continue
+                statement, check = plan_partitioning(cursor, scheme, months_ahead, start)
+                for note in check.notes:
+                    print(f"   {scheme.table}: {note}")
+                if check.blockers:
+                    for blocker in check.blockers:
+                        print(f"❌ {scheme.table}: {blocker}")
+                    ok = False
+                    continue
+                if statement is None:
+                    print(f"⏭️  {scheme.table} is empty, nothing to partition on")
+                    continue
+                print(f"{scheme.table}:\n{statement};")
+                if command == 'apply' and not dry_run:
+                    print(f"Partitioning {scheme.table}, writes to it wait until the table is rebuilt...")
+                    cursor.execute(statement)
+                    states[scheme.table] = read_state(cursor, scheme.table)
+                    print(f"✅ {scheme.table}: {len(states[scheme.table].partitions)} partitions")
+
+        if command == 'roll':
+            for scheme in schemes:
+                state = states[scheme.table]
+                if not state.partitioned:
+                    print(f"⏭️  {scheme.table} is not partitioned, run apply first")
+                    continue
+                statement, notes = plan_roll(state, months_ahead)
+                if statement is None:
+                    print(f"✅ {scheme.table}: partitions up to {state.last_bound()} already exist")
+                    continue
+                for note in notes:
+                    print(f"   {scheme.table}: {note}")
+                print(f"{statement};")
+                if not dry_run:
+                    cursor.execute(statement)
+                    states[scheme.table] = read_state(cursor, scheme.table)
+                    print(f"✅ {scheme.table}: partitions up to {states[scheme.table].last_bound()}")
+
+        if command == 'verify' or (command == 'apply' and not dry_run):
+            samples = sample_values(cursor, company_id)
+            print(f"\nPartitions read per query shape, company {samples['company_id']}, "
+                  f"{samples['range_from']}..{samples['period_to']}:")
+            ok = verify_pruning(cursor, states, samples) and ok
+        cursor.close()
+    except Exception as e:
+        print(f"❌ Error managing partitions: {str(e)}")
+        return False
+    finally:
+        conn.close()
+    return ok
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['plan', 'apply', 'roll', 'verify'])
+    parser.add_argument('--table', action='append', choices=[scheme.table for scheme in SCHEMES],
+                        help='table to manage, repeatable (default: all)')
+    parser.add_argument('--dry-run', action='store_true', help='print the statements of apply or roll without running them')
+    parser.add_argument('--months-ahead', type=int, default=3,
+                        help='months past the current one to have partitions for (default: 3)')
+    parser.add_argument('--start', type=lambda value: month_start(f'{value}-01'), metavar='YYYY-MM',
+                        help='first month with its own partition (default: month of the oldest row)')
+    parser.add_argument('--company', type=int, help='company to verify with (default: most payslips)')
+    args = parser.parse_args(argv)
+    success = manage_partitions(args.command, args.table or [scheme.table for scheme in SCHEMES],
+                                dry_run=args.dry_run, months_ahead=args.months_ahead, start=args.start,
+                                company_id=args.company)
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+# (period_from, period_to) as read from payroll_payslip, either side may be None
+PeriodRow = Tuple[Optional[date], Optional[date]]
+
+
+@dataclass
+class PayPeriods:
+    """Distinct payslip periods of one company and filter, newest first."""
+    rows: List[PeriodRow]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The /api/dates document: the from and to date lists plus the period pairs."""
+        from_dates = sorted({period_from for period_from, _ in self.rows if period_from is not None}, reverse=True)
+        to_dates = sorted({period_to for _, period_to in self.rows if period_to is not None}, reverse=True)
+        return {
+            'period_from_dates': [value.strftime('%Y-%m-%d') for value in from_dates],
+            'period_to_dates': [value.strftime('%Y-%m-%d') for value in to_dates],
+            'periods': [
+                {'period_from': period_from.strftime('%Y-%m-%d'), 'period_to': period_to.strftime('%Y-%m-%d')}
+                for period_from, period_to in self.rows
+                if period_from is not None and period_to is not None
+            ],
+        }
+
+
+@dataclass
+class CompanyPeriods:
+    """Cached PayPeriods of one company, keyed by (emp_id, payroll_group_id)."""
+    signature: Tuple[Any, ...]
+    checked_at: float
+    filters: "OrderedDict[Tuple[str, str], PayPeriods]" = field(default_factory=OrderedDict)
+
+
+class PeriodDatesCache:
+    """
+    Per-company cache of the distinct payslip periods behind the date pickers.
+
+    Every (emp_id, payroll_group_id) lookup is one SELECT DISTINCT over
+    (period_from, period_to). A company's entries are dropped as soon as its
+    payslip count or latest created_date changes, which is checked at most
+    every check_seconds.
+    """
+
+    def __init__(self, check_seconds: float, max_filters: int = 1024):
+        self.check_seconds = check_seconds
+        self.max_filters = max_filters
+        self._companies: Dict[int, CompanyPeriods] = {}
+        self._lock = threading.Lock()
+
+    def get(self, cursor, company_id, emp_id='all', payroll_group_id=None) -> PayPeriods:
+        """
+        Distinct periods of the company's payslips.
+
+        Args:
+            cursor: Database cursor, used for the change check and on a miss
+            company_id: Company ID to read
+            emp_id: Employee ID, or 'all' for every employee
+            payroll_group_id: Optional payroll group filter
+        """
+        company_id = int(company_id)
+        key = (str(emp_id), str(payroll_group_id or ''))
+        with self._lock:
+            company = self._companies.get(company_id)
+        if company is None or time.monotonic() - company.checked_at > self.check_seconds:
+            signature = self._fetch_signature(cursor, company_id)
+            with self._lock:
+                company = self._companies.get(company_id)
+                if company is None or company.signature != signature:
+                    company = self._companies[company_id] = CompanyPeriods(signature, time.monotonic())
+                else:
+                    company.checked_at = time.monotonic()
+
+        with self._lock:
+            periods = company.filters.get(key)
+            if periods is not None:
+                company.filters.move_to_end(key)
+                return periods
+        periods = PayPeriods(self._fetch_periods(cursor, company_id, emp_id, payroll_group_id))
+        with self._lock:
+            company.filters[key] = periods
+            while len(company.filters) > self.max_filters:
+                company.filters.popitem(last=False)
+        return periods
+
+    def invalidate(self, company_id=None) -> None:
+        with self._lock:
+            if company_id is None:
+                self._companies.clear()
+            else:
+                self._companies.pop(int(company_id), None)
+
+    def _fetch_signature(self, cursor, company_id: int) -> Tuple[Any, ...]:
+        cursor.execute("""
+            SELECT COUNT(*), MAX(created_date)
+            FROM payroll_payslip
+            WHERE company_id = %s
+        """, (company_id,))
+        return tuple(cursor.fetchone())
+
+    def _fetch_periods(self, cursor, company_id: int, emp_id, payroll_group_id) -> List[PeriodRow]:
+        query = """
+            SELECT DISTINCT period_from, period_to
+            FROM payroll_payslip
+            WHERE company_id = %s
+            AND (period_from IS NOT NULL OR period_to IS NOT NULL)
+        """
+        params: List[Any] = [company_id]
+        if emp_id != 'all':
+            query += " AND emp_id = %s"
+            params.append(emp_id)
+        if payroll_group_id:
+            query += " AND payroll_group_id = %s"
+            params.append(payroll_group_id)
+        query += " ORDER BY period_from DESC, period_to DESC"
+        cursor.execute(query, tuple(params))
+        return [(_as_date(period_from), _as_date(period_to)) for period_from, period_to in cursor.fetchall()]
+
+
+def _as_date(value) -> Optional[date]:
+    # Zero dates come back from MySQLdb as None or strings, the old lookups skipped them too
+    return value if isinstance(value, date) else None
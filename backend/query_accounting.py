@@ -0,0 +1,186 @@
+import logging
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from flask import g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(sql: str) -> str:
+    """
+    SQL with its values taken out, so executions differing only in their values match.
+
+    Literals and placeholders become ?, parenthesized lists of them such as
+    IN lists collapse to (...) and whitespace to one space.
+    """
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = _PLACEHOLDER.sub('?', shape)
+    shape = _LIST.sub('(...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def payload_bytes(rows: Sequence[Tuple[Any, ...]], sample_size: int = 100) -> int:
+    """Approximate bytes of the values in rows as sent by the server, from an evenly spaced sample."""
+    if not rows:
+        return 0
+    step = max(1, len(rows) // sample_size)
+    sample = rows[::step]
+    sampled = sum(_value_bytes(value) for row in sample for value in row)
+    return int(sampled / len(sample) * len(rows))
+
+
+def _value_bytes(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, memoryview):
+        return value.nbytes
+    return len(str(value))
+
+
+class RequestQueries:
+    """Statements, rows and bytes of one request, with executions counted per statement shape."""
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.bytes = 0
+        self.shapes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record_statement(self, sql: str) -> None:
+        shape = statement_shape(sql)
+        with self._lock:
+            self.statements += 1
+            self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+    def record_rows(self, rows: Sequence[Tuple[Any, ...]]) -> None:
+        size = payload_bytes(rows)
+        with self._lock:
+            self.rows += len(rows)
+            self.bytes += size
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """(shape, executions) of the shapes executed more than threshold times, most first."""
+        with self._lock:
+            found = [(shape, count) for shape, count in self.shapes.items() if count > threshold]
+        return sorted(found, key=lambda item: -item[1])
+
+
+def current_queries() -> Optional[RequestQueries]:
+    """Query accounting of the request being handled, None outside an accounted request."""
+    if not has_request_context():
+        return None
+    return g.get('request_queries')
+
+
+class CountedCursor:
+    """Cursor proxy recording statements, fetched rows and their bytes in a RequestQueries."""
+
+    def __init__(self, cursor, queries: RequestQueries):
+        self._cursor = cursor
+        self._queries = queries
+
+    def execute(self, query, params=None):
+        self._queries.record_statement(query)
+        return self._cursor.execute(query, params)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._queries.record_rows((row,))
+        return row
+
+    def fetchmany(self, size):
+        rows = self._cursor.fetchmany(size)
+        self._queries.record_rows(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._queries.record_rows(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CountedConnection:
+    """Connection proxy handing out CountedCursors."""
+
+    def __init__(self, conn, queries: RequestQueries):
+        self._conn = conn
+        self._queries = queries
+
+    def cursor(self, *args, **kwargs):
+        return CountedCursor(self._conn.cursor(*args, **kwargs), self._queries)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def counted_connection(conn):
+    """DB_CONNECTION_WRAPPER counting the connection's queries when the request is accounted."""
+    queries = current_queries()
+    return conn if queries is None else CountedConnection(conn, queries)
+
+
+class QueryAccounting:
+    """
+    Per-request SQL round-trip accounting for /api requests.
+
+    Counts statements, fetched rows and approximate result bytes through
+    counted_connection (PooledMySQL's DB_CONNECTION_WRAPPER). A statement
+    shape executed more than N_PLUS_ONE_THRESHOLD times in one request is
+    logged as a suspected N+1 pattern. With SQL_DEBUG_HEADER on, responses
+    carry the counts in X-SQL-Stats and the repeated shapes in X-SQL-Repeated.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        app.config.setdefault('QUERY_ACCOUNTING_ENABLED', True)
+        app.config.setdefault('N_PLUS_ONE_THRESHOLD', 5)
+        app.config.setdefault('SQL_DEBUG_HEADER', False)
+        app.config.setdefault('SQL_DEBUG_HEADER_MAX_SHAPE', 160)
+        self.app = app
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def before_request(self) -> None:
+        if self.app.config['QUERY_ACCOUNTING_ENABLED'] and request.path.startswith('/api/'):
+            g.request_queries = RequestQueries()
+
+    def after_request(self, response):
+        queries = g.pop('request_queries', None)
+        if queries is None:
+            return response
+        config = self.app.config
+        repeated = queries.repeated(config['N_PLUS_ONE_THRESHOLD'])
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        for shape, count in repeated:
+            logger.warning(f"Suspected N+1 in {request.method} {route}: {count} executions of {shape}")
+        if config['SQL_DEBUG_HEADER']:
+            response.headers['X-SQL-Stats'] = (
+                f'statements={queries.statements}; rows={queries.rows}; bytes={queries.bytes}'
+            )
+            if repeated:
+                max_shape = config['SQL_DEBUG_HEADER_MAX_SHAPE']
+                response.headers['X-SQL-Repeated'] = ', '.join(
+                    f'{count}x "{shape[:max_shape]}"' for shape, count in repeated
+                )
+        return response
@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Mapping, Tuple
+
+# Query shape: the endpoint name, then the hashable parts that change the SQL text
+ShapeKey = Tuple[Any, ...]
+
+
+@dataclass(frozen=True)
+class CompiledQuery:
+    """
+    Finished SQL for one query shape and the order its parameters bind in.
+
+    layout names each %s placeholder of sql in order, params() fills them
+    from a dict of values keyed by those names.
+    """
+    sql: str
+    layout: Tuple[str, ...]
+
+    def params(self, values: Mapping[str, Any]) -> Tuple[Any, ...]:
+        """Parameters for one execution, in placeholder order."""
+        return tuple(values[name] for name in self.layout)
+
+
+class QueryCache:
+    """
+    LRU cache of CompiledQuery objects keyed by query shape.
+
+    A key starts with the endpoint name, followed by whatever else changes
+    the SQL text (sorted fields, active filter columns, optional clauses).
+    Values never go into keys, so the common dashboard shapes compile once
+    per process. Hits and misses are counted per endpoint.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[ShapeKey, CompiledQuery]" = OrderedDict()
+        self._endpoints: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get_or_compile(self, key: ShapeKey, compile_query: Callable[[], CompiledQuery]) -> CompiledQuery:
+        """
+        Return the compiled query for key, compiling it on a miss.
+
+        Args:
+            key: Query shape, key[0] is the endpoint name the stats are reported under
+            compile_query: Builds the CompiledQuery for this shape
+        """
+        with self._lock:
+            counts = self._endpoints.setdefault(key[0], {'hits': 0, 'misses': 0})
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                counts['hits'] += 1
+                return compiled
+            counts['misses'] += 1
+        # Compiled outside the lock, two threads racing on a new shape build the same SQL
+        compiled = compile_query()
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return compiled
+
+    def clear(self) -> None:
+        """Drop every compiled query, the hit and miss counts are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            shapes: Dict[str, int] = {}
+            for key in self._entries:
+                shapes[key[0]] = shapes.get(key[0], 0) + 1
+            endpoints = {
+                endpoint: dict(counts, shapes=shapes.get(endpoint, 0),
+                               hit_rate=_hit_rate(counts['hits'], counts['misses']))
+                for endpoint, counts in self._endpoints.items()
+            }
+            hits = sum(counts['hits'] for counts in self._endpoints.values())
+            misses = sum(counts['misses'] for counts in self._endpoints.values())
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': _hit_rate(hits, misses),
+                'evictions': self.evictions,
+                'endpoints': endpoints,
+            }
+
+
+def _hit_rate(hits: int, misses: int) -> float:
+    total = hits + misses
+    return round(hits / total, 4) if total else 0.0
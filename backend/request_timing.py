@@ -0,0 +1,243 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from flask import g, has_request_context, request
+
+# Latency histogram buckets in seconds, Prometheus' defaults stretched to the slow analytics requests
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Phases in the order they are reported, 'app' is whatever the others do not cover
+PHASES = ('db', 'fetch', 'settings', 'aggregate', 'serialize', 'app')
+
+
+class RequestPhases:
+    """
+    Time spent in each phase of one request.
+
+    Phases nest: time spent in an inner phase (e.g. the db query a settings
+    lookup runs) is counted for the inner phase only, so the phases add up
+    to at most the request's wall time. Queries running in parallel on other
+    threads each add their own duration.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        stack = self._local.__dict__.setdefault('stack', [])
+        # Each open phase collects the time of the phases nested inside it
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                self.durations[name] = self.durations.get(name, 0.0) + elapsed - nested
+
+    def finish(self) -> Tuple[float, Dict[str, float]]:
+        """(total seconds, phase -> seconds) with the uncovered time reported as 'app'."""
+        total = time.perf_counter() - self.started
+        with self._lock:
+            durations = dict(self.durations)
+        durations['app'] = max(total - sum(durations.values()), 0.0)
+        return total, durations
+
+
+def current_phases() -> Optional[RequestPhases]:
+    """Phases of the request being handled, None outside a timed request."""
+    if not has_request_context():
+        return None
+    return g.get('request_phases')
+
+
+def timed_phase(name: str) -> Callable:
+    """Decorator counting every call towards a phase of the current request."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            phases = current_phases()
+            if phases is None:
+                return func(*args, **kwargs)
+            with phases.measure(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TimedCursor:
+    """Cursor proxy counting execute() as 'db' and the fetch calls as 'fetch'."""
+
+    def __init__(self, cursor, phases: RequestPhases):
+        self._cursor = cursor
+        self._phases = phases
+
+    def execute(self, query, params=None):
+        with self._phases.measure('db'):
+            return self._cursor.execute(query, params)
+
+    def fetchone(self):
+        with self._phases.measure('fetch'):
+            return self._cursor.fetchone()
+
+    def fetchmany(self, size):
+        with self._phases.measure('fetch'):
+            return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        with self._phases.measure('fetch'):
+            return self._cursor.fetchall()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """Connection proxy handing out TimedCursors."""
+
+    def __init__(self, conn, phases: RequestPhases):
+        self._conn = conn
+        self._phases = phases
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._conn.cursor(*args, **kwargs), self._phases)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def timed_connection(conn):
+    """PooledMySQL DB_CONNECTION_WRAPPER: time the connection's queries when the request is timed."""
+    phases = current_phases()
+    return conn if phases is None else TimedConnection(conn, phases)
+
+
+class RouteHistograms:
+    """Per-route latency histograms, status counts and phase totals in Prometheus text format."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._latency: Dict[Tuple[str, str], List[int]] = {}
+        self._sums: Dict[Tuple[str, str], float] = {}
+        self._statuses: Dict[Tuple[str, str, int], int] = {}
+        self._phases: Dict[Tuple[str, str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route: str, method: str, status: int, total: float, durations: Dict[str, float]) -> None:
+        key = (route, method)
+        with self._lock:
+            counts = self._latency.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if total <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + total
+            status_key = (route, method, status)
+            self._statuses[status_key] = self._statuses.get(status_key, 0) + 1
+            for name, seconds in durations.items():
+                phase_key = (route, method, name)
+                self._phases[phase_key] = self._phases.get(phase_key, 0.0) + seconds
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            latency = {key: list(counts) for key, counts in self._latency.items()}
+            sums = dict(self._sums)
+            statuses = dict(self._statuses)
+            phases = dict(self._phases)
+
+        lines = [
+            '# HELP api_request_duration_seconds Time to build the response of an /api request.',
+            '# TYPE api_request_duration_seconds histogram',
+        ]
+        for (route, method), counts in sorted(latency.items()):
+            labels = f'route="{_escape(route)}",method="{method}"'
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'api_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'api_request_duration_seconds_bucket{{{labels},le="+Inf"}} {counts[-1]}')
+            lines.append(f'api_request_duration_seconds_sum{{{labels}}} {sums[(route, method)]:.6f}')
+            lines.append(f'api_request_duration_seconds_count{{{labels}}} {counts[-1]}')
+
+        lines += [
+            '# HELP api_requests_total Handled /api requests by response status.',
+            '# TYPE api_requests_total counter',
+        ]
+        for (route, method, status), count in sorted(statuses.items()):
+            lines.append(f'api_requests_total{{route="{_escape(route)}",method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            '# HELP api_request_phase_seconds_total Time /api requests spent per phase.',
+            '# TYPE api_request_phase_seconds_total counter',
+        ]
+        for (route, method, name), seconds in sorted(phases.items()):
+            lines.append(f'api_request_phase_seconds_total{{route="{_escape(route)}",method="{method}",'
+                         f'phase="{name}"}} {seconds:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestTiming:
+    """
+    Per-phase timing of /api requests.
+
+    Every /api response gets a Server-Timing header with the milliseconds
+    spent in each phase (db execute, fetch, settings lookups, aggregation,
+    JSON serialization and the rest as app) and the total, and the request
+    is recorded in per-route histograms served by metrics_response().
+    Streamed bodies are produced after the response is returned, so their
+    timing covers the time to the first byte.
+
+    Queries are timed through the DB_CONNECTION_WRAPPER of PooledMySQL
+    (timed_connection), JSON serialization by wrapping the app's JSON
+    provider, so create this after app.json is set.
+    """
+
+    def __init__(self, app=None):
+        self.histograms = RouteHistograms()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        app.config.setdefault('REQUEST_TIMING_ENABLED', True)
+        app.config.setdefault('REQUEST_TIMING_BUCKETS', DEFAULT_BUCKETS)
+        self.app = app
+        self.histograms = RouteHistograms(app.config['REQUEST_TIMING_BUCKETS'])
+        app.json.response = timed_phase('serialize')(app.json.response)
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def before_request(self) -> None:
+        if self.app.config['REQUEST_TIMING_ENABLED'] and request.path.startswith('/api/'):
+            g.request_phases = RequestPhases()
+
+    def after_request(self, response):
+        phases = g.pop('request_phases', None)
+        if phases is None:
+            return response
+        total, durations = phases.finish()
+        response.headers['Server-Timing'] = ', '.join(
+            [f'{name};dur={durations[name] * 1000:.1f}' for name in PHASES if name in durations]
+            + [f'total;dur={total * 1000:.1f}']
+        )
+        # Lets the dashboard read the header from another origin, CORS is open to every origin
+        response.headers['Timing-Allow-Origin'] = '*'
+        if request.url_rule is not None:
+            self.histograms.observe(request.url_rule.rule, request.method, response.status_code, total, durations)
+        return response
+
+    def metrics_response(self):
+        """Response for a Prometheus scrape."""
+        return self.app.response_class(self.histograms.render(), mimetype='text/plain; version=0.0.4')
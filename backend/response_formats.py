@@ -0,0 +1,112 @@
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from flask import Response, jsonify
+
+# Optional binary encoders, a format is only offered when its library is installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+# Accepted media types for each binary format
+BINARY_FORMATS = {
+    MSGPACK_MIMETYPE: 'msgpack',
+    'application/msgpack': 'msgpack',
+    'application/vnd.msgpack': 'msgpack',
+    ARROW_MIMETYPE: 'arrow',
+}
+
+# Library that has to be importable for each format
+_FORMAT_LIBRARIES = {'msgpack': 'msgpack', 'arrow': 'pyarrow'}
+
+
+def negotiate_format(request) -> Optional[str]:
+    """
+    Binary format preferred by the Accept header: 'msgpack', 'arrow' or None for JSON.
+
+    JSON stays the default, so browsers and clients sending */* are unaffected.
+    """
+    best = request.accept_mimetypes.best_match(['application/json'] + list(BINARY_FORMATS))
+    return BINARY_FORMATS.get(best)
+
+
+def unavailable_format_response(fmt: Optional[str]):
+    """406 response if fmt needs a library that is not installed, otherwise None."""
+    if (fmt == 'msgpack' and msgpack is None) or (fmt == 'arrow' and pyarrow is None):
+        return jsonify({
+            'error': f'{fmt} responses are not available, install {_FORMAT_LIBRARIES[fmt]} on the server'
+        }), 406
+    return None
+
+
+def summary_table(groups: Sequence[Tuple[Tuple[Any, ...], Dict[str, Any]]], key_names: Sequence[str],
+                  fields: Sequence[str]) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+    """
+    Flatten (key tuple, field -> amount) summaries into (colnames, rows).
+
+    Args:
+        groups: Summaries as returned by PayslipColumns.totals_by(), or [((), totals)]
+        key_names: Column names for the key tuple, e.g. ('period_from', 'period_to')
+        fields: Summary fields to include, in column order
+    """
+    rows = [tuple(key) + tuple(summary.get(field) for field in fields) for key, summary in groups]
+    return list(key_names) + list(fields), rows
+
+
+def columnar_response(fmt: str, colnames: Sequence[str], rows: Sequence[Tuple[Any, ...]],
+                      metadata: Optional[Dict[str, Any]] = None) -> Response:
+    """
+    Encode rows column by column as MessagePack or an Arrow IPC stream.
+
+    MessagePack bodies are a map of {'columns': [names], 'data': {name: [values]},
+    'row_count': n, 'metadata': {...}} with decimals as floats and dates as ISO
+    strings. Arrow streams keep decimals and dates typed, and carry metadata as
+    JSON under the b'metadata' schema key.
+
+    Args:
+        fmt: 'msgpack' or 'arrow', see negotiate_format
+        colnames: Column names in row order
+        rows: Row tuples
+        metadata: Non-tabular parts of the JSON response, e.g. filters or totals
+    """
+    colnames = list(colnames)
+    columns = list(zip(*rows)) if rows else [()] * len(colnames)
+    if fmt == 'msgpack':
+        body = msgpack.packb({
+            'columns': colnames,
+            'data': {name: list(values) for name, values in zip(colnames, columns)},
+            'row_count': len(rows),
+            'metadata': metadata or {},
+        }, default=_msgpack_default)
+        return Response(body, mimetype=MSGPACK_MIMETYPE)
+
+    table = pyarrow.table(
+        {name: pyarrow.array(values) for name, values in zip(colnames, columns)},
+        metadata={b'metadata': json.dumps(metadata or {}, default=str).encode('utf-8')}
+    )
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(sink.getvalue().to_pybytes(), mimetype=ARROW_MIMETYPE)
+
+
+def _msgpack_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    raise TypeError(f'Cannot serialize {type(value).__name__} to msgpack')
@@ -0,0 +1,119 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from request_timing import timed_phase
+
+
+# Settings lookup tables with their id and display name columns
+SETTINGS_TABLES = {
+    'department': {'id_field': 'dept_id', 'name_field': 'department_name'},
+    'rank': {'id_field': 'rank_id', 'name_field': 'rank_name'},
+    'employment_type': {'id_field': 'emp_type_id', 'name_field': 'name'},
+    'position': {'id_field': 'position_id', 'name_field': 'position_name'},
+    'cost_center': {'id_field': 'cost_center_id', 'name_field': 'cost_center_code'},
+    'project': {'id_field': 'project_id', 'name_field': 'project_name'},
+    'location_and_offices': {'id_field': 'location_and_offices_id', 'name_field': 'name'},
+}
+
+# (query parameter, settings table, response field) for every analytics filter
+FILTER_DISPLAY_MAP = [
+    ('location_id', 'location_and_offices', 'location_name'),
+    ('department_id', 'department', 'department_name'),
+    ('rank_id', 'rank', 'rank_name'),
+    ('employment_type_id', 'employment_type', 'employment_type_name'),
+    ('position_id', 'position', 'position_name'),
+    ('cost_center_id', 'cost_center', 'cost_center_code'),
+    ('project_id', 'project', 'project_name'),
+]
+
+
+def build_settings_query() -> str:
+    """One UNION ALL over all settings tables so a company's lookups cost a single round trip."""
+    selects = []
+    for table, config in SETTINGS_TABLES.items():
+        selects.append(f"""
+            SELECT '{table}' AS table_name, {config['id_field']} AS id,
+                   CAST({config['name_field']} AS CHAR(255)) AS name
+            FROM `{table}`
+            WHERE company_id = %s AND status = 'Active'
+        """)
+    return ' UNION ALL '.join(selects)
+
+
+class CompanySettings:
+    """Active settings rows for one company, indexed for option lists and id lookups."""
+
+    def __init__(self, rows: List[Tuple[str, Any, Optional[str]]]):
+        self.options: Dict[str, List[Dict[str, Any]]] = {table: [] for table in SETTINGS_TABLES}
+        self.names: Dict[str, Dict[str, Optional[str]]] = {table: {} for table in SETTINGS_TABLES}
+        for table_name, id_value, name in rows:
+            self.options[table_name].append({'id': id_value, 'name': name})
+            # Keep the first match, like the LIMIT 1 lookup this replaces
+            self.names[table_name].setdefault(str(id_value), name)
+        for options in self.options.values():
+            # Approximates MySQL's case-insensitive ORDER BY name with NULLs first
+            options.sort(key=lambda option: (option['name'] is not None, (option['name'] or '').casefold()))
+        self.loaded_at = time.monotonic()
+
+    def display_name(self, table: str, id_value) -> Optional[str]:
+        if not id_value:
+            return None
+        return self.names[table].get(str(id_value))
+
+
+class SettingsCache:
+    """
+    Per-company cache of the settings lookup tables.
+
+    All tables are loaded in one batched query and reused until ttl_seconds
+    pass, so filter labels and option lists cost no queries while warm.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._companies: Dict[int, CompanySettings] = {}
+        self._lock = threading.Lock()
+        self._query = build_settings_query()
+
+    @timed_phase('settings')
+    def get(self, cursor, company_id) -> CompanySettings:
+        company_id = int(company_id)
+        with self._lock:
+            settings = self._companies.get(company_id)
+        if settings is not None and time.monotonic() - settings.loaded_at <= self.ttl_seconds:
+            return settings
+        cursor.execute(self._query, (company_id,) * len(SETTINGS_TABLES))
+        settings = CompanySettings(cursor.fetchall())
+        with self._lock:
+            self._companies[company_id] = settings
+        return settings
+
+    @timed_phase('settings')
+    def filter_display(self, cursor, company_id, filters: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        """
+        Resolve display names for the active analytics filters.
+
+        Args:
+            cursor: Database cursor, only used when the company is not cached
+            company_id: Company ID the filters belong to
+            filters: Dict of filter values keyed by query parameter name
+
+        Returns:
+            Dict of response field -> display name for every filter that is set
+        """
+        if not any(filters.get(param) for param, _, _ in FILTER_DISPLAY_MAP):
+            return {}
+        settings = self.get(cursor, company_id)
+        return {
+            resp_field: settings.display_name(table, filters[param])
+            for param, table, resp_field in FILTER_DISPLAY_MAP
+            if filters.get(param)
+        }
+
+    def invalidate(self, company_id=None) -> None:
+        with self._lock:
+            if company_id is None:
+                self._companies.clear()
+            else:
+                self._companies.pop(int(company_id), None)
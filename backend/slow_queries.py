@@ -0,0 +1,321 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from flask import has_request_context, request
+
+from query_accounting import statement_shape
+
+logger = logging.getLogger(__name__)
+
+# Parameter values kept in plans: numbers and dates
+_NUMERIC = re.compile(r'[-+0-9.: ]+')
+
+
+def param_shape(params: Optional[Sequence[Any]]) -> List[str]:
+    """Types (and lengths of text) of a statement's parameters, never their values."""
+    if params is None:
+        return []
+    shape = []
+    for value in params:
+        if value is None:
+            shape.append('null')
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            shape.append(f'bytes({len(bytes(value))})')
+        elif isinstance(value, str):
+            shape.append(f'str({len(value)})')
+        elif isinstance(value, bool):
+            shape.append('bool')
+        elif isinstance(value, int):
+            shape.append('int')
+        elif isinstance(value, (float, Decimal)):
+            shape.append('number')
+        else:
+            shape.append(type(value).__name__)
+    return shape
+
+
+def full_scans(plan: Any) -> List[str]:
+    """
+    Tables an EXPLAIN plan reads in full.
+
+    Understands MySQL's FORMAT=JSON (access_type ALL) and the SQLite stand-in's
+    EXPLAIN QUERY PLAN lines (SCAN without an index).
+    """
+    found: List[str] = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get('access_type') == 'ALL' and 'table_name' in node:
+                found.append(node['table_name'])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+        elif isinstance(node, str) and node.startswith('SCAN ') and ' INDEX ' not in f'{node} ':
+            table = node.split()[1]
+            # Skip SQLite's constant row and subquery/CTE result scans
+            if table != 'CONSTANT' and not table.startswith('('):
+                found.append(table)
+
+    walk(plan)
+    return sorted(set(found))
+
+
+class SlowQueryStats:
+    """Running totals of one statement shape."""
+
+    def __init__(self, shape: str):
+        self.shape = shape
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_seen = 0.0
+        self.routes: Dict[str, int] = {}
+        self.param_shape: List[str] = []
+        self.full_scans: List[str] = []
+        self.explained_at = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'shape': self.shape,
+            'count': self.count,
+            'total_ms': round(self.total_ms, 1),
+            'avg_ms': round(self.total_ms / self.count, 1) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 1),
+            'last_seen': datetime.fromtimestamp(self.last_seen).isoformat(timespec='seconds'),
+            'routes': dict(sorted(self.routes.items(), key=lambda item: -item[1])),
+            'param_shape': self.param_shape,
+            'full_scans': self.full_scans,
+        }
+
+
+class SlowQueryLog:
+    """
+    Capture of statements slower than threshold_ms.
+
+    Every slow statement is written as one JSON line to a rotating log file
+    with its normalized SQL (statement_shape), the types of its parameters
+    and the route it ran for. The first time a shape is slow, and then at
+    most every explain_seconds, an EXPLAIN FORMAT=JSON plan is fetched on a
+    spare pooled connection and added to the line, with the tables read in
+    full. Logging and EXPLAIN run on a background thread, so a slow request
+    is not made slower. Parameter values never reach the log, and string
+    parameters and the given secrets are scrubbed from plans (MySQL prints
+    the interpolated values in attached conditions).
+    """
+
+    def __init__(self, path: str, threshold_ms: float, pool=None, secrets: Sequence[Optional[str]] = (),
+                 explain: bool = True, explain_seconds: float = 300, max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 5, max_shapes: int = 500):
+        self.threshold_ms = threshold_ms
+        self.pool = pool
+        self.explain = explain
+        self.explain_seconds = explain_seconds
+        self.max_shapes = max_shapes
+        # Unset secrets, e.g. no MYSQL_ENCRYPT_KEY, are skipped
+        self._secrets = [secret for secret in secrets if secret]
+        self._stats: Dict[str, SlowQueryStats] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-log')
+        self._path = path
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._log: Optional[logging.Logger] = None
+
+    def wrap(self, conn):
+        """DB_CONNECTION_WRAPPER timing every execute on conn against the threshold."""
+        if self.threshold_ms <= 0:
+            return conn
+        route = request.url_rule.rule if has_request_context() and request.url_rule is not None else None
+        return SlowQueryConnection(conn, self, route)
+
+    def record(self, sql: str, params: Optional[Sequence[Any]], elapsed_ms: float, route: Optional[str]) -> None:
+        shape = statement_shape(sql)
+        now = time.time()
+        with self._lock:
+            stats = self._stats.get(shape)
+            if stats is None:
+                if len(self._stats) >= self.max_shapes:
+                    # Forget the shape with the least total time to make room
+                    del self._stats[min(self._stats.values(), key=lambda item: item.total_ms).shape]
+                stats = self._stats[shape] = SlowQueryStats(shape)
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.last_seen = now
+            stats.param_shape = param_shape(params)
+            if route:
+                stats.routes[route] = stats.routes.get(route, 0) + 1
+            explain = (self.explain and self.pool is not None and _explainable(sql)
+                       and now - stats.explained_at >= self.explain_seconds)
+            if explain:
+                stats.explained_at = now
+        entry = {
+            'time': datetime.fromtimestamp(now).isoformat(timespec='milliseconds'),
+            'duration_ms': round(elapsed_ms, 1),
+            'route': route,
+            'sql': shape,
+            'params': param_shape(params),
+        }
+        self._executor.submit(self._write, entry, sql if explain else None, params)
+
+    def top(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Slowest statement shapes by total time."""
+        with self._lock:
+            ranked = sorted(self._stats.values(), key=lambda item: -item.total_ms)[:limit]
+            return [stats.to_dict() for stats in ranked]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def _write(self, entry: Dict[str, Any], sql: Optional[str], params) -> None:
+        try:
+            if sql is not None:
+                plan = self._explain(sql, params)
+                if plan is not None:
+                    entry['plan'] = plan
+                    entry['full_scans'] = full_scans(plan)
+                    with self._lock:
+                        stats = self._stats.get(entry['sql'])
+                        if stats is not None:
+                            stats.full_scans = entry['full_scans']
+            self._logger().info(json.dumps(entry, default=str))
+        except Exception as e:
+            logger.error(f"Failed to log slow query: {str(e)}")
+
+    def _explain(self, sql: str, params) -> Any:
+        """The statement's EXPLAIN FORMAT=JSON plan, None when no connection is spare."""
+        conn = self.pool.acquire(block=False)
+        if conn is None:
+            return None
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'EXPLAIN FORMAT=JSON {sql}', params)
+            rows = cursor.fetchall()
+            cursor.close()
+        except Exception as e:
+            self.pool.release(conn)
+            return {'error': self._redact(str(e), params)}
+        self.pool.release(conn)
+        if len(rows) == 1 and len(rows[0]) == 1:
+            try:
+                return json.loads(self._redact(str(rows[0][0]), params))
+            except ValueError:
+                pass
+        # Plans that are not one JSON document, e.g. SQLite's EXPLAIN QUERY PLAN, one line per step
+        return [self._redact(str(row[-1]), params) for row in rows]
+
+    def _redact(self, text: str, params) -> str:
+        values = set(self._secrets)
+        # Text parameters (names searched for, ...), ids and dates are left readable
+        values.update(value for value in params or ()
+                      if isinstance(value, str) and len(value) >= 3 and not _NUMERIC.fullmatch(value))
+        variants: Set[str] = set()
+        for value in values:
+            # As written in the plan: raw, SQL-escaped, and either one JSON-escaped
+            escaped = value.replace('\\', '\\\\').replace("'", "\\'")
+            variants.update((value, escaped, json.dumps(value)[1:-1], json.dumps(escaped)[1:-1]))
+        for value in sorted(variants, key=len, reverse=True):
+            text = text.replace(value, '?')
+        return text
+
+    def _logger(self) -> logging.Logger:
+        if self._log is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+            handler = RotatingFileHandler(self._path, maxBytes=self._max_bytes, backupCount=self._backup_count)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            log = logging.getLogger(f'{__name__}.file')
+            log.setLevel(logging.INFO)
+            log.propagate = False
+            log.addHandler(handler)
+            self._log = log
+        return self._log
+
+
+def _explainable(sql: str) -> bool:
+    return sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'WITH')
+
+
+class SlowQueryCursor:
+    """
+    Cursor proxy handing statements slower than the threshold to a SlowQueryLog.
+
+    A statement's time runs from execute() through its fetches, since an
+    unbuffered cursor (or the SQLite stand-in) does most of the work while
+    rows are fetched. It is checked once the rows are read, or when the next
+    statement starts or the cursor is closed.
+    """
+
+    def __init__(self, cursor, log: SlowQueryLog, route: Optional[str]):
+        self._cursor = cursor
+        self._log = log
+        self._route = route
+        self._statement = None
+        self._elapsed = 0.0
+
+    def execute(self, query, params=None):
+        self._finish()
+        self._statement = (query, params)
+        return self._timed(self._cursor.execute, query, params)
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchmany(self, size):
+        rows = self._timed(self._cursor.fetchmany, size)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def _finish(self) -> None:
+        if self._statement is None:
+            return
+        (query, params), elapsed_ms = self._statement, self._elapsed * 1000
+        self._statement, self._elapsed = None, 0.0
+        if elapsed_ms >= self._log.threshold_ms:
+            self._log.record(query, params, elapsed_ms, self._route)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class SlowQueryConnection:
+    """Connection proxy handing out SlowQueryCursors."""
+
+    def __init__(self, conn, log: SlowQueryLog, route: Optional[str]):
+        self._conn = conn
+        self._log = log
+        self._route = route
+
+    def cursor(self, *args, **kwargs):
+        return SlowQueryCursor(self._conn.cursor(*args, **kwargs), self._log, self._route)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
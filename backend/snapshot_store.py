@@ -0,0 +1,349 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from aggregation import PayslipColumns
+from payslip_fields import PAYSLIP_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Encrypted payslip amounts kept in the snapshot, the field mappings plus the adjustments of the
+# default analytics fields. Any other field is always read live
+SNAPSHOT_FIELDS = [name for name, payslip_field in PAYSLIP_FIELDS.items() if payslip_field.is_encrypted]
+SNAPSHOT_FIELDS += ['adjustment_1', 'adjustment_2']
+
+Period = Tuple[date, date]
+
+
+@dataclass
+class CompanySnapshotState:
+    """Result of the last signature check for one company, and the signatures its snapshot holds."""
+    checked_at: float
+    signatures: Dict[Period, str] = field(default_factory=dict)
+    closed: Set[Period] = field(default_factory=set)
+    stored: Dict[Period, str] = field(default_factory=dict)
+
+    def current(self, period: Period) -> bool:
+        """True if the snapshot holds the period as it is now."""
+        return period in self.closed and self.stored.get(period) == self.signatures[period]
+
+
+class SnapshotStore:
+    """
+    Decrypted per-period, per-employee payslip sums in one SQLite file per company.
+
+    A period is closed once its period_to is more than close_after_days in the
+    past and payroll_cronjob has no pending flag_run_parent for it. Closed
+    periods are snapshotted, and re-snapshotted only when their signature
+    (payslip count, latest payslip created_date, latest cronjob datetimestamp)
+    changes. Signatures are checked at most every check_seconds; open periods
+    are left for the caller to query live.
+
+    Only closed periods a read asks for are snapshotted. With a pool set,
+    that happens on a background thread and the read gets those periods
+    back as live ones until the snapshot holds them, so no request waits for
+    a company's history to be decrypted. Without a pool they are snapshotted
+    within the read.
+
+    The files hold decrypted amounts, so they are created owner-only.
+    """
+
+    def __init__(self, directory: str, encrypt_key, close_after_days: int = 7, check_seconds: float = 60,
+                 refresh_batch_periods: int = 12, pool=None):
+        self.directory = directory
+        self.encrypt_key = encrypt_key
+        self.close_after_days = close_after_days
+        self.check_seconds = check_seconds
+        self.refresh_batch_periods = refresh_batch_periods
+        self.pool = pool
+        self._states: Dict[int, CompanySnapshotState] = {}
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        # (company, period) pairs queued for a background refresh
+        self._queued: Set[Tuple[int, Period]] = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='snapshot-refresh')
+
+    def covers(self, fields: Iterable[str]) -> bool:
+        """True if every field is kept in the snapshot."""
+        return all(name in SNAPSHOT_FIELDS for name in fields)
+
+    def read(self, cursor, company_id, period_from, period_to, fields: Sequence[str], exact_period: bool = False,
+             emp_id='all', payroll_group_id=None, emp_ids: Optional[Set[int]] = None
+             ) -> Tuple[List[Tuple[Any, ...]], List[Period]]:
+        """
+        Snapshot rows for the closed periods of a range, and the periods still to query live.
+
+        Args:
+            cursor: Database cursor, used to check signatures (and refresh changed periods without a pool)
+            company_id: Company ID to read
+            period_from: Start of the period range (YYYY-MM-DD)
+            period_to: End of the period range (YYYY-MM-DD)
+            fields: Payslip fields to return, all of them must be covered
+            exact_period: Match one period exactly instead of every period inside the range
+            emp_id: Employee ID, or 'all' for every employee
+            payroll_group_id: Optional payroll group filter
+            emp_ids: Optional set of employee IDs the settings filters allow
+
+        Returns:
+            Tuple of (rows, periods to query live). Rows are shaped like build_analytics_query
+            rows, the selected fields as Decimal followed by period_from and period_to,
+            with one row per employee and payroll group instead of one per payslip.
+            The live periods are the open ones and closed ones not snapshotted yet.
+        """
+        company_id = int(company_id)
+        range_from, range_to = date.fromisoformat(str(period_from)), date.fromisoformat(str(period_to))
+        with self._company_lock(company_id):
+            state = self._check(cursor, company_id)
+            if exact_period:
+                in_range = {period for period in state.signatures if period == (range_from, range_to)}
+            else:
+                in_range = {period for period in state.signatures
+                            if period[0] >= range_from and period[1] <= range_to}
+            stale = sorted(period for period in in_range & state.closed if not state.current(period))
+            if stale and self.pool is None:
+                self._refresh(cursor, company_id, state, stale)
+            elif stale:
+                self._queue_refresh(company_id, stale)
+            current = {period for period in in_range if state.current(period)}
+            rows = self._read_rows(company_id, current, fields, emp_id, payroll_group_id, emp_ids) if current else []
+        return rows, sorted(in_range - current)
+
+    def invalidate(self, company_id=None) -> None:
+        """Force a signature check on the next read."""
+        with self._locks_guard:
+            if company_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(int(company_id), None)
+
+    def _company_lock(self, company_id: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(company_id, threading.Lock())
+
+    def _path(self, company_id: int) -> str:
+        return os.path.join(self.directory, f'company_{company_id}.sqlite3')
+
+    def _connect(self, company_id: int) -> sqlite3.Connection:
+        path = self._path(company_id)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            # Create the file owner-only before SQLite opens it
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        db = sqlite3.connect(path, timeout=30)
+        db.execute('PRAGMA journal_mode=WAL')
+        columns = {row[1] for row in db.execute('PRAGMA table_info(period_sums)')}
+        if columns and not columns.issuperset(SNAPSHOT_FIELDS):
+            # Written before a field was added to SNAPSHOT_FIELDS, start the snapshot over
+            with db:
+                db.execute('DROP TABLE period_sums')
+                db.execute('DROP TABLE IF EXISTS period_signatures')
+        field_columns = ', '.join(f'{name} INTEGER' for name in SNAPSHOT_FIELDS)
+        db.execute(f"""
+            CREATE TABLE IF NOT EXISTS period_sums (
+                period_from TEXT NOT NULL,
+                period_to TEXT NOT NULL,
+                emp_id INTEGER,
+                payroll_group_id INTEGER,
+                {field_columns}
+            )
+        """)
+        db.execute('CREATE INDEX IF NOT EXISTS idx_period_sums_period ON period_sums (period_from, period_to)')
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS period_signatures (
+                period_from TEXT NOT NULL,
+                period_to TEXT NOT NULL,
+                signature TEXT NOT NULL,
+                refreshed_at REAL NOT NULL,
+                PRIMARY KEY (period_from, period_to)
+            )
+        """)
+        return db
+
+    def _check(self, cursor, company_id: int) -> CompanySnapshotState:
+        """The company's signatures, fetched again when older than check_seconds."""
+        state = self._states.get(company_id)
+        if state is not None and time.monotonic() - state.checked_at <= self.check_seconds:
+            return state
+
+        signatures, pending = self._fetch_signatures(cursor, company_id)
+        cutoff = date.today() - timedelta(days=self.close_after_days)
+        closed = {period for period in signatures if period[1] < cutoff and period not in pending}
+
+        db = self._connect(company_id)
+        try:
+            stored = {
+                (date.fromisoformat(period_from), date.fromisoformat(period_to)): signature
+                for period_from, period_to, signature in db.execute(
+                    'SELECT period_from, period_to, signature FROM period_signatures')
+            }
+            # Periods whose payslips were all removed
+            removed = [period for period in stored if period not in signatures]
+            if removed:
+                self._delete_periods(db, removed)
+                db.commit()
+                for period in removed:
+                    del stored[period]
+        finally:
+            db.close()
+
+        state = CompanySnapshotState(checked_at=time.monotonic(), signatures=signatures, closed=closed, stored=stored)
+        self._states[company_id] = state
+        return state
+
+    def _refresh(self, cursor, company_id: int, state: CompanySnapshotState, periods: List[Period]) -> None:
+        """Snapshot periods in batches, recording their signatures in state."""
+        db = self._connect(company_id)
+        try:
+            for start in range(0, len(periods), self.refresh_batch_periods):
+                batch = periods[start:start + self.refresh_batch_periods]
+                self._snapshot_periods(cursor, db, company_id, batch, state.signatures)
+                state.stored.update((period, state.signatures[period]) for period in batch)
+        finally:
+            db.close()
+        logger.info(f"Snapshot for company {company_id} refreshed {len(periods)} period(s)")
+
+    def _queue_refresh(self, company_id: int, periods: List[Period]) -> None:
+        with self._locks_guard:
+            periods = [period for period in periods if (company_id, period) not in self._queued]
+            self._queued.update((company_id, period) for period in periods)
+        if periods:
+            self._executor.submit(self._background_refresh, company_id, periods)
+
+    def _background_refresh(self, company_id: int, periods: List[Period]) -> None:
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                with self._company_lock(company_id):
+                    state = self._check(cursor, company_id)
+                # Whatever was refreshed or reopened in the meantime is left alone. Reads go on
+                # while the periods are decrypted, they use each one once its batch is written
+                stale = [period for period in periods if period in state.closed and not state.current(period)]
+                if stale:
+                    self._refresh(cursor, company_id, state, stale)
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Snapshot refresh for company {company_id} failed: {str(e)}")
+        finally:
+            with self._locks_guard:
+                self._queued.difference_update((company_id, period) for period in periods)
+
+    def _fetch_signatures(self, cursor, company_id: int) -> Tuple[Dict[Period, str], Set[Period]]:
+        """Change signature of every payslip period, and the periods with a pending payroll run."""
+        cursor.execute("""
+            SELECT period_from, period_to, MAX(datetimestamp), MAX(flag_run_parent)
+            FROM payroll_cronjob
+            WHERE company_id = %s
+            GROUP BY period_from, period_to
+        """, (company_id,))
+        cronjobs = {}
+        pending = set()
+        for period_from, period_to, latest_run, run_flag in cursor.fetchall():
+            period = (_as_date(period_from), _as_date(period_to))
+            cronjobs[period] = latest_run
+            if str(run_flag) == '1':
+                pending.add(period)
+
+        cursor.execute("""
+            SELECT period_from, period_to, COUNT(*), MAX(created_date)
+            FROM payroll_payslip
+            WHERE company_id = %s
+            GROUP BY period_from, period_to
+        """, (company_id,))
+        signatures = {}
+        for period_from, period_to, payslip_count, latest_change in cursor.fetchall():
+            period = (_as_date(period_from), _as_date(period_to))
+            signatures[period] = f'{payslip_count}|{latest_change}|{cronjobs.get(period)}'
+        return signatures, pending
+
+    def _snapshot_periods(self, cursor, db: sqlite3.Connection, company_id: int, periods: List[Period],
+                          signatures: Dict[Period, str]) -> None:
+        """Decrypt and sum a batch of periods, then replace them in the snapshot in one transaction."""
+        field_sql = ', '.join(
+            f"CAST(AES_DECRYPT({name}, %s) AS DECIMAL(10,2)) AS {name}" for name in SNAPSHOT_FIELDS
+        )
+        period_sql = ' OR '.join(['(period_from = %s AND period_to = %s)'] * len(periods))
+        query = f"""
+            SELECT period_from, period_to, emp_id, payroll_group_id, {field_sql}
+            FROM payroll_payslip
+            WHERE company_id = %s AND ({period_sql})
+        """
+        params = [self.encrypt_key] * len(SNAPSHOT_FIELDS) + [company_id]
+        for period_from, period_to in periods:
+            params.extend([period_from, period_to])
+        cursor.execute(query, tuple(params))
+        rows = cursor.fetchall()
+        colnames = [desc[0] for desc in cursor.description]
+        columns = PayslipColumns(rows, colnames, SNAPSHOT_FIELDS)
+        groups = columns.cents_by('period_from', 'period_to', 'emp_id', 'payroll_group_id')
+
+        placeholders = ', '.join(['?'] * (4 + len(SNAPSHOT_FIELDS)))
+        now = time.time()
+        with db:
+            self._delete_periods(db, periods)
+            db.executemany(
+                f"INSERT INTO period_sums VALUES ({placeholders})",
+                [
+                    (str(_as_date(period_from)), str(_as_date(period_to)), emp_id, payroll_group_id,
+                     *(sums[name] for name in SNAPSHOT_FIELDS))
+                    for (period_from, period_to, emp_id, payroll_group_id), sums in groups
+                ]
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO period_signatures VALUES (?, ?, ?, ?)",
+                [(str(period[0]), str(period[1]), signatures[period], now) for period in periods]
+            )
+
+    def _delete_periods(self, db: sqlite3.Connection, periods: Iterable[Period]) -> None:
+        keys = [(str(period_from), str(period_to)) for period_from, period_to in periods]
+        db.executemany('DELETE FROM period_sums WHERE period_from = ? AND period_to = ?', keys)
+        db.executemany('DELETE FROM period_signatures WHERE period_from = ? AND period_to = ?', keys)
+
+    def _read_rows(self, company_id: int, periods: Set[Period], fields: Sequence[str], emp_id,
+                   payroll_group_id, emp_ids: Optional[Set[int]]) -> List[Tuple[Any, ...]]:
+        wanted = {(str(period_from), str(period_to)) for period_from, period_to in periods}
+        range_from, range_to = min(wanted)[0], max(period_to for _, period_to in wanted)
+        query = f"""
+            SELECT {', '.join(fields)}, period_from, period_to, emp_id
+            FROM period_sums
+            WHERE period_from >= ? AND period_to <= ?
+        """
+        params: List[Any] = [range_from, range_to]
+        if emp_id != 'all':
+            query += ' AND emp_id = ?'
+            params.append(int(emp_id))
+        if payroll_group_id:
+            query += ' AND payroll_group_id = ?'
+            params.append(int(payroll_group_id))
+
+        rows = []
+        field_count = len(fields)
+        dates: Dict[str, date] = {}
+        db = self._connect(company_id)
+        try:
+            for row in db.execute(query, params):
+                period_from, period_to, row_emp_id = row[field_count:]
+                if (period_from, period_to) not in wanted:
+                    continue
+                if emp_ids is not None and row_emp_id not in emp_ids:
+                    continue
+                amounts = tuple(Decimal(cents).scaleb(-2) for cents in row[:field_count])
+                rows.append(amounts + (
+                    dates.setdefault(period_from, date.fromisoformat(period_from)),
+                    dates.setdefault(period_to, date.fromisoformat(period_to)),
+                ))
+        finally:
+            db.close()
+        return rows
+
+
+def _as_date(value) -> date:
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+"""
+Generate a local payroll database of synthetic companies for profiling.
+
+Builds a SQLite file in the production schema, with the same indexes as
+create_indexes.py: companies and their settings, employees with encrypted
+names, semi-monthly payslips with AES-encrypted amounts, work schedules and
+shift assignments, and, for the most recent periods, payroll_cronjob details
+and employee_time_in records. Point the app at it with
+DB_BACKEND=sqlite SQLITE_PATH=<file> and the same MYSQL_ENCRYPT_KEY.
+
+With the defaults (24 periods, 2 of them with details) each 1k employees
+take about 15 MB and 5 seconds, so 100k employees is roughly 1.5 GB and
+ten minutes.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+from create_indexes import INDEXES as INDEX_SPECS
+from local_db import aes_encrypt, register_types
+from payslip_fields import PAYSLIP_FIELDS
+
+# Encrypted payslip columns, the field mappings plus the analytics defaults outside them
+ENCRYPTED_PAYSLIP_FIELDS = [name for name, field in PAYSLIP_FIELDS.items() if field.is_encrypted]
+ENCRYPTED_PAYSLIP_FIELDS += ['rate', 'adjustment_1', 'adjustment_2']
+PLAIN_PAYSLIP_FIELDS = [name for name, field in PAYSLIP_FIELDS.items() if not field.is_encrypted]
+
+# Share of payslips with a value in each occasional field, the rest are NULL
+OCCASIONAL_FIELDS = {
+    'night_diff': 0.25, 'overtime_pay': 0.35, 'sunday_holiday': 0.2, 'allowances': 0.3,
+    'nt_allowances': 0.3, 'hazard_pay': 0.05, 'cola': 0.15, 'service_charge_taxable': 0.1,
+    'service_charge_non_taxable': 0.1, 'bonuses': 0.08, 'other_compensation': 0.1,
+    'de_minimis': 0.4, 'leave_conversion_taxable': 0.02, 'leave_conversion_non_taxable': 0.02,
+    'paid_leave_amount': 0.2, 'retroactive_total_amount': 0.03, 'absences': 0.15,
+    'employee_boost_amount': 0.02, 'tardiness_pay': 0.3, 'undertime_pay': 0.15,
+    'advance_amount': 0.03, 'adjustment_1': 0.05, 'adjustment_2': 0.02,
+    'voluntary_contributions': 0.05, 'pp_other_deductions': 0.2,
+}
+
+LAST_NAMES = [
+    'Santos', 'Reyes', 'Cruz', 'Bautista', 'Ocampo', 'Garcia', 'Mendoza', 'Torres', 'Tomas',
+    'Andrada', 'Castillo', 'Flores', 'Villanueva', 'Ramos', 'Castro', 'Rivera', 'Aquino',
+    'Navarro', 'Salazar', 'Mercado', 'Aguilar', 'Dela Cruz', 'De Leon', 'Gonzales', 'Lopez',
+    'Fernandez', 'Pascual', 'Domingo', 'Soriano', 'Valdez', 'Santiago', 'Del Rosario',
+]
+FIRST_NAMES = [
+    'Maria', 'Jose', 'Juan', 'Ana', 'Mark', 'John', 'Michael', 'Angelica', 'Kristine', 'Carlo',
+    'Paolo', 'Patricia', 'Camille', 'Christian', 'Joshua', 'Nicole', 'Jerome', 'Mary Grace',
+    'Rosalie', 'Ramon', 'Antonio', 'Liza', 'Jennifer', 'Rodel', 'Arnel', 'Joy', 'Aileen',
+    'Dennis', 'Rowena', 'Francis', 'Jasmine', 'Noel',
+]
+
+# Settings tables as (table, id column, name column, names)
+SETTINGS = [
+    ('department', 'dept_id', 'department_name',
+     ['Finance', 'Human Resources', 'Operations', 'Sales', 'Marketing', 'IT', 'Customer Service',
+      'Logistics', 'Legal', 'Procurement', 'Engineering', 'Administration']),
+    ('rank', 'rank_id', 'rank_name', ['Rank and File', 'Supervisor', 'Manager', 'Senior Manager', 'Director', 'Executive']),
+    ('employment_type', 'emp_type_id', 'name', ['Regular', 'Probationary', 'Contractual', 'Project-Based']),
+    ('position', 'position_id', 'position_name',
+     ['Accountant', 'Analyst', 'Associate', 'Cashier', 'Clerk', 'Coordinator', 'Developer', 'Driver',
+      'Engineer', 'Officer', 'Specialist', 'Technician', 'Agent', 'Team Lead', 'Consultant']),
+    ('cost_center', 'cost_center_id', 'cost_center_code', [f'CC-{i:03d}' for i in range(1, 11)]),
+    ('project', 'project_id', 'project_name', ['Alpha', 'Bravo', 'Charlie', 'Delta', 'Echo', 'Foxtrot', 'Golf', 'Hotel']),
+    ('location_and_offices', 'location_and_offices_id', 'name',
+     ['Makati HQ', 'BGC', 'Ortigas', 'Cebu', 'Davao', 'Clark']),
+]
+
+# Schedules per company as (name, work type, start hour, hours)
+SCHEDULES = [
+    ('Day Shift', 'Uniform Working Days', 8, 9), ('Mid Shift', 'Uniform Working Days', 12, 9),
+    ('Night Shift', 'Uniform Working Days', 22, 9), ('Early Shift', 'Workshift', 6, 9),
+    ('Late Shift', 'Workshift', 14, 9), ('Flexi Core', 'Flexible Hours', 10, 8),
+    ('Compressed Week', 'Uniform Working Days', 7, 11), ('Part Time', 'Workshift', 9, 4),
+]
+
+WORK_SCHEDULE_COLUMNS = [
+    'work_schedule_id', 'name', 'work_type_name', 'comp_id', 'flag_custom', 'status', '`default`',
+    'category_id', 'employees_required', 'notes', 'bg_color', 'break_rules', 'assumed_breaks',
+    'advanced_settings', 'account_id', 'enable_lunch_break', 'break_type_1', 'track_break_1',
+    'break_schedule_1', 'break_started_after', 'enable_additional_breaks',
+    'num_of_additional_breaks', 'break_type_2', 'track_break_2', 'break_schedule_2',
+    'additional_break_started_after_1', 'additional_break_started_after_2',
+    'enable_shift_threshold', 'enable_grace_period', 'tardiness_rule', 'disable_premium_payments',
+    'enable_premium_payments_starts_on_holiday_restday', 'flag_migrate', 'enable_breaks_on_holiday',
+    'enable_working_on_restday', 'total_hrs_per_pay_period', 'total_hrs_per_day', 'period_type',
+    'advanced_rules_premium_pay', 'pay_holiday_premium_on_regular_workday',
+    'pay_holiday_premium_on_regular_workday_nsd', 'pay_holiday_premium_on_holiday',
+    'pay_holiday_premium_on_holiday_nsd', 'pay_restday_premium_on_regular_workday',
+    'pay_restday_premium_on_regular_workday_nsd', 'pay_holiday_premium_on_restday',
+    'pay_holiday_premium_on_restday_nsd', 'total_hrs_per_week', 'created_date', 'updated_date',
+    'created_by_account_id', 'updated_by_account_id', 'flag_default_restday',
+    'pay_ot_holiday_rates_workday_holiday', 'pay_ot_holiday_rates_holiday_workday',
+    'pay_ot_rest_day_rates_workday_restday', 'pay_ot_rest_day_rates_restday_workday',
+    'paycheck_total_hrs_per_pay_period', 'enable_advance_break_rules', 'archive', 'archived_date',
+]
+
+TIME_IN_COLUMNS = [
+    'employee_time_in_id', 'comp_id', 'emp_id', 'work_schedule_id', 'date', 'time_in', 'lunch_out',
+    'lunch_in', 'break1_out', 'break1_in', 'break2_out', 'break2_in', 'time_out', 'total_hours',
+    'total_hours_required', 'corrected', 'reason', 'time_in_status', 'overbreak_min', 'late_min',
+    'tardiness_min', 'undertime_min', 'absent_min', 'notes',
+]
+
+CRONJOB_DETAIL_COLUMNS = [
+    'hoursworked_details', 'absences_details', 'tardiness_details', 'undertime_details',
+    'paid_leave_details', 'overtime_details', 'rest_day_details', 'holiday_premium_details',
+    'night_differential_details',
+]
+
+
+def schema() -> List[str]:
+    """CREATE TABLE statements for the tables the backend reads."""
+    settings_tables = [
+        f"CREATE TABLE `{table}` ({id_column} INTEGER PRIMARY KEY, {name_column} VARCHAR(150), "
+        f"company_id INTEGER, status VARCHAR(20))"
+        for table, id_column, name_column, _ in SETTINGS
+    ]
+    work_schedule_types = {
+        'work_schedule_id': 'INTEGER PRIMARY KEY', 'comp_id': 'INTEGER', 'created_date': 'DATETIME',
+        'updated_date': 'DATETIME', 'archived_date': 'DATETIME', 'total_hrs_per_day': 'DECIMAL(10,2)',
+        'total_hrs_per_week': 'DECIMAL(10,2)', 'total_hrs_per_pay_period': 'DECIMAL(10,2)',
+        'paycheck_total_hrs_per_pay_period': 'DECIMAL(10,2)',
+    }
+    work_schedule_sql = ', '.join(
+        f"{column} {work_schedule_types.get(column, 'VARCHAR(100)')}" for column in WORK_SCHEDULE_COLUMNS
+    )
+    time_in_types = {
+        'employee_time_in_id': 'INTEGER PRIMARY KEY', 'comp_id': 'INTEGER', 'emp_id': 'INTEGER',
+        'work_schedule_id': 'INTEGER', 'date': 'DATE', 'total_hours': 'DECIMAL(10,2)',
+        'total_hours_required': 'DECIMAL(10,2)', 'corrected': 'VARCHAR(5)', 'reason': 'VARCHAR(255)',
+        'time_in_status': 'VARCHAR(30)', 'notes': 'VARCHAR(255)',
+    }
+    time_in_sql = ', '.join(
+        f"{column} {time_in_types.get(column, 'INTEGER' if column.endswith('_min') else 'DATETIME')}"
+        for column in TIME_IN_COLUMNS
+    )
+    payslip_sql = ', '.join(
+        [f"{name} BLOB" for name in ENCRYPTED_PAYSLIP_FIELDS]
+        + [f"{name} DECIMAL(10,2)" for name in PLAIN_PAYSLIP_FIELDS]
+    )
+    details_sql = ', '.join(f"{name} TEXT" for name in CRONJOB_DETAIL_COLUMNS)
+    return [
+        "CREATE TABLE company (company_id INTEGER PRIMARY KEY, company_name VARCHAR(150), status VARCHAR(20))",
+        "CREATE TABLE employee (emp_id INTEGER PRIMARY KEY, company_id INTEGER, last_name BLOB, first_name BLOB)",
+        """CREATE TABLE employee_payroll_information (
+            employee_payroll_information_id INTEGER PRIMARY KEY, emp_id INTEGER, company_id INTEGER,
+            department_id INTEGER, rank_id INTEGER, employment_type INTEGER, position INTEGER,
+            cost_center INTEGER, project_id INTEGER, location_and_offices_id INTEGER)""",
+        *settings_tables,
+        f"""CREATE TABLE payroll_payslip (
+            payroll_payslip_id INTEGER PRIMARY KEY, emp_id INTEGER, company_id INTEGER,
+            period_from DATE, period_to DATE, payroll_group_id INTEGER, created_date DATETIME,
+            {payslip_sql})""",
+        f"""CREATE TABLE payroll_cronjob (
+            payroll_cronjob_id INTEGER PRIMARY KEY, company_id INTEGER, emp_id INTEGER,
+            period_from DATE, period_to DATE, datetimestamp DATETIME, flag_run_parent VARCHAR(5),
+            {details_sql})""",
+        f"CREATE TABLE work_schedule ({work_schedule_sql})",
+        """CREATE TABLE regular_schedule (
+            reg_work_sched_id INTEGER PRIMARY KEY, work_schedule_id INTEGER, work_schedule_name VARCHAR(100),
+            days_of_work VARCHAR(100), work_start_time VARCHAR(8), work_end_time VARCHAR(8),
+            total_work_hours DECIMAL(10,2), company_id INTEGER, break_in_min INTEGER,
+            latest_time_in_allowed VARCHAR(8), status VARCHAR(20), break_1 INTEGER, break_2 INTEGER,
+            flag_half_day VARCHAR(5))""",
+        """CREATE TABLE flexible_hours (
+            workday_settings_id INTEGER PRIMARY KEY, not_required_login VARCHAR(5),
+            total_hours_for_the_day DECIMAL(10,2), total_hours_for_the_week DECIMAL(10,2),
+            total_days_per_year INTEGER, latest_time_in_allowed VARCHAR(8), number_of_breaks_per_day INTEGER,
+            duration_of_lunch_break_per_day INTEGER, duration_of_short_break_per_day INTEGER,
+            work_schedule_id INTEGER, company_id INTEGER)""",
+        """CREATE TABLE rest_day (
+            rest_day_id INTEGER PRIMARY KEY, rest_day VARCHAR(20), company_id INTEGER,
+            work_schedule_id INTEGER, status VARCHAR(20), deleted VARCHAR(5))""",
+        """CREATE TABLE employee_shifts_schedule (
+            shifts_schedule_id INTEGER PRIMARY KEY, emp_id INTEGER, company_id INTEGER,
+            work_schedule_id INTEGER, valid_from DATE, until DATE, status VARCHAR(20))""",
+        f"CREATE TABLE employee_time_in ({time_in_sql})",
+    ]
+
+
+# The indexes create_indexes.py adds in production
+INDEXES = [spec.create_sql() for spec in INDEX_SPECS]
+
+# Keys the production tables have on top of those, joins on emp_id would scan without them
+KEYS = [
+    "CREATE INDEX emp_company ON employee(company_id)",
+    "CREATE UNIQUE INDEX epi_emp_company ON employee_payroll_information(emp_id, company_id)",
+]
+
+
+class Encryptor:
+    """AES_ENCRYPT with the ciphertext of repeated values (names, fixed pay) memoized."""
+
+    def __init__(self, key: str, max_entries: int = 200000):
+        self.key = key
+        self.max_entries = max_entries
+        self._cache: Dict[str, bytes] = {}
+
+    def __call__(self, value):
+        if value is None:
+            return None
+        text = str(value)
+        encrypted = self._cache.get(text)
+        if encrypted is None:
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+            encrypted = self._cache[text] = aes_encrypt(text, self.key)
+        return encrypted
+
+
+def semi_monthly_periods(start: date, count: int) -> List[Tuple[date, date]]:
+    """count consecutive 1-15 / 16-end of month pay periods from the one containing start."""
+    periods: List[Tuple[date, date]] = []
+    current = date(start.year, start.month, 1 if start.day <= 15 else 16)
+    while len(periods) < count:
+        if current.day == 1:
+            end = current.replace(day=15)
+        else:
+            next_month = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+            end = next_month - timedelta(days=1)
+        periods.append((current, end))
+        current = end + timedelta(days=1)
+    return periods
+
+
+def days(period: Tuple[date, date]) -> Iterator[date]:
+    day = period[0]
+    while day <= period[1]:
+        yield day
+        day += timedelta(days=1)
+
+
+def amount(rng: random.Random, low: float, high: float) -> str:
+    return f"{rng.uniform(low, high):.2f}"
+
+
+def payslip_row(rng: random.Random, encrypt: Encryptor, monthly_salary: int) -> List:
+    """Encrypted and plain payslip values in schema order for one employee and period."""
+    basic_pay = monthly_salary / 2
+    values = {'rate': f"{monthly_salary:.2f}", 'basic_pay': f"{basic_pay:.2f}"}
+    values['regular_pay'] = f"{basic_pay * rng.choice([1, 1, 1, 0.95, 0.9]):.2f}"
+    for name, share in OCCASIONAL_FIELDS.items():
+        if rng.random() < share:
+            values[name] = amount(rng, 50, basic_pay * 0.25)
+    values['regular_days'] = str(rng.choice([10, 11, 11, 11, 12, 13]))
+    values['days_absent'] = str(rng.choice([0, 0, 0, 0, 1, 2])) if 'absences' in values else '0'
+    if 'overtime_pay' in values:
+        values['ot_no_hours'] = amount(rng, 1, 24)
+    earnings = sum(float(values.get(name, 0)) for name in (
+        'regular_pay', 'night_diff', 'overtime_pay', 'sunday_holiday', 'allowances', 'nt_allowances',
+        'hazard_pay', 'cola', 'service_charge_taxable', 'service_charge_non_taxable', 'bonuses',
+        'other_compensation', 'de_minimis', 'paid_leave_amount', 'retroactive_total_amount',
+        'employee_boost_amount', 'adjustment_1', 'adjustment_2',
+    ))
+    earnings -= sum(float(values.get(name, 0)) for name in ('absences', 'tardiness_pay', 'undertime_pay'))
+    values['gross_pay'] = f"{max(earnings, 0):.2f}"
+    values['pp_sss'] = f"{min(monthly_salary * 0.045, 1350) / 2:.2f}"
+    values['pp_philhealth'] = f"{min(monthly_salary * 0.025, 2500) / 2:.2f}"
+    values['pp_pagibig'] = '100.00'
+    values['pp_withholding_tax'] = f"{max(earnings - 10417, 0) * 0.2:.2f}"
+    deductions = sum(float(values.get(name, 0)) for name in (
+        'pp_sss', 'pp_philhealth', 'pp_pagibig', 'pp_withholding_tax', 'pp_other_deductions',
+        'voluntary_contributions', 'advance_amount',
+    ))
+    values['net_amount'] = f"{max(earnings, 0) - deductions:.2f}"
+    service_hours = amount(rng, 1, 80) if 'service_charge_taxable' in values else None
+    return [encrypt(values.get(name)) for name in ENCRYPTED_PAYSLIP_FIELDS] + [service_hours]
+
+
+def cronjob_details(rng: random.Random, period: Tuple[date, date], hourly_rate: float) -> List[str]:
+    """The *_details JSON columns for one employee and period."""
+    hours = []
+    entries: Dict[str, List[str]] = {name: [] for name in CRONJOB_DETAIL_COLUMNS[1:]}
+    for day in days(period):
+        if day.weekday() == 6:
+            entries['rest_day_details'].append(f"Rest Day-0-0.00-{day:%Y/%m/%d}")
+            continue
+        roll = rng.random()
+        if roll < 0.03:
+            entries['absences_details'].append(f"Absent-8-{hourly_rate * 8:.2f}-{day:%Y/%m/%d}")
+            continue
+        if roll < 0.05:
+            entries['paid_leave_details'].append(f"Vacation Leave-8-{hourly_rate * 8:.2f}-{day:%Y/%m/%d}")
+            continue
+        worked = 8.0
+        if rng.random() < 0.15:
+            late = round(rng.uniform(0.1, 1.0), 2)
+            worked -= late
+            entries['tardiness_details'].append(f"Tardiness-{late}-{hourly_rate * late:.2f}-{day:%Y/%m/%d}")
+        if rng.random() < 0.05:
+            early = round(rng.uniform(0.5, 2.0), 2)
+            worked -= early
+            entries['undertime_details'].append(f"Undertime-{early}-{hourly_rate * early:.2f}-{day:%Y/%m/%d}")
+        if rng.random() < 0.2:
+            overtime = round(rng.uniform(1, 4), 2)
+            entries['overtime_details'].append(
+                f"Regular OT-{overtime}-{hourly_rate * overtime * 1.25:.2f}-{day:%Y/%m/%d}")
+        if rng.random() < 0.1:
+            night = round(rng.uniform(1, 8), 2)
+            entries['night_differential_details'].append(
+                f"Night Differential-{night}-{hourly_rate * night * 0.1:.2f}-{day:%Y/%m/%d}")
+        hours.append(f"Regular Hours-{day:%B %d, %Y}-{worked:g}")
+    return [json.dumps(hours)] + [json.dumps(entries[name]) for name in CRONJOB_DETAIL_COLUMNS[1:]]
+
+
+def time_in_rows(rng: random.Random, period: Tuple[date, date], schedule: Tuple[str, str, int, int]):
+    """employee_time_in values (without ids) for one employee and period."""
+    start_hour, shift_hours = schedule[2], schedule[3]
+    for day in days(period):
+        if day.weekday() == 6 or rng.random() < 0.04:
+            continue
+        start = datetime.combine(day, datetime.min.time()) + timedelta(hours=start_hour)
+        late = rng.choice([0] * 8 + [rng.randint(1, 45)])
+        time_in = start + timedelta(minutes=late or -rng.randint(0, 15))
+        time_out = start + timedelta(hours=shift_hours, minutes=rng.randint(-20, 60))
+        lunch_out = start + timedelta(hours=4, minutes=rng.randint(0, 30))
+        lunch_in = lunch_out + timedelta(minutes=rng.choice([55, 60, 60, 60, 65, 75]))
+        overbreak = max(int((lunch_in - lunch_out).total_seconds() // 60) - 60, 0)
+        worked = (time_out - max(time_in, start)).total_seconds() / 3600 - 1
+        undertime = max(int((start + timedelta(hours=shift_hours) - time_out).total_seconds() // 60), 0)
+        yield [
+            day, time_in, lunch_out, lunch_in, None, None, None, None, time_out,
+            f"{max(worked, 0):.2f}", f"{shift_hours - 1:.2f}", 'no', None,
+            'late' if late else 'on time', overbreak, late, late, undertime, 0, None,
+        ]
+
+
+def work_schedule_row(work_schedule_id: int, company_id: int, schedule, created: datetime) -> List:
+    name, work_type, start_hour, hours = schedule
+    values: Dict[str, Any] = {column: None for column in WORK_SCHEDULE_COLUMNS}
+    values.update({
+        'work_schedule_id': work_schedule_id, 'name': name, 'work_type_name': work_type, 'comp_id': company_id,
+        'flag_custom': '0', 'status': 'Active', '`default`': '1' if name == 'Day Shift' else '0',
+        'employees_required': '0', 'bg_color': '#4a90e2', 'break_rules': 'assumed', 'assumed_breaks': '60',
+        'advanced_settings': 'no', 'account_id': '1', 'enable_lunch_break': 'yes', 'break_type_1': 'unpaid',
+        'track_break_1': 'yes', 'break_schedule_1': 'fixed', 'break_started_after': '4',
+        'enable_additional_breaks': 'yes' if hours >= 9 else 'no', 'num_of_additional_breaks': '2',
+        'break_type_2': 'paid', 'track_break_2': 'no', 'break_schedule_2': 'flexible',
+        'additional_break_started_after_1': '2', 'additional_break_started_after_2': '6',
+        'enable_shift_threshold': 'no', 'enable_grace_period': 'yes', 'tardiness_rule': 'actual',
+        'disable_premium_payments': 'no', 'enable_premium_payments_starts_on_holiday_restday': 'no',
+        'flag_migrate': '0', 'enable_breaks_on_holiday': 'yes', 'enable_working_on_restday': 'no',
+        'total_hrs_per_pay_period': f"{(hours - 1) * 11:.2f}", 'total_hrs_per_day': f"{hours - 1:.2f}",
+        'period_type': 'semi-monthly', 'advanced_rules_premium_pay': 'no',
+        'total_hrs_per_week': f"{(hours - 1) * 6:.2f}", 'created_date': created, 'updated_date': created,
+        'created_by_account_id': '1', 'updated_by_account_id': '1', 'flag_default_restday': '1',
+        'paycheck_total_hrs_per_pay_period': f"{(hours - 1) * 11:.2f}",
+        'enable_advance_break_rules': 'no', 'archive': '0',
+    })
+    for column in WORK_SCHEDULE_COLUMNS:
+        if column.startswith(('pay_holiday', 'pay_restday', 'pay_ot_')):
+            values[column] = 'yes'
+    return [values[column] for column in WORK_SCHEDULE_COLUMNS]
+
+
+def insert(db: sqlite3.Connection, table: str, columns: List[str], rows) -> int:
+    cursor = db.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+    )
+    return cursor.rowcount
+
+
+def generate_company(db: sqlite3.Connection, encrypt: Encryptor, rng: random.Random, company_id: int,
+                     first_emp_id: int, employees: int, periods: List[Tuple[date, date]],
+                     detail_periods: int) -> Dict[str, int]:
+    """Insert one company and all of its data, returns row counts per table."""
+    counts: Dict[str, int] = {}
+    created = datetime.combine(periods[0][0], datetime.min.time()) - timedelta(days=30)
+    db.execute("INSERT INTO company VALUES (?, ?, 'Active')", (company_id, f"Synthetic Company {company_id}"))
+
+    # Settings, ids are unique across companies like the production auto-increment keys
+    setting_ids: Dict[str, List[int]] = {}
+    for table, id_column, name_column, names in SETTINGS:
+        ids = [company_id * 1000 + i for i in range(1, len(names) + 1)]
+        setting_ids[table] = ids
+        rows = [(setting_id, name, company_id, 'Active') for setting_id, name in zip(ids, names)]
+        rows.append((company_id * 1000 + 999, f"Old {names[0]}", company_id, 'Inactive'))
+        counts[table] = insert(db, f"`{table}`", [id_column, name_column, 'company_id', 'status'], rows)
+
+    # Shifts, with their regular or flexible settings and Sunday rest days
+    schedule_ids = [company_id * 100 + i for i in range(1, len(SCHEDULES) + 1)]
+    counts['work_schedule'] = insert(db, 'work_schedule', WORK_SCHEDULE_COLUMNS, [
+        work_schedule_row(schedule_id, company_id, schedule, created)
+        for schedule_id, schedule in zip(schedule_ids, SCHEDULES)
+    ])
+    regular_rows, flexible_rows, rest_day_rows = [], [], []
+    for schedule_id, (name, work_type, start_hour, hours) in zip(schedule_ids, SCHEDULES):
+        if work_type == 'Flexible Hours':
+            flexible_rows.append((schedule_id, 'no', f"{hours:.2f}", f"{hours * 5:.2f}", 261,
+                                  f"{start_hour + 2:02d}:00:00", 1, 60, 15, schedule_id, company_id))
+        else:
+            regular_rows.append((schedule_id, schedule_id, name, 'Monday,Tuesday,Wednesday,Thursday,Friday,Saturday',
+                                 f"{start_hour:02d}:00:00", f"{(start_hour + hours) % 24:02d}:00:00",
+                                 f"{hours - 1:.2f}", company_id, 60, f"{start_hour:02d}:15:00", 'Active', 15, 15, 'no'))
+        rest_day_rows.append((schedule_id, 'Sunday', company_id, schedule_id, 'Active', '0'))
+    counts['regular_schedule'] = insert(db, 'regular_schedule', [
+        'reg_work_sched_id', 'work_schedule_id', 'work_schedule_name', 'days_of_work', 'work_start_time',
+        'work_end_time', 'total_work_hours', 'company_id', 'break_in_min', 'latest_time_in_allowed', 'status',
+        'break_1', 'break_2', 'flag_half_day'], regular_rows)
+    counts['flexible_hours'] = insert(db, 'flexible_hours', [
+        'workday_settings_id', 'not_required_login', 'total_hours_for_the_day', 'total_hours_for_the_week',
+        'total_days_per_year', 'latest_time_in_allowed', 'number_of_breaks_per_day',
+        'duration_of_lunch_break_per_day', 'duration_of_short_break_per_day', 'work_schedule_id',
+        'company_id'], flexible_rows)
+    counts['rest_day'] = insert(db, 'rest_day', [
+        'rest_day_id', 'rest_day', 'company_id', 'work_schedule_id', 'status', 'deleted'], rest_day_rows)
+
+    payroll_groups = [company_id * 10 + group for group in (1, 2, 3)]
+    first_period, last_period = periods[0], periods[-1]
+    detail_from = len(periods) - detail_periods
+    payslip_columns = (['emp_id', 'company_id', 'period_from', 'period_to', 'payroll_group_id', 'created_date']
+                       + ENCRYPTED_PAYSLIP_FIELDS + PLAIN_PAYSLIP_FIELDS)
+    cronjob_columns = (['company_id', 'emp_id', 'period_from', 'period_to', 'datetimestamp', 'flag_run_parent']
+                       + CRONJOB_DETAIL_COLUMNS)
+    for table in ('employee', 'employee_payroll_information', 'employee_shifts_schedule',
+                  'payroll_payslip', 'payroll_cronjob', 'employee_time_in'):
+        counts[table] = 0
+
+    # Employees in batches so memory stays flat at any scale
+    batch = 1000
+    for batch_start in range(first_emp_id, first_emp_id + employees, batch):
+        employee_rows, info_rows, shift_rows = [], [], []
+        payslip_rows, cronjob_rows = [], []
+        time_in_rows_: List[List[Any]] = []
+        for emp_id in range(batch_start, min(batch_start + batch, first_emp_id + employees)):
+            employee_rows.append((emp_id, company_id, encrypt(rng.choice(LAST_NAMES)), encrypt(rng.choice(FIRST_NAMES))))
+            info_rows.append((emp_id, company_id, rng.choice(setting_ids['department']),
+                              rng.choice(setting_ids['rank']), rng.choice(setting_ids['employment_type']),
+                              rng.choice(setting_ids['position']), rng.choice(setting_ids['cost_center']),
+                              rng.choice(setting_ids['project']), rng.choice(setting_ids['location_and_offices'])))
+
+            # A few employees switch shifts halfway through the range
+            shift_index = rng.randrange(len(SCHEDULES))
+            switch = periods[len(periods) // 2][0] if rng.random() < 0.1 else None
+            next_index = (shift_index + 1) % len(SCHEDULES)
+            if switch:
+                shift_rows.append((emp_id, company_id, schedule_ids[shift_index], first_period[0],
+                                   switch - timedelta(days=1), 'Active'))
+                shift_rows.append((emp_id, company_id, schedule_ids[next_index], switch, last_period[1], 'Active'))
+            else:
+                shift_rows.append((emp_id, company_id, schedule_ids[shift_index], first_period[0],
+                                   last_period[1], 'Active'))
+
+            # Some employees join partway through, a few leave early
+            joined = rng.randrange(len(periods)) if rng.random() < 0.15 else 0
+            left = rng.randrange(joined, len(periods)) if rng.random() < 0.05 else len(periods)
+            monthly_salary = int(rng.lognormvariate(10.2, 0.45) // 100 * 100)
+            hourly_rate = monthly_salary / 26 / 8
+            group = rng.choice(payroll_groups)
+            for index in range(joined, left):
+                period = periods[index]
+                run_at = datetime.combine(period[1], datetime.min.time()) + timedelta(days=2, hours=rng.randint(8, 18))
+                payslip_rows.append([emp_id, company_id, period[0], period[1], group, run_at]
+                                    + payslip_row(rng, encrypt, monthly_salary))
+                if index >= detail_from:
+                    cronjob_rows.append([company_id, emp_id, period[0], period[1], run_at - timedelta(hours=1), '0']
+                                        + cronjob_details(rng, period, hourly_rate))
+                    current = next_index if switch and period[0] >= switch else shift_index
+                    time_in_rows_.extend([company_id, emp_id, schedule_ids[current]] + row
+                                         for row in time_in_rows(rng, period, SCHEDULES[current]))
+
+        counts['employee'] += insert(db, 'employee', ['emp_id', 'company_id', 'last_name', 'first_name'],
+                                     employee_rows)
+        counts['employee_payroll_information'] += insert(db, 'employee_payroll_information', [
+            'emp_id', 'company_id', 'department_id', 'rank_id', 'employment_type', 'position', 'cost_center',
+            'project_id', 'location_and_offices_id'], info_rows)
+        counts['employee_shifts_schedule'] += insert(db, 'employee_shifts_schedule', [
+            'emp_id', 'company_id', 'work_schedule_id', 'valid_from', 'until', 'status'], shift_rows)
+        counts['payroll_payslip'] += insert(db, 'payroll_payslip', payslip_columns, payslip_rows)
+        counts['payroll_cronjob'] += insert(db, 'payroll_cronjob', cronjob_columns, cronjob_rows)
+        counts['employee_time_in'] += insert(db, 'employee_time_in', TIME_IN_COLUMNS[1:], time_in_rows_)
+    return counts
+
+
+def generate(path: str, companies: int, employees: int, periods: int, detail_periods: int, start: date,
+             encrypt_key: str, seed: int = 1) -> Dict[str, int]:
+    """
+    Create the database at path (replacing it) and fill it with synthetic data.
+
+    Args:
+        companies: Number of companies, ids 1..companies
+        employees: Employees per company
+        periods: Semi-monthly pay periods per company, starting at start
+        detail_periods: Most recent periods that also get payroll_cronjob and employee_time_in rows
+        encrypt_key: MYSQL_ENCRYPT_KEY the app will decrypt with
+
+    Returns:
+        Total row counts per table
+    """
+    register_types()
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA journal_mode = WAL')
+    db.execute('PRAGMA synchronous = OFF')
+    for statement in schema():
+        db.execute(statement)
+
+    rng = random.Random(seed)
+    encrypt = Encryptor(encrypt_key)
+    pay_periods = semi_monthly_periods(start, periods)
+    totals: Dict[str, int] = {}
+    for company_id in range(1, companies + 1):
+        counts = generate_company(db, encrypt, rng, company_id, (company_id - 1) * employees + 1, employees,
+                                  pay_periods, min(detail_periods, periods))
+        for table, count in counts.items():
+            totals[table] = totals.get(table, 0) + count
+        db.commit()
+
+    for statement in KEYS + INDEXES:
+        db.execute(statement)
+    db.execute('ANALYZE')
+    db.commit()
+    db.close()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='payroll_local.db', help='SQLite file to create (replaced if it exists)')
+    parser.add_argument('--companies', type=int, default=1)
+    parser.add_argument('--employees', type=int, default=1000, help='Employees per company')
+    parser.add_argument('--periods', type=int, default=24, help='Semi-monthly pay periods')
+    parser.add_argument('--detail-periods', type=int, default=2,
+                        help='Most recent periods with payroll_cronjob details and time-in records')
+    parser.add_argument('--start', type=date.fromisoformat, default=date(2025, 1, 1), help='First period, YYYY-MM-DD')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--encrypt-key', default=os.getenv('MYSQL_ENCRYPT_KEY'),
+                        help='Defaults to MYSQL_ENCRYPT_KEY')
+    args = parser.parse_args()
+    if not args.encrypt_key:
+        parser.error('Set MYSQL_ENCRYPT_KEY or pass --encrypt-key')
+
+    started = time.perf_counter()
+    totals = generate(args.db, args.companies, args.employees, args.periods, args.detail_periods, args.start,
+                      args.encrypt_key, args.seed)
+    for table, count in sorted(totals.items()):
+        print(f"{table:>30} {count:>12,}")
+    size_mb = os.path.getsize(args.db) / 1024 / 1024
+    print(f"✅ Created {args.db} ({size_mb:,.1f} MB) in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
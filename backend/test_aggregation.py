@@ -0,0 +1,94 @@
+import random
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+
+from aggregation import PayslipColumns
+
+# Synthetic payslip rows, shaped like the analytics and prefetch queries return them
+test_fields = ['basic_pay', 'gross_pay', 'overtime_pay']
+colnames = ['emp_id', 'period_from', 'period_to'] + test_fields
+periods = [(date(2025, 1, 1), date(2025, 1, 15)), (date(2025, 1, 16), date(2025, 1, 31)),
+           (date(2025, 2, 1), date(2025, 2, 15))]
+
+
+def as_decimal_10_2(value):
+    """A Python amount as CAST(... AS DECIMAL(10,2)) hands it over, rounding half a cent up."""
+    if value is None:
+        return None
+    return Decimal(value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def make_rows(seed=7, employees=40):
+    rng = random.Random(seed)
+    # Half cents, amounts binary floats cannot hold exactly, negatives and NULLs
+    awkward = ['0.005', '0.015', '2.675', '1.005', '0.1', '0.2', '0.15', '-0.005', '-12.345', None]
+    rows = []
+    for emp_id in range(1, employees + 1):
+        for period_from, period_to in periods:
+            values = []
+            for _ in test_fields:
+                if rng.random() < 0.3:
+                    values.append(as_decimal_10_2(rng.choice(awkward)))
+                else:
+                    values.append(Decimal(rng.randint(-5000, 9999999)) / 100)
+            rows.append((emp_id, period_from, period_to, *values))
+    return rows
+
+
+def old_totals(rows, fields):
+    """The per-cell float() loop analytics used before PayslipColumns."""
+    sums = {field: 0.0 for field in fields}
+    for row in rows:
+        for field in fields:
+            value = row[colnames.index(field)]
+            sums[field] += float(value or 0)
+    return {field: round(value, 2) for field, value in sums.items()}
+
+
+def old_totals_by(rows, fields, *key_columns):
+    groups = {}
+    for row in rows:
+        key = tuple(row[colnames.index(name)] for name in key_columns)
+        groups.setdefault(key, []).append(row)
+    return [(key, old_totals(groups[key], fields)) for key in sorted(groups)]
+
+
+def decimal_totals(rows, fields):
+    """Exact Decimal sums, the figure both must agree with."""
+    sums = {field: Decimal('0') for field in fields}
+    for row in rows:
+        for field in fields:
+            sums[field] += row[colnames.index(field)] or 0
+    return {field: float(value) for field, value in sums.items()}
+
+
+def test_totals_match_old_aggregation():
+    rows = make_rows()
+    columns = PayslipColumns(rows, colnames, test_fields)
+    assert columns.totals() == old_totals(rows, test_fields)
+    assert columns.totals() == decimal_totals(rows, test_fields)
+
+
+def test_totals_by_match_old_aggregation():
+    rows = make_rows(seed=11)
+    columns = PayslipColumns(rows, colnames, test_fields)
+    assert columns.totals_by_period() == old_totals_by(rows, test_fields, 'period_from', 'period_to')
+    assert columns.totals_by_employee() == old_totals_by(rows, test_fields, 'emp_id')
+    assert columns.totals_by('period_from', 'emp_id') == old_totals_by(rows, test_fields, 'period_from', 'emp_id')
+
+
+def test_nulls_and_empty_rows():
+    rows = [(1, *periods[0], None, None, as_decimal_10_2('0.005')),
+            (2, *periods[0], None, Decimal('10.10'), None)]
+    columns = PayslipColumns(rows, colnames, test_fields)
+    assert columns.totals() == {'basic_pay': 0.0, 'gross_pay': 10.1, 'overtime_pay': 0.01}
+    assert columns.null_mask['basic_pay'].tolist() == [True, True]
+    assert PayslipColumns([], colnames, test_fields).totals() == {field: 0.0 for field in test_fields}
+    assert PayslipColumns([], colnames, test_fields).totals_by_period() == []
+
+
+if __name__ == '__main__':
+    test_totals_match_old_aggregation()
+    test_totals_by_match_old_aggregation()
+    test_nulls_and_empty_rows()
+    print('PayslipColumns matches the old aggregation')
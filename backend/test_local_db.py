@@ -0,0 +1,325 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date
+
+from synthetic_data import generate
+
+# Small synthetic database on the SQLite stand-in, built once for every test below
+test_dir = tempfile.mkdtemp(prefix='payroll_test_')
+test_db = os.path.join(test_dir, 'payroll.db')
+test_encrypt_key = 'test-encrypt-key'
+generate(test_db, companies=1, employees=60, periods=6, detail_periods=1, start=date(2025, 1, 1),
+         encrypt_key=test_encrypt_key, seed=3)
+os.environ.update({
+    'DB_BACKEND': 'sqlite',
+    'SQLITE_PATH': test_db,
+    'MYSQL_ENCRYPT_KEY': test_encrypt_key,
+    'SNAPSHOT_DIR': os.path.join(test_dir, 'snapshots'),
+    'SLOW_QUERY_MS': '0',
+    # Every request reads the data version, so changes made by a test are seen right away
+    'DATA_VERSION_CACHE_SECONDS': '0',
+})
+
+import app as app_module  # noqa: E402 - the app reads its settings at import time
+from db_pool import ConnectionPool, PoolTimeout  # noqa: E402
+from local_db import sqlite_connector  # noqa: E402
+from snapshot_store import SnapshotStore  # noqa: E402
+
+client = app_module.app.test_client()
+connect = sqlite_connector(test_db)
+
+# Test parameters
+test_company_id = 1
+test_period_from = '2025-01-01'
+test_period_to = '2025-03-31'
+test_fields = '["basic_pay","gross_pay","net_amount"]'
+
+# The LIKE query employee search ran before the name index
+old_search_query = """
+    SELECT DISTINCT
+        e.emp_id,
+        CAST(AES_DECRYPT(e.last_name, %s) AS CHAR(150) CHARACTER SET utf8) AS last_name,
+        CAST(AES_DECRYPT(e.first_name, %s) AS CHAR(150) CHARACTER SET utf8) AS first_name,
+        COALESCE(lao.name, 'N/A') AS location_office,
+        COALESCE(d.department_name, 'N/A') AS department_name,
+        COALESCE(rk.rank_name, 'N/A') AS rank_name
+    FROM employee e
+    LEFT JOIN employee_payroll_information epi ON e.emp_id = epi.emp_id AND epi.company_id = %s
+    LEFT JOIN location_and_offices lao ON epi.location_and_offices_id = lao.location_and_offices_id
+    LEFT JOIN department d ON epi.department_id = d.dept_id AND d.company_id = %s
+    LEFT JOIN `rank` rk ON epi.rank_id = rk.rank_id AND rk.company_id = %s
+    WHERE e.company_id = %s
+    AND (CAST(AES_DECRYPT(e.last_name, %s) AS CHAR(150) CHARACTER SET utf8) LIKE %s
+         OR CAST(AES_DECRYPT(e.first_name, %s) AS CHAR(150) CHARACTER SET utf8) LIKE %s)
+"""
+
+# The settings filter as a join on employee_payroll_information, before the EXISTS check
+join_filter_query = """
+    SELECT CAST(AES_DECRYPT(p.gross_pay, %s) AS DECIMAL(10,2)) AS gross_pay,
+           CAST(AES_DECRYPT(p.net_amount, %s) AS DECIMAL(10,2)) AS net_amount,
+           p.period_from, p.period_to
+    FROM payroll_payslip p
+    JOIN employee_payroll_information epi ON epi.emp_id = p.emp_id AND epi.company_id = p.company_id
+    WHERE p.company_id = %s AND p.period_from >= %s AND p.period_to <= %s AND epi.{column} = %s
+"""
+
+
+def analytics_url(aggregation_type='total', query=''):
+    return (f'/api/analytics/{test_company_id}/all/{test_period_from}/{test_period_to}/{aggregation_type}'
+            f'?fields={test_fields}{query}')
+
+
+def prefetch_url(aggregation_type='total', query=''):
+    return (f'/api/analytics-prefetch/{test_company_id}/{test_period_from}/{test_period_to}/{aggregation_type}'
+            f'?fields={test_fields}{query}')
+
+
+def most_common(column):
+    """The company's most used value of an employee_payroll_information column."""
+    db = sqlite3.connect(test_db)
+    try:
+        return db.execute(
+            f'SELECT {column} FROM employee_payroll_information WHERE company_id = ? '
+            f'GROUP BY {column} ORDER BY COUNT(*) DESC LIMIT 1', (test_company_id,)
+        ).fetchone()[0]
+    finally:
+        db.close()
+
+
+def touch_payslip(created_date):
+    """Set created_date of one payslip in the test range, returning (rowid, previous value)."""
+    db = sqlite3.connect(test_db)
+    try:
+        rowid, previous = db.execute(
+            'SELECT rowid, created_date FROM payroll_payslip WHERE company_id = ? AND period_from >= ? '
+            'AND period_to <= ? ORDER BY rowid LIMIT 1', (test_company_id, test_period_from, test_period_to)
+        ).fetchone()
+        db.execute('UPDATE payroll_payslip SET created_date = ? WHERE rowid = ?', (created_date, rowid))
+        db.commit()
+        return rowid, previous
+    finally:
+        db.close()
+
+
+def restore_payslip(rowid, created_date):
+    db = sqlite3.connect(test_db)
+    try:
+        db.execute('UPDATE payroll_payslip SET created_date = ? WHERE rowid = ?', (created_date, rowid))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_dataset_cache_hit_and_invalidation():
+    app_module.dataset_cache.clear()
+    hits = app_module.dataset_cache.hits
+    summary = client.get(prefetch_url('separate'))
+    drilldown = client.get(prefetch_url('separate', '&drilldown=true'))
+    assert summary.status_code == 200 and drilldown.status_code == 200
+    # The drilldown reuses the rows the summary decrypted
+    assert app_module.dataset_cache.hits == hits + 1
+
+    rowid, previous = touch_payslip('2031-01-01 00:00:00')
+    try:
+        misses = app_module.dataset_cache.misses
+        changed = client.get(prefetch_url('separate'))
+        assert changed.status_code == 200
+        assert app_module.dataset_cache.misses == misses + 1
+        assert changed.headers['ETag'] != summary.headers['ETag']
+    finally:
+        restore_payslip(rowid, previous)
+
+
+def test_not_modified_on_matching_etag():
+    first = client.get(analytics_url())
+    assert first.status_code == 200 and first.headers.get('ETag')
+    again = client.get(analytics_url(), headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert again.headers['ETag'] == first.headers['ETag']
+    # A different filter set is a different URL with its own tag
+    department_filter = f"&department_id={most_common('department_id')}"
+    other = client.get(analytics_url(query=department_filter), headers={'If-None-Match': first.headers['ETag']})
+    assert other.status_code == 200
+
+    rowid, previous = touch_payslip('2031-01-01 00:00:00')
+    try:
+        changed = client.get(analytics_url(), headers={'If-None-Match': first.headers['ETag']})
+        assert changed.status_code == 200
+    finally:
+        restore_payslip(rowid, previous)
+
+
+def test_name_index_matches_like_search():
+    app_module.name_index.invalidate()
+    conn = connect()
+    matched = 0
+    try:
+        cursor = conn.cursor()
+        for term in ['an', 'AN', 'san', 'dela', 'Cruz', 'ia', 'zzz']:
+            cursor.execute(old_search_query, (
+                test_encrypt_key, test_encrypt_key, test_company_id, test_company_id, test_company_id,
+                test_company_id, test_encrypt_key, f'%{term}%', test_encrypt_key, f'%{term}%',
+            ))
+            expected = sorted((
+                {'emp_id': row[0], 'last_name': row[1] or 'N/A', 'first_name': row[2] or 'N/A',
+                 'location_office': row[3] or 'N/A', 'department_name': row[4] or 'N/A',
+                 'rank_name': row[5] or 'N/A'}
+                for row in cursor.fetchall()
+            ), key=lambda employee: employee['emp_id'])
+            found = app_module.search_employees_by_name(cursor, test_company_id, term, 'all', limit=1000)
+            assert sorted(found, key=lambda employee: employee['emp_id']) == expected, term
+            # Results come in name order, like ORDER BY last_name, first_name
+            names = [(employee['last_name'].casefold(), employee['first_name'].casefold()) for employee in found]
+            assert names == sorted(names), term
+            matched += len(found)
+    finally:
+        conn.close()
+    assert matched
+
+
+def test_snapshot_analytics_match_live():
+    store = SnapshotStore(os.path.join(test_dir, 'snapshot_test'), test_encrypt_key, check_seconds=0)
+    live_store, app_module.snapshot_store = app_module.snapshot_store, None
+    department_id = most_common('department_id')
+    urls = [
+        analytics_url('total'), analytics_url('separate'), analytics_url('single'),
+        analytics_url('separate', f'&department_id={department_id}'),
+        f'/api/analytics/{test_company_id}/all/2025-01-01/2025-01-15/single',
+        f'/api/analytics/{test_company_id}/5/2025-01-01/2025-03-31/separate',
+        f'/api/analytics/{test_company_id}/all/2025-01-01/2025-03-31/separate',
+    ]
+    try:
+        live = [client.get(url).get_json() for url in urls]
+        # Without a pool the first read snapshots the closed periods in line
+        app_module.snapshot_store = store
+        app_module.dataset_cache.clear()
+        first = [client.get(url).get_json() for url in urls]
+        served = [client.get(url).get_json() for url in urls]
+    finally:
+        app_module.snapshot_store = live_store
+    db = sqlite3.connect(store._path(test_company_id))
+    try:
+        assert db.execute('SELECT COUNT(*) FROM period_signatures').fetchone()[0] > 0
+    finally:
+        db.close()
+    for url, expected, got_first, got_served in zip(urls, live, first, served):
+        assert got_first == expected, url
+        assert got_served == expected, url
+
+
+def test_exists_filters_match_join():
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        for param_name, column in [('department_id', 'department_id'), ('location_id', 'location_and_offices_id')]:
+            value = most_common(column)
+            query, params = app_module.build_analytics_query(
+                test_company_id, 'all', test_period_from, test_period_to, ['gross_pay', 'net_amount'],
+                filters={param_name: value}
+            )
+            cursor.execute(query, tuple(params))
+            filtered = sorted(cursor.fetchall())
+            cursor.execute(join_filter_query.format(column=column), (
+                test_encrypt_key, test_encrypt_key, test_company_id, test_period_from, test_period_to, value,
+            ))
+            joined = sorted(cursor.fetchall())
+            assert filtered and filtered == joined, param_name
+
+            # The employee list of the snapshot path agrees with both
+            emp_ids = app_module.analytics_filter_emp_ids(cursor, test_company_id, {param_name: value})
+            cursor.execute(
+                f'SELECT DISTINCT emp_id FROM employee_payroll_information WHERE company_id = %s AND {column} = %s',
+                (test_company_id, value)
+            )
+            assert emp_ids == {row[0] for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+
+def test_pool_blocks_and_times_out():
+    pool = ConnectionPool(connect, min_size=0, max_size=1, checkout_timeout=0.2)
+    held = pool.acquire()
+    assert pool.acquire(block=False) is None
+    started = time.monotonic()
+    try:
+        pool.acquire()
+        assert False, 'checkout on an exhausted pool should time out'
+    except PoolTimeout:
+        assert time.monotonic() - started >= 0.2
+    assert pool.stats()['timeouts'] == 1
+
+    # A blocked checkout gets the connection as soon as it is returned, or a new one once it is discarded
+    pool.checkout_timeout = 5
+    for discard in (False, True):
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+        waiter.start()
+        time.sleep(0.1)
+        assert not got
+        pool.release(held, discard=discard)
+        waiter.join(timeout=2)
+        assert got, f'waiter not woken (discard={discard})'
+        held = got[0]
+    pool.release(held)
+    assert pool.stats()['in_use'] == 0 and pool.stats()['size'] == 1
+
+
+def test_exhausted_pool_answers_503():
+    pool = app_module.mysql.pool
+    timeout, pool.checkout_timeout = pool.checkout_timeout, 0.1
+    held = []
+    try:
+        while True:
+            conn = pool.acquire(block=False)
+            if conn is None:
+                break
+            held.append(conn)
+        for url in [analytics_url(), '/api/companies', f'/api/deepdive/bundle/{test_company_id}/5/2025-03-20']:
+            response = client.get(url)
+            assert response.status_code == 503, url
+            assert response.get_json() == {'error': 'Database is busy, please retry'}
+    finally:
+        for conn in held:
+            pool.release(conn)
+        pool.checkout_timeout = timeout
+    assert client.get('/api/companies').status_code == 200
+
+
+def test_admin_endpoints_loopback_or_token():
+    remote = {'REMOTE_ADDR': '203.0.113.5'}
+    for url in ['/metrics', '/api/admin/slow-queries']:
+        assert client.get(url).status_code == 200
+        assert client.get(url, environ_overrides=remote).status_code == 403
+        assert client.get(url, headers={'X-Forwarded-For': '203.0.113.5'}).status_code == 403
+    app_module.app.config['ADMIN_TOKEN'] = 'test-admin-token'
+    try:
+        for url in ['/metrics', '/api/admin/slow-queries']:
+            assert client.get(url).status_code == 403
+            assert client.get(url, environ_overrides=remote,
+                              headers={'Authorization': 'Bearer wrong-token'}).status_code == 403
+            assert client.get(url, environ_overrides=remote,
+                              headers={'Authorization': 'Bearer test-admin-token'}).status_code == 200
+    finally:
+        app_module.app.config['ADMIN_TOKEN'] = None
+
+
+def teardown_module(module):
+    shutil.rmtree(test_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_dataset_cache_hit_and_invalidation()
+    test_not_modified_on_matching_etag()
+    test_name_index_matches_like_search()
+    test_snapshot_analytics_match_live()
+    test_exists_filters_match_join()
+    test_pool_blocks_and_times_out()
+    test_exhausted_pool_answers_503()
+    test_admin_endpoints_loopback_or_token()
+    teardown_module(None)
+    print('All SQLite stand-in checks passed')
@@ -1,8 +1,9 @@
 import os
 from flask import Flask
-from flask_mysqldb import MySQL
 from dotenv import load_dotenv
 
+from db_pool import PooledMySQL
+
 # Load environment variables
 load_dotenv()
 
@@ -14,7 +15,7 @@ app.config['MYSQL_PASSWORD'] = os.getenv('DB_PASSWORD')
 app.config['MYSQL_DB'] = os.getenv('DB_NAME')
 ENCRYPT_KEY = os.getenv('MYSQL_ENCRYPT_KEY')
 
-mysql = MySQL(app)
+mysql = PooledMySQL(app)
 
 # Test parameters
 test_company_id = 206